@@ -0,0 +1,40 @@
+"""Analytics endpoints: GET /analytics/dashboard and GET /analytics/categories.
+
+Both read the per-day rollup tables (core/rollups.py), never ``predictions``.
+"""
+
+import asyncio
+from typing import Any, Callable
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+
+from core import rollups
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+TIME_RANGE_PATTERN = "^(" + "|".join(rollups.TIME_RANGES) + ")$"
+
+
+async def _query(request: Request, report: Callable[..., Any], time_range: str) -> Any:
+    database = getattr(request.app.state, 'database', None)
+    if database is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Analytics need DATABASE_URL")
+
+    def run():
+        with database.connection() as conn:
+            return report(conn, rollups.TIME_RANGES[time_range])
+
+    return await asyncio.get_running_loop().run_in_executor(None, run)
+
+
+@router.get("/dashboard")
+async def dashboard(request: Request, time_range: str = Query("30d", pattern=TIME_RANGE_PATTERN)):
+    """Summary, daily trends and category performance over ``time_range``."""
+    return await _query(request, rollups.dashboard, time_range)
+
+
+@router.get("/categories")
+async def categories(request: Request, time_range: str = Query("30d", pattern=TIME_RANGE_PATTERN)):
+    """Categories by mean predicted views, with growth against the previous period."""
+    return await _query(request, rollups.categories, time_range)
@@ -0,0 +1,61 @@
+"""Health endpoints: GET /health and GET /models/health."""
+
+import time
+from datetime import datetime
+
+from fastapi import APIRouter, Request
+
+from core.config import settings
+
+router = APIRouter(tags=["health"])
+
+STARTED_AT = time.time()
+
+
+def _models_loaded(request: Request) -> bool:
+    predictor = getattr(request.app.state, 'predictor', None)
+    return predictor is not None and len(predictor.predictor.models) > 0
+
+
+@router.get("/health")
+async def health_check(request: Request):
+    """Overall service health, with micro-batcher and prediction log queue metrics."""
+    batcher = request.app.state.batcher
+    writer = getattr(request.app.state, 'writer', None)
+    models_ok = _models_loaded(request)
+    result = {
+        "status": "healthy" if models_ok and batcher.running else "unhealthy",
+        "timestamp": datetime.utcnow().isoformat(),
+        "version": settings.version,
+        "uptime": int(time.time() - STARTED_AT),
+        "components": {
+            "models": "healthy" if models_ok else "unhealthy",
+            "batcher": "healthy" if batcher.running else "unhealthy",
+        },
+        "metrics": {"batcher": batcher.metrics()},
+    }
+    if writer is not None:
+        # Informational only: predictions are served while the log is down
+        result["components"]["prediction_log"] = "healthy" if writer.running else "unhealthy"
+        result["metrics"]["prediction_log"] = writer.metrics()
+    return result
+
+
+@router.get("/models/health")
+async def models_health(request: Request):
+    models_ok = _models_loaded(request)
+    result = {
+        "status": "healthy" if models_ok else "unhealthy",
+        "models_loaded": models_ok,
+        "prediction_available": models_ok and request.app.state.batcher.running,
+        "last_model_check": datetime.utcnow().isoformat(),
+    }
+    reloader = getattr(request.app.state, 'reloader', None)
+    if models_ok:
+        predictor = request.app.state.predictor.predictor
+        result["model_version"] = predictor.version
+        router = getattr(predictor, 'router', None)
+        result["category_specialists"] = sorted(router.specialists) if router is not None else []
+    if reloader is not None:
+        result["reloader"] = reloader.metrics()
+    return result
@@ -0,0 +1,47 @@
+"""Monitoring endpoints: Prometheus /metrics and the sampling profiler toggle."""
+
+from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.responses import PlainTextResponse
+
+from core import metrics
+from core.profiler import profiler
+
+router = APIRouter(tags=["monitoring"])
+profiler_router = APIRouter(prefix="/debug/profiler", tags=["monitoring"])
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus exposition of the inference metrics."""
+    exposition = metrics.exposition()
+    if exposition is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="prometheus_client is not installed")
+    body, content_type = exposition
+    return Response(content=body, media_type=content_type)
+
+
+@profiler_router.get("", response_class=PlainTextResponse)
+async def profiler_stacks():
+    """Sampled stacks in collapsed format (flamegraph.pl / speedscope)."""
+    return profiler.collapsed()
+
+
+@profiler_router.get("/status")
+async def profiler_status():
+    return {"running": profiler.running, "samples": profiler.samples,
+            "interval_ms": profiler.interval * 1000}
+
+
+@profiler_router.post("/start")
+async def start_profiler(reset: bool = True):
+    if reset:
+        profiler.reset()
+    profiler.start()
+    return {"running": True}
+
+
+@profiler_router.post("/stop")
+async def stop_profiler():
+    profiler.stop()
+    return {"running": False, "samples": profiler.samples}
@@ -0,0 +1,184 @@
+"""Prediction endpoints: POST /predict and POST /predict/batch."""
+
+import asyncio
+import math
+import time
+import uuid
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request, status
+
+from api.schemas import (
+    BatchPredictionInput, BatchPredictionResponse, FeatureAttribution, PredictionInput,
+    PredictionResponse,
+)
+from core import metrics
+from core.batcher import QueueFullError
+from core.config import settings
+from ml.explain import top_attributions
+from utils.success_factors import evaluate, feature_columns, render
+
+router = APIRouter(tags=["predictions"])
+
+# Headline model, as in test_clean_models.py
+HEADLINE_MODEL = 'gradient_boosting'
+
+RECOMMENDATIONS = "Improvement Recommendations"
+
+# ({model: views}, factor codes, (lower, upper) views or None, [(feature, contribution)] or None)
+Scored = Tuple[Dict[str, float], np.ndarray, Optional[Tuple[float, float]],
+               Optional[List[Tuple[str, float]]]]
+
+# (minimum views, expected performance), highest first
+PERFORMANCE_TIERS = [
+    (50000, "High viral potential - This could be a breakout video"),
+    (20000, "Strong performance - Expected to perform very well"),
+    (10000, "Good performance - Solid view count expected"),
+    (5000, "Moderate performance - Decent view count expected"),
+    (0, "Low performance - May need optimization"),
+]
+
+
+def score_videos(predictor: Any, videos: List[Dict[str, Any]]) -> List[Scored]:
+    """Score a list of video dicts in one call.
+
+    Returns one ({model: views}, factor codes, interval, attributions)
+    tuple per video; the success factors are evaluated for the whole batch
+    from the same feature matrix, the interval is the calibrated (lower,
+    upper) range of the headline prediction, or None without a calibration,
+    and the attributions are the headline model's top feature contributions
+    (None with EXPLAIN_MODE=off or for rows the headline model did not score).
+    """
+    X, predictions = predictor.predict_with_features(videos)
+    with metrics.stage_timer('success_factors'):
+        codes = evaluate(feature_columns(X, predictor.feature_names),
+                         [video['title'] for video in videos], predictions)
+    intervals = [None] * len(videos)
+    if getattr(predictor, 'intervals', None) is not None:
+        lower, upper = predictor.intervals.headline(predictions)
+        intervals = [None if low != low else (low, high)
+                     for low, high in zip(lower.tolist(), upper.tolist())]
+    attributions = _attributions(predictor, X, videos, predictions)
+    names = list(predictions)
+    matrix = np.column_stack([predictions[name] for name in names])
+    if np.isnan(matrix).any():
+        # Cascade: report only the models that ran for each video
+        return [({name: views for name, views in zip(names, row) if views == views},
+                 codes[i], intervals[i], attributions[i])
+                for i, row in enumerate(matrix.tolist())]
+    return [(dict(zip(names, row)), codes[i], intervals[i], attributions[i])
+            for i, row in enumerate(matrix.tolist())]
+
+
+def _attributions(predictor: Any, X: np.ndarray, videos: List[Dict[str, Any]],
+                  predictions: Dict[str, np.ndarray]) -> List[Optional[List[Tuple[str, float]]]]:
+    """Top headline-model contributions per video (ml/explain.py)."""
+    attributions = [None] * len(videos)
+    if (settings.explain_mode == 'off' or HEADLINE_MODEL not in predictions
+            or not hasattr(predictor, 'explain')):
+        return attributions
+    rows = np.flatnonzero(np.isfinite(predictions[HEADLINE_MODEL]))
+    if len(rows):
+        with metrics.stage_timer('explain'):
+            _, phi = predictor.explain(X[rows], [videos[i].get('category') for i in rows],
+                                       HEADLINE_MODEL, settings.explain_mode)
+            for i, top in zip(rows.tolist(), top_attributions(predictor.feature_names, phi)):
+                attributions[i] = top
+    return attributions
+
+
+def _prediction_quality(predictions: Dict[str, float]) -> str:
+    """Model agreement (coefficient of variation across models)."""
+    if len(predictions) < 2:
+        # Answered by the cascade's cheap model alone: nothing checked it
+        return "Unverified"
+    values = np.fromiter(predictions.values(), dtype=np.float64)
+    mean = values.mean()
+    cv = values.std() / mean if mean > 0 else 0
+    if cv < 0.1:
+        return "High"
+    if cv < 0.2:
+        return "Medium"
+    return "Low"
+
+
+def _expected_performance(views: float) -> str:
+    for threshold, label in PERFORMANCE_TIERS:
+        if views > threshold:
+            return label
+    return PERFORMANCE_TIERS[-1][1]
+
+
+def build_response(video: PredictionInput, scored: Scored, processing_time: float) -> PredictionResponse:
+    predictions, codes, interval, attributions = scored
+    headline = predictions.get(HEADLINE_MODEL, next(iter(predictions.values())))
+    factors = render(codes)
+    recommendations = factors.pop(RECOMMENDATIONS)
+    return PredictionResponse(
+        prediction_id=str(uuid.uuid4()),
+        video_id=video.video_id,
+        predicted_views=int(round(headline)),
+        model_predictions={name: int(round(views)) for name, views in predictions.items()},
+        predicted_views_lower=int(round(interval[0])) if interval else None,
+        predicted_views_upper=int(round(interval[1])) if interval and interval[1] < math.inf else None,
+        interval_level=settings.interval_level if interval else None,
+        prediction_quality=_prediction_quality(predictions),
+        expected_performance=_expected_performance(headline),
+        key_factors=[text for texts in factors.values() for text in texts],
+        recommendations=recommendations,
+        feature_attributions=[FeatureAttribution(feature=feature, contribution=value)
+                              for feature, value in attributions or ()],
+        processing_time=processing_time,
+        timestamp=datetime.utcnow(),
+    )
+
+
+def _persist(request: Request, videos: List[PredictionInput], responses: List[PredictionResponse]) -> None:
+    """Hand the predictions to the write-behind log, if one is configured."""
+    writer = getattr(request.app.state, 'writer', None)
+    if writer is not None:
+        for video, response in zip(videos, responses):
+            writer.record(video, response)
+
+
+def _overloaded(error: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail=str(error), headers={"Retry-After": "1"})
+
+
+@router.post("/predict", response_model=PredictionResponse)
+async def predict_video(prediction_input: PredictionInput, request: Request):
+    """Predict view count for a single video (coalesced into micro-batches)."""
+    started = time.perf_counter()
+    try:
+        scored = await request.app.state.batcher.submit(prediction_input.to_video())
+    except QueueFullError as e:
+        raise _overloaded(e)
+    response = build_response(prediction_input, scored, time.perf_counter() - started)
+    _persist(request, [prediction_input], [response])
+    return response
+
+
+@router.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(batch: BatchPredictionInput, request: Request):
+    """Predict view counts for multiple videos with one vectorized call."""
+    if len(batch.videos) > settings.max_batch_videos:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {settings.max_batch_videos} videos per batch")
+    started = time.perf_counter()
+    videos = [video.to_video() for video in batch.videos]
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, partial(score_videos, request.app.state.predictor, videos))
+    elapsed = time.perf_counter() - started
+    responses = [build_response(video, result, elapsed) for video, result in zip(batch.videos, results)]
+    _persist(request, batch.videos, responses)
+    return BatchPredictionResponse(
+        batch_id=f"batch_{uuid.uuid4()}",
+        total_videos=len(videos),
+        predictions=responses,
+        processing_time=elapsed,
+        timestamp=datetime.utcnow(),
+    )
@@ -0,0 +1,76 @@
+"""Request and response models for the prediction API (docs/API_REFERENCE.md)."""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class PredictionInput(BaseModel):
+    """One video to score. Fields beyond the model inputs are accepted and ignored."""
+
+    video_id: Optional[str] = None
+    title: str = Field(..., min_length=1, max_length=200)
+    description: str = Field('', max_length=10000)
+    duration: int = Field(..., ge=1, description="Duration in seconds")
+    like_count: int = Field(0, ge=0)
+    dislike_count: int = Field(0, ge=0)
+    comment_count: Optional[int] = Field(None, ge=0)
+    upload_date: str = Field(..., description="YYYY-MM-DD")
+    upload_time: Optional[str] = Field(None, description="HH:MM")
+    tags: str = ''
+    category: Optional[str] = None
+
+    @field_validator('upload_date')
+    @classmethod
+    def _check_upload_date(cls, value: str) -> str:
+        datetime.strptime(value, '%Y-%m-%d')
+        return value
+
+    @field_validator('upload_time')
+    @classmethod
+    def _check_upload_time(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            datetime.strptime(value, '%H:%M')
+        return value
+
+    def to_video(self) -> Dict[str, object]:
+        """Plain dict in the shape the feature builders expect."""
+        return self.model_dump()
+
+
+class BatchPredictionInput(BaseModel):
+    videos: List[PredictionInput] = Field(..., min_length=1)
+
+
+class FeatureAttribution(BaseModel):
+    feature: str
+    # Additive contribution to the headline model's log-views output
+    contribution: float
+
+
+class PredictionResponse(BaseModel):
+    prediction_id: str
+    video_id: Optional[str] = None
+    predicted_views: int
+    model_predictions: Dict[str, int]
+    # Conformal interval for predicted_views; omitted when uncalibrated
+    predicted_views_lower: Optional[int] = None
+    predicted_views_upper: Optional[int] = None
+    interval_level: Optional[float] = None
+    prediction_quality: str
+    expected_performance: str
+    key_factors: List[str] = []
+    recommendations: List[str] = []
+    # Largest per-feature contributions (EXPLAIN_MODE); empty when off
+    feature_attributions: List[FeatureAttribution] = []
+    processing_time: float
+    timestamp: datetime
+
+
+class BatchPredictionResponse(BaseModel):
+    batch_id: str
+    total_videos: int
+    predictions: List[PredictionResponse]
+    processing_time: float
+    timestamp: datetime
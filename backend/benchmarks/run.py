@@ -0,0 +1,193 @@
+"""
+Benchmark harness for the feature -> scale -> predict -> explain pipeline.
+
+Usage (from backend/):
+    python -m benchmarks.run                               # print + write results JSON
+    python -m benchmarks.run --quick --output bench.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json   # exit 1 on regression
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+
+Every result is either a latency (``p50_ms``/``p99_ms``/``mean_ms``, lower
+is better) or a throughput (``rows_per_s``, higher is better). The
+``reference.*`` entries time the original per-video code in
+test_clean_models.py; the rest time the batch pipeline.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.config import BACKEND_DIR, settings
+from core.timing import time_calls, time_throughput
+from utils.synthetic import generate_videos
+
+DEFAULT_BATCH_SIZES = (1, 10, 100, 1000, 10000)
+DEFAULT_TOLERANCE = 0.2  # 20% slower (or less throughput) than baseline is a regression
+NOW = datetime(2024, 6, 1)
+
+
+def _import_reference():
+    if str(BACKEND_DIR.parent) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR.parent))
+    import test_clean_models
+    return test_clean_models
+
+
+def run_benchmarks(quick: bool = False, batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+                   include_reference: bool = True, repeat: Optional[int] = None,
+                   min_seconds: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+    """Run every benchmark; returns {name: metrics}."""
+    from ml.predictor import BatchPredictor, load_clean_models
+    from ml.registry import ModelRegistry
+    from utils.feature_engineering import compute_features, assemble_matrix, to_columns
+    from utils.success_factors import evaluate, feature_columns
+
+    repeat = repeat or (50 if quick else 500)
+    min_seconds = min_seconds or (0.2 if quick else 1.0)
+    batch_sizes = [size for size in batch_sizes if not quick or size <= 1000]
+    videos = generate_videos(max(batch_sizes + [repeat]), seed=42)
+    video = videos[0]
+    results: Dict[str, Dict[str, float]] = {}
+
+    models, scaler, feature_names, model_info = load_clean_models()
+    native = BatchPredictor(models, scaler, feature_names, model_info)
+    compiled = ModelRegistry().predictor()
+
+    if include_reference:
+        reference = _import_reference()
+        X_df = reference.prepare_video_features(video, feature_names)
+        X_scaled = scaler.transform(X_df)
+        prediction = reference.predict_views(models, scaler, feature_names, model_info, video)
+        best = prediction.get('gradient_boosting', next(iter(prediction.values())))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results['reference.prepare_video_features'] = time_calls(
+                lambda: reference.prepare_video_features(video, feature_names), repeat)
+            results['reference.scaler_transform'] = time_calls(lambda: scaler.transform(X_df), repeat)
+            for name, model in models.items():
+                results[f'reference.predict.{name}'] = time_calls(lambda m=model: m.predict(X_scaled), repeat)
+            results['reference.success_factors'] = time_calls(
+                lambda: reference.generate_detailed_success_factors(video, prediction, best), repeat)
+            results['reference.end_to_end_single'] = time_calls(
+                lambda: reference.predict_views(models, scaler, feature_names, model_info, video), repeat)
+
+    # Batch pipeline stages at the largest batch size
+    size = max(batch_sizes)
+    batch = videos[:size]
+    columns = to_columns(batch)
+    X = assemble_matrix(compute_features(columns, NOW), compiled.feature_names, size)
+    X_scaled = compiled.scale(X)
+    predictions = compiled.predict_matrix(X)
+    titles = [v['title'] for v in batch]
+    results[f'batch.features.{size}'] = time_throughput(
+        lambda: assemble_matrix(compute_features(columns, NOW), compiled.feature_names, size),
+        size, min_seconds)
+    results[f'batch.scale.{size}'] = time_throughput(lambda: compiled.scale(X), size, min_seconds)
+    for name in compiled.models:
+        model = compiled.models[name]
+        results[f'batch.predict.{name}.{size}'] = time_throughput(
+            lambda m=model: m.predict(X_scaled), size, min_seconds)
+    # The stacked tree pass only runs up to STACK_TREES_MAX_ROWS, so time it there
+    forest = compiled._forest_stack()
+    stack_size = min(size, settings.stack_trees_max_rows)
+    X_stack = X_scaled[:stack_size]
+    results[f'batch.predict.stacked.{stack_size}'] = time_throughput(
+        lambda: forest.predict(X_stack), stack_size, min_seconds)
+    results[f'batch.success_factors.{size}'] = time_throughput(
+        lambda: evaluate(feature_columns(X, compiled.feature_names), titles, predictions),
+        size, min_seconds)
+
+    # End to end
+    results['end_to_end_single.compiled'] = time_calls(
+        lambda: compiled.predict_views_batch([video], now=NOW), repeat)
+    results['end_to_end_single.native'] = time_calls(
+        lambda: native.predict_views_batch([video], now=NOW), repeat)
+    for size in batch_sizes:
+        batch = videos[:size]
+        results[f'throughput.compiled.{size}'] = time_throughput(
+            lambda b=batch: compiled.predict_views_batch(b, now=NOW), size, min_seconds)
+    return results
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+    """Metrics that got worse than ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    for name, metrics in current.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            if metric.endswith('_ms'):
+                change = value / base - 1
+            else:
+                change = base / value - 1 if value else float('inf')
+            if change > tolerance:
+                regressions.append({'benchmark': name, 'metric': metric, 'baseline': base,
+                                    'current': value, 'slowdown': change})
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def format_results(results: Dict[str, Dict[str, float]]) -> str:
+    lines = []
+    width = max(len(name) for name in results)
+    for name, metrics in results.items():
+        if 'rows_per_s' in metrics:
+            lines.append(f"{name:<{width}}  {metrics['rows_per_s']:>14,.0f} rows/s")
+        else:
+            lines.append(f"{name:<{width}}  p50 {metrics['p50_ms']:8.3f} ms"
+                         f"  p99 {metrics['p99_ms']:8.3f} ms")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ViralCast prediction pipeline")
+    parser.add_argument('--quick', action='store_true', help="fewer repetitions, batches up to 1000")
+    parser.add_argument('--no-reference', action='store_true',
+                        help="skip the per-video reference implementation")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument('--output', type=Path, default=Path('benchmark_results.json'))
+    parser.add_argument('--baseline', type=Path, help="compare against a stored results file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--save-baseline', type=Path, help="also write the results as a baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.quick, args.batch_sizes, not args.no_reference)
+    report = {'environment': environment(), 'results': results}
+    print(format_results(results))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        report['regressions'] = compare(results, baseline, args.tolerance)
+        for r in report['regressions']:
+            print(f"⚠️ REGRESSION {r['benchmark']} {r['metric']}: "
+                  f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['slowdown']:+.0%})")
+        exit_code = 1 if report['regressions'] else 0
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
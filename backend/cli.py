@@ -0,0 +1,165 @@
+"""
+ViralCast command-line interface.
+
+Usage:
+    python cli.py score videos.csv -o predictions.csv
+    python cli.py score export.parquet -o scored.parquet --keep video_id --chunk-size 200000
+    python cli.py score export.csv -o scored.csv --processes 32
+    python cli.py score export.csv -o scored.csv --cascade-budget 0.2
+    python cli.py score catalog.parquet -o scored.parquet --result-store results.db
+    cat videos.jsonl | python cli.py score - --format jsonl -o -
+    python cli.py backfill-accuracy observed.csv --checkpoint nightly --pause-ms 50
+    python cli.py features export.parquet -o training.parquet --keep video_id --keep view_count
+"""
+
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from ml.bulk import FORMATS, score_file
+
+
+def _as_of(value: str) -> datetime:
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def score(args) -> int:
+    from ml.predictor import get_predictor
+    if args.input == '-' and not args.format:
+        raise SystemExit("Reading from stdin needs --format")
+    if args.cascade or args.cascade_budget is not None:
+        from ml.cascade import cascade_predictor
+        kwargs = {} if args.cascade_budget is None else {'budget': args.cascade_budget}
+        predictor = cascade_predictor(**kwargs)
+    else:
+        predictor = get_predictor()
+    if args.model_threads:
+        predictor.model_threads = True
+    if args.result_store:
+        if args.processes > 1 or predictor.cascade is not None:
+            raise SystemExit("--result-store cannot be combined with --processes or --cascade")
+        from ml.results import ResultStore, StoredPredictor
+        predictor = StoredPredictor(predictor, ResultStore(args.result_store))
+    if args.processes > 1:
+        from ml.parallel import ParallelPredictor
+        predictor = ParallelPredictor(predictor, processes=args.processes)
+    try:
+        score_file(args.input, args.output, predictor,
+                   input_format=args.format, output_format=args.output_format,
+                   chunk_size=args.chunk_size, keep=args.keep, now=args.as_of)
+    finally:
+        if args.processes > 1:
+            predictor.close()
+        if args.result_store:
+            predictor.store.close()
+            sys.stderr.write(f"  result store: {predictor.stats.hits:,} stored / "
+                             f"{predictor.stats.misses:,} scored distinct rows of {predictor.rows:,}\n")
+    return 0
+
+
+def backfill_accuracy(args) -> int:
+    from core.config import settings
+    from core.persistence import sink_from_url
+    from ml.accuracy import run_backfill
+    database_url = args.database_url or settings.database_url
+    if not database_url:
+        raise SystemExit("backfill-accuracy needs --database-url or DATABASE_URL")
+    database = sink_from_url(database_url)
+    try:
+        with database.connection() as conn:
+            report = run_backfill(conn, args.observed, args.checkpoint, page_size=args.page_size,
+                                  pause_ms=args.pause_ms, max_pages=args.max_pages,
+                                  restart=args.restart, input_format=args.format,
+                                  key=args.key, views=args.views)
+    finally:
+        database.close()
+    text = json.dumps(report, indent=2)
+    if args.report:
+        Path(args.report).write_text(text)
+    else:
+        print(text)
+    return 0
+
+
+def features(args) -> int:
+    from ml.bulk import export_features
+    from utils.feature_engineering import ALL_FEATURE_NAMES, CLEAN_FEATURE_NAMES
+    export_features(args.input, args.output,
+                    CLEAN_FEATURE_NAMES if args.clean_only else ALL_FEATURE_NAMES,
+                    input_format=args.format, output_format=args.output_format,
+                    chunk_size=args.chunk_size, keep=args.keep, now=args.as_of)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='viralcast', description="ViralCast view predictions")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    score_parser = sub.add_parser('score', help="bulk-score a CSV, JSON Lines or Parquet file")
+    score_parser.add_argument('input', help="input file, or - for stdin")
+    score_parser.add_argument('-o', '--output', required=True, help="output file, or - for stdout")
+    score_parser.add_argument('--format', choices=FORMATS, help="input format (default: from extension)")
+    score_parser.add_argument('--output-format', choices=FORMATS,
+                              help="output format (default: from extension)")
+    score_parser.add_argument('--chunk-size', type=int, default=100_000, help="rows per chunk")
+    score_parser.add_argument('--keep', action='append', default=[], metavar='COLUMN',
+                              help="copy an input column (e.g. video_id) to the output")
+    score_parser.add_argument('--as-of', type=_as_of, default=None, metavar='YYYY-MM-DD',
+                              help="reference date for days_since_upload (default: today)")
+    score_parser.add_argument('--processes', type=int, default=1,
+                              help="score each chunk across N worker processes")
+    score_parser.add_argument('--model-threads', action='store_true',
+                              help="run the models of a chunk in parallel threads")
+    score_parser.add_argument('--cascade', action='store_true',
+                              help="score with ridge, escalating only risky rows to the tree models")
+    score_parser.add_argument('--cascade-budget', type=float, default=None, metavar='FRACTION',
+                              help="cascade with at most this fraction of rows escalated")
+    score_parser.add_argument('--result-store', default=None, metavar='PATH',
+                              help="SQLite file of earlier results; only changed rows reach the tree models")
+    score_parser.set_defaults(handler=score)
+
+    backfill = sub.add_parser('backfill-accuracy',
+                              help="fill actual_views/accuracy_score from observed view counts")
+    backfill.add_argument('observed', help="CSV, JSON Lines or Parquet export of observed views")
+    backfill.add_argument('--format', choices=FORMATS, help="export format (default: from extension)")
+    backfill.add_argument('--key', default='video_id', help="column matching predictions.video_id")
+    backfill.add_argument('--views', default='view_count', help="column with the observed views")
+    backfill.add_argument('--database-url', default=None, help="default: DATABASE_URL")
+    backfill.add_argument('--checkpoint', default='accuracy_backfill', metavar='NAME',
+                          help="progress row in accuracy_backfill_checkpoints; an interrupted "
+                               "run resumes from it")
+    backfill.add_argument('--restart', action='store_true', help="ignore an existing checkpoint")
+    backfill.add_argument('--page-size', type=int, default=5000, help="predictions per page")
+    backfill.add_argument('--pause-ms', type=float, default=0.0, help="sleep between pages")
+    backfill.add_argument('--max-pages', type=int, default=None, help="stop after N pages")
+    backfill.add_argument('--report', default=None, help="write the metrics JSON here")
+    backfill.set_defaults(handler=backfill_accuracy)
+
+    features_parser = sub.add_parser('features', help="export the documented feature set for training")
+    features_parser.add_argument('input', help="input file, or - for stdin")
+    features_parser.add_argument('-o', '--output', required=True, help="output file, or - for stdout")
+    features_parser.add_argument('--format', choices=FORMATS, help="input format (default: from extension)")
+    features_parser.add_argument('--output-format', choices=FORMATS,
+                                 help="output format (default: from extension)")
+    features_parser.add_argument('--chunk-size', type=int, default=100_000, help="rows per chunk")
+    features_parser.add_argument('--keep', action='append', default=[], metavar='COLUMN',
+                                 help="copy an input column (e.g. view_count, comment_count) to the output")
+    features_parser.add_argument('--as-of', type=_as_of, default=None, metavar='YYYY-MM-DD',
+                                 help="reference date for days_since_upload (default: today)")
+    features_parser.add_argument('--clean-only', action='store_true',
+                                 help="only the 21 features of the current models")
+    features_parser.set_defaults(handler=features)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Request coalescing for the prediction API.
+
+Concurrent single-video requests are queued and drained into
+micro-batches (up to ``max_batch_size`` items, or whatever arrived within
+``max_wait_ms`` of the first one). Each micro-batch is scored with one
+vectorized call in a worker thread and the results are fanned back to
+the waiting requests. The queue is bounded: when it is full, ``submit``
+raises ``QueueFullError`` so the API can shed load with a 503 instead of
+letting latency grow without limit.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the micro-batch queue is at capacity."""
+
+
+class BatcherStats:
+    """Counters for the queue and the batches it produced."""
+
+    def __init__(self):
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.items = 0
+        self.max_batch = 0
+        self.last_batch_seconds = 0.0
+
+    def as_dict(self, queue_depth: int) -> Dict[str, float]:
+        return {
+            'queue_depth': queue_depth,
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch,
+            'last_batch_seconds': self.last_batch_seconds,
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent ``submit`` calls into batched ``score_batch`` calls.
+
+    ``score_batch`` takes a list of items and returns one result per item,
+    in order. It runs in the default thread pool so the event loop keeps
+    accepting requests while a batch is being scored.
+    """
+
+    def __init__(self, score_batch: Callable[[List[Any]], Sequence[Any]],
+                 max_batch_size: int = 64, max_wait_ms: float = 5.0, max_queue: int = 10000):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.stats = BatcherStats()
+        self._queue: Optional['asyncio.Queue[Tuple[Any, asyncio.Future]]'] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def metrics(self) -> Dict[str, float]:
+        return self.stats.as_dict(self.queue_depth)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Finish the queued work, then stop the worker."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result."""
+        if not self.running:
+            raise RuntimeError("MicroBatcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self.stats.rejected += 1
+            raise QueueFullError(f"prediction queue is full ({self.max_queue} pending)")
+        self.stats.requests += 1
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Requests whose client went away are not scored
+            live = [(item, future) for item, future in batch if not future.cancelled()]
+            started = time.perf_counter()
+            try:
+                if live:
+                    results = await loop.run_in_executor(
+                        None, self.score_batch, [item for item, _ in live])
+                    for (_, future), result in zip(live, results):
+                        if not future.done():
+                            future.set_result(result)
+            except Exception as e:
+                logger.exception("Micro-batch of %d failed", len(live))
+                for _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self.stats.batches += 1
+                self.stats.items += len(batch)
+                self.stats.max_batch = max(self.stats.max_batch, len(batch))
+                self.stats.last_batch_seconds = time.perf_counter() - started
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,163 @@
+"""
+Inference metrics.
+
+Stage and per-model timings feed Prometheus histograms when
+``prometheus_client`` is installed (it is in requirements.txt); without
+it every hook is a no-op, so the ML code can be used as a library
+without the dependency. Set ``METRICS_ENABLED=0`` to turn the hooks off.
+
+Hot-path cost is two ``perf_counter`` calls and one ``observe`` per
+stage; labelled children are cached so no label lookup happens per call.
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.config import settings
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover - optional dependency
+    prometheus_client = None
+
+ENABLED = settings.metrics_enabled and prometheus_client is not None
+
+# Seconds; single-row stages take tens of microseconds, bulk chunks seconds
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096, 16384, 65536)
+
+# Upper bounds of the batch-size label on per-model timings
+_SIZE_CLASSES = ((1, '1'), (16, '2-16'), (256, '17-256'), (4096, '257-4096'))
+
+
+def batch_size_class(n_rows: int) -> str:
+    for limit, label in _SIZE_CLASSES:
+        if n_rows <= limit:
+            return label
+    return '4097+'
+
+
+if ENABLED:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        'viralcast_stage_seconds', 'Time spent per inference stage',
+        ['stage'], buckets=LATENCY_BUCKETS)
+    MODEL_PREDICT_SECONDS = prometheus_client.Histogram(
+        'viralcast_model_predict_seconds', 'Model predict time per batch',
+        ['model', 'batch_size', 'path'], buckets=LATENCY_BUCKETS)
+    MODEL_LOAD_SECONDS = prometheus_client.Histogram(
+        'viralcast_model_load_seconds', 'Time to load or open a model artifact',
+        ['model'], buckets=LATENCY_BUCKETS)
+    ROWS_PREDICTED = prometheus_client.Counter(
+        'viralcast_rows_predicted_total', 'Rows scored, per model', ['model'])
+    BATCH_ROWS = prometheus_client.Histogram(
+        'viralcast_batch_rows', 'Rows per scored batch', buckets=BATCH_SIZE_BUCKETS)
+    CACHE_LOOKUPS = prometheus_client.Counter(
+        'viralcast_cache_lookups_total', 'Prediction cache lookups', ['result'])
+    CASCADE_ROWS = prometheus_client.Counter(
+        'viralcast_cascade_rows_total', 'Rows answered by the cascade, per tier', ['tier'])
+    PERSISTED_PREDICTIONS = prometheus_client.Counter(
+        'viralcast_persisted_predictions_total', 'Predictions handed to the database writer',
+        ['result'])
+    MODEL_RELOADS = prometheus_client.Counter(
+        'viralcast_model_reloads_total', 'Model version swaps in this process', ['result'])
+    ROUTED_ROWS = prometheus_client.Counter(
+        'viralcast_routed_rows_total', 'Rows scored per category route', ['route'])
+
+_children: Dict[Tuple[Any, ...], Any] = {}
+
+
+def _child(metric: Any, *labels: str) -> Any:
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if ENABLED:
+        _child(STAGE_SECONDS, stage).observe(seconds)
+
+
+def observe_model(model: str, n_rows: int, seconds: float, path: str = 'single') -> None:
+    """``path`` is "stacked" when the time is one pass shared by all tree models."""
+    if ENABLED:
+        _child(MODEL_PREDICT_SECONDS, model, batch_size_class(n_rows), path).observe(seconds)
+        _child(ROWS_PREDICTED, model).inc(n_rows)
+
+
+def observe_model_load(model: str, seconds: float) -> None:
+    if ENABLED:
+        _child(MODEL_LOAD_SECONDS, model).observe(seconds)
+
+
+def observe_batch(n_rows: int) -> None:
+    if ENABLED:
+        BATCH_ROWS.observe(n_rows)
+
+
+def count_cache(hits: int, misses: int) -> None:
+    if ENABLED:
+        if hits:
+            _child(CACHE_LOOKUPS, 'hit').inc(hits)
+        if misses:
+            _child(CACHE_LOOKUPS, 'miss').inc(misses)
+
+
+def count_cascade(cheap: int, escalated: int) -> None:
+    if ENABLED:
+        if cheap:
+            _child(CASCADE_ROWS, 'cheap').inc(cheap)
+        if escalated:
+            _child(CASCADE_ROWS, 'escalated').inc(escalated)
+
+
+def count_persisted(result: str, n: int) -> None:
+    if ENABLED:
+        _child(PERSISTED_PREDICTIONS, result).inc(n)
+
+
+def count_model_reload(result: str) -> None:
+    if ENABLED:
+        _child(MODEL_RELOADS, result).inc()
+
+
+def count_routed(route: str, n: int) -> None:
+    if ENABLED:
+        _child(ROUTED_ROWS, route).inc(n)
+
+
+class stage_timer:
+    """``with stage_timer('features'): ...`` records the block's duration."""
+
+    __slots__ = ('stage', '_start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self) -> 'stage_timer':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        observe_stage(self.stage, time.perf_counter() - self._start)
+
+
+def register_gauge(name: str, description: str, callback: Callable[[], float]) -> None:
+    """Gauge whose value is read from ``callback`` at scrape time."""
+    if not ENABLED:
+        return
+    registry = prometheus_client.REGISTRY
+    existing = getattr(registry, '_names_to_collectors', {}).get(name)
+    if existing is not None:
+        registry.unregister(existing)  # re-registered on app restart (tests, reload)
+    gauge = prometheus_client.Gauge(name, description)
+    gauge.set_function(callback)
+
+
+def exposition() -> Optional[Tuple[bytes, str]]:
+    """(body, content type) for a /metrics response, or None without prometheus_client."""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,341 @@
+"""
+Write-behind persistence of predictions.
+
+Handlers hand each finished prediction to ``PredictionWriter.record``,
+which only appends to a bounded in-memory queue. There is no database
+round trip on the request path. A background task drains the queue into
+batches of up to ``flush_rows`` predictions, or whatever arrived within
+``flush_interval_ms`` of the first one, and writes each batch in one
+transaction on a dedicated thread:
+
+* PostgreSQL (``DATABASE_URL=postgresql://...``): ``COPY ... FROM STDIN``
+  into ``predictions`` and ``analytics`` over a psycopg2 connection pool
+* SQLite (``DATABASE_URL=sqlite:///path.db``): multi-row
+  ``executemany`` inserts into the same columns; a local stand-in for
+  development and tests
+
+Logging predictions is best effort. When the queue is full, or the
+database is down, predictions are dropped and counted rather than
+slowing down or failing requests.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from core import metrics
+from core.rollups import SQLITE_ROLLUP_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_COLUMNS = (
+    'id', 'video_id', 'video_title', 'video_description', 'duration', 'like_count', 'dislike_count',
+    'comment_count', 'upload_date', 'upload_time', 'tags', 'category',
+    'predicted_views', 'confidence_lower', 'confidence_upper', 'prediction_quality',
+    'expected_performance', 'key_factors', 'recommendations', 'created_at',
+)
+ANALYTICS_COLUMNS = ('prediction_id', 'metric_name', 'metric_value', 'recorded_at')
+
+# Tables of init.sql, in SQLite types (rollups: core/rollups.py)
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    video_id TEXT,
+    video_title TEXT NOT NULL,
+    video_description TEXT,
+    duration INTEGER NOT NULL,
+    like_count INTEGER DEFAULT 0,
+    dislike_count INTEGER DEFAULT 0,
+    comment_count INTEGER DEFAULT 0,
+    upload_date TEXT NOT NULL,
+    upload_time TEXT,
+    tags TEXT,
+    category TEXT,
+    predicted_views INTEGER NOT NULL,
+    confidence_lower INTEGER,
+    confidence_upper INTEGER,
+    prediction_quality TEXT NOT NULL,
+    expected_performance TEXT,
+    key_factors TEXT,
+    recommendations TEXT,
+    actual_views INTEGER,
+    accuracy_score REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS analytics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prediction_id TEXT REFERENCES predictions(id) ON DELETE CASCADE,
+    metric_name TEXT NOT NULL,
+    metric_value REAL NOT NULL,
+    recorded_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS accuracy_backfill_checkpoints (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    saved_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+Rows = Tuple[List[tuple], List[tuple]]
+
+
+def prediction_rows(video: Any, response: Any) -> Rows:
+    """``predictions`` row and ``analytics`` rows for one scored video.
+
+    ``video`` is a ``PredictionInput`` (or its dict), ``response`` the
+    ``PredictionResponse`` returned to the client. The analytics rows hold
+    each model's prediction and the processing time.
+    """
+    video = video if isinstance(video, dict) else video.model_dump()
+    timestamp = response.timestamp
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)  # responses carry utcnow()
+    created_at = timestamp.isoformat()
+    prediction = (
+        response.prediction_id, video.get('video_id'), video['title'], video.get('description'), video['duration'],
+        video.get('like_count', 0), video.get('dislike_count', 0), video.get('comment_count'),
+        video['upload_date'], video.get('upload_time'), video.get('tags'), video.get('category'),
+        response.predicted_views, response.predicted_views_lower, response.predicted_views_upper,
+        response.prediction_quality, response.expected_performance,
+        json.dumps(response.key_factors), json.dumps(response.recommendations), created_at,
+    )
+    analytics = [(response.prediction_id, f'{name}_views', float(views), created_at)
+                 for name, views in response.model_predictions.items()]
+    analytics.append((response.prediction_id, 'processing_time', response.processing_time, created_at))
+    return [prediction], analytics
+
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_buffer(rows: Sequence[tuple]) -> io.StringIO:
+    """Rows in COPY's text format: tab-separated, ``\\N`` for NULL."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join('\\N' if value is None else str(value).translate(_COPY_ESCAPES)
+                                for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    return buffer
+
+
+class PostgresSink:
+    """Writes batches with COPY over a psycopg2 connection pool."""
+
+    def __init__(self, url: str, pool_size: int = 2):
+        from psycopg2.pool import ThreadedConnectionPool  # only needed with a PostgreSQL URL
+        self.pool = ThreadedConnectionPool(1, pool_size, url)
+
+    def write(self, predictions: Sequence[tuple], analytics: Sequence[tuple]) -> None:
+        conn = self.pool.getconn()
+        broken = False
+        try:
+            with conn, conn.cursor() as cursor:
+                # Predictions first: analytics rows reference them
+                cursor.copy_expert(
+                    f"COPY predictions ({', '.join(PREDICTION_COLUMNS)}) FROM STDIN",
+                    _copy_buffer(predictions))
+                cursor.copy_expert(
+                    f"COPY analytics ({', '.join(ANALYTICS_COLUMNS)}) FROM STDIN",
+                    _copy_buffer(analytics))
+        except Exception:
+            broken = bool(conn.closed)
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """A pooled connection for reads (the analytics endpoints)."""
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.rollback()  # end the read transaction
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self) -> None:
+        self.pool.closeall()
+
+
+class SQLiteSink:
+    """Writes batches with multi-row inserts into a SQLite file (development, tests)."""
+
+    def __init__(self, path: str):
+        # Only the writer thread uses the connection, one flush at a time
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SQLITE_SCHEMA + SQLITE_ROLLUP_SCHEMA)
+
+    def write(self, predictions: Sequence[tuple], analytics: Sequence[tuple]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO predictions ({', '.join(PREDICTION_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(PREDICTION_COLUMNS))})", predictions)
+            self.conn.executemany(
+                f"INSERT INTO analytics ({', '.join(ANALYTICS_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(ANALYTICS_COLUMNS))})", analytics)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """A separate connection for reads, so they never wait on the writer thread's."""
+        conn = sqlite3.connect(self.path)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def sink_from_url(url: str, pool_size: int = 2) -> Any:
+    """Sink for a ``postgresql://`` or ``sqlite:///`` URL."""
+    if url.startswith('sqlite:///'):
+        return SQLiteSink(url[len('sqlite:///'):])
+    if url.startswith(('postgresql://', 'postgres://')):
+        return PostgresSink(url, pool_size)
+    raise ValueError(f"Unsupported DATABASE_URL scheme: {url.split(':', 1)[0]}")
+
+
+class WriterStats:
+    """Counters for the persistence queue and its flushes."""
+
+    def __init__(self):
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+
+    def as_dict(self, queue_depth: int) -> Dict[str, float]:
+        return {
+            'queue_depth': queue_depth,
+            'queued': self.queued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'avg_flush_rows': self.written / self.flushes if self.flushes else 0.0,
+            'last_flush_seconds': self.last_flush_seconds,
+        }
+
+
+class PredictionWriter:
+    """Buffers predictions and flushes them to ``sink`` in the background.
+
+    ``sink.write(predictions, analytics)`` writes one batch in one
+    transaction. It runs on a single dedicated thread, so a slow database
+    never occupies the threads that score requests.
+    """
+
+    def __init__(self, sink: Any, flush_rows: int = 500, flush_interval_ms: float = 1000.0,
+                 max_queue: int = 50000):
+        self.sink = sink
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue = max_queue
+        self.stats = WriterStats()
+        self._queue: Optional['asyncio.Queue[Tuple[Any, Any]]'] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def metrics(self) -> Dict[str, float]:
+        return self.stats.as_dict(self.queue_depth)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='persist')
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what is queued, then stop the worker and close the sink."""
+        if not self.running:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        self._executor.shutdown(wait=True)
+        self.sink.close()
+
+    def record(self, video: Any, response: Any) -> bool:
+        """Queue one prediction for writing; False if it was dropped."""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait((video, response))
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            metrics.count_persisted('dropped', 1)
+            return False
+        self.stats.queued += 1
+        return True
+
+    async def _next_batch(self) -> List[Tuple[Any, Any]]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_rows:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _write(self, batch: List[Tuple[Any, Any]]) -> None:
+        predictions, analytics = [], []
+        for video, response in batch:
+            rows = prediction_rows(video, response)
+            predictions.extend(rows[0])
+            analytics.extend(rows[1])
+        self.sink.write(predictions, analytics)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(self._executor, self._write, batch)
+                self.stats.written += len(batch)
+                metrics.count_persisted('written', len(batch))
+            except Exception as e:
+                # Not retried: keeping failed batches around would grow without bound
+                logger.warning("Dropping %d predictions, database write failed: %s", len(batch), e)
+                self.stats.failed += len(batch)
+                metrics.count_persisted('failed', len(batch))
+            finally:
+                self.stats.flushes += 1
+                self.stats.last_flush_seconds = time.perf_counter() - started
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,81 @@
+"""
+Low-overhead sampling profiler.
+
+A daemon thread snapshots every other thread's Python stack every
+``interval`` seconds and counts identical stacks. Nothing is hooked into
+the profiled code, so it can be switched on in production for a few
+minutes (``PROFILER_ENABLED=1``, or the /debug/profiler endpoints) and
+its output fed straight into flamegraph.pl / speedscope (collapsed
+stack format).
+"""
+
+import sys
+import threading
+from collections import Counter
+from typing import List, Optional, Tuple
+
+
+class SamplingProfiler:
+    """Periodic stack sampler; ``collapsed()`` returns 'frame;frame;frame count' lines."""
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+        self._thread = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    def top(self, n: int = 20) -> List[Tuple[str, int]]:
+        """Most frequently sampled stacks."""
+        with self._lock:
+            return self._stacks.most_common(n)
+
+    def collapsed(self) -> str:
+        """All stacks in collapsed format (one 'a;b;c count' line each)."""
+        with self._lock:
+            return '\n'.join(f"{stack} {count}" for stack, count in self._stacks.most_common())
+
+
+profiler = SamplingProfiler()
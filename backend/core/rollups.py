@@ -0,0 +1,239 @@
+"""
+Dashboard analytics served from the rollup tables.
+
+``init.sql`` keeps ``prediction_daily_rollup`` and
+``prediction_accuracy_rollup`` current with statement-level triggers on
+``predictions``. Each has one row per UTC day and category, plus an
+accuracy bucket for the second table. The queries here read only those
+tables, so a 30-day dashboard reads ``30 x categories`` rows whether
+``predictions`` holds a thousand rows or hundreds of millions.
+
+SQLite gets the same tables, kept current by row-level triggers, so the
+local stand-in (``DATABASE_URL=sqlite:///...``) serves the same endpoints.
+"""
+
+import sqlite3
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+TIME_RANGES = {'7d': 7, '30d': 30, '90d': 90, '1y': 365}
+
+# Categories need this many rated predictions to be "best performing" by accuracy
+MIN_SCORED_FOR_BEST = 10
+
+_ROLLUP_TABLES = """
+CREATE TABLE IF NOT EXISTS prediction_daily_rollup (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    predictions INTEGER NOT NULL DEFAULT 0,
+    predicted_views_sum INTEGER NOT NULL DEFAULT 0,
+    with_actual INTEGER NOT NULL DEFAULT 0,
+    predicted_views_with_actual_sum INTEGER NOT NULL DEFAULT 0,
+    actual_views_sum INTEGER NOT NULL DEFAULT 0,
+    scored INTEGER NOT NULL DEFAULT 0,
+    accuracy_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category)
+);
+CREATE TABLE IF NOT EXISTS prediction_accuracy_rollup (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    predictions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category, bucket)
+);
+"""
+
+# Columns the rollups depend on; updates touching none of them are ignored
+_ROLLED_UP = ('created_at', 'category', 'predicted_views', 'actual_views', 'accuracy_score')
+
+
+def _sqlite_delta(row: str, sign: int) -> str:
+    """Upserts adding one ``new``/``old`` trigger row to the rollups with ``sign``."""
+    day, category = f"date({row}.created_at)", f"COALESCE({row}.category, '')"
+    return f"""
+    INSERT INTO prediction_daily_rollup
+        (day, category, predictions, predicted_views_sum, with_actual,
+         predicted_views_with_actual_sum, actual_views_sum, scored, accuracy_sum)
+    VALUES ({day}, {category}, {sign}, {sign} * {row}.predicted_views,
+            CASE WHEN {row}.actual_views IS NOT NULL THEN {sign} ELSE 0 END,
+            CASE WHEN {row}.actual_views IS NOT NULL THEN {sign} * {row}.predicted_views ELSE 0 END,
+            {sign} * COALESCE({row}.actual_views, 0),
+            CASE WHEN {row}.accuracy_score IS NOT NULL THEN {sign} ELSE 0 END,
+            {sign} * COALESCE({row}.accuracy_score, 0))
+    ON CONFLICT (day, category) DO UPDATE SET
+        predictions = predictions + excluded.predictions,
+        predicted_views_sum = predicted_views_sum + excluded.predicted_views_sum,
+        with_actual = with_actual + excluded.with_actual,
+        predicted_views_with_actual_sum =
+            predicted_views_with_actual_sum + excluded.predicted_views_with_actual_sum,
+        actual_views_sum = actual_views_sum + excluded.actual_views_sum,
+        scored = scored + excluded.scored,
+        accuracy_sum = accuracy_sum + excluded.accuracy_sum;
+    INSERT INTO prediction_accuracy_rollup (day, category, bucket, predictions)
+    SELECT {day}, {category}, MIN(MAX(CAST({row}.accuracy_score * 10 AS INTEGER), 0), 9), {sign}
+    WHERE {row}.accuracy_score IS NOT NULL
+    ON CONFLICT (day, category, bucket) DO UPDATE SET predictions = predictions + excluded.predictions;
+    """
+
+
+_CHANGED = ' OR '.join(f'new.{column} IS NOT old.{column}' for column in _ROLLED_UP)
+
+SQLITE_ROLLUP_SCHEMA = _ROLLUP_TABLES + f"""
+CREATE TRIGGER IF NOT EXISTS predictions_rollup_insert AFTER INSERT ON predictions BEGIN
+    {_sqlite_delta('new', 1)}
+END;
+CREATE TRIGGER IF NOT EXISTS predictions_rollup_update AFTER UPDATE ON predictions
+WHEN {_CHANGED} BEGIN
+    {_sqlite_delta('old', -1)}
+    {_sqlite_delta('new', 1)}
+END;
+CREATE TRIGGER IF NOT EXISTS predictions_rollup_delete AFTER DELETE ON predictions BEGIN
+    {_sqlite_delta('old', -1)}
+END;
+"""
+
+
+def _is_sqlite(conn: Any) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+
+def fetch_all(conn: Any, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+    """Run ``sql`` (``?`` placeholders) on a SQLite or psycopg2 connection."""
+    if not _is_sqlite(conn):
+        sql = sql.replace('?', '%s')  # psycopg2 paramstyle
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, tuple(params))
+        # PostgreSQL sums of BIGINT come back as Decimal
+        return [tuple(float(v) if isinstance(v, Decimal) else v for v in row)
+                for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def refresh(conn: Any, from_day: Optional[date] = None, to_day: Optional[date] = None) -> None:
+    """Recompute the rollups of ``[from_day, to_day]`` (all days by default) from predictions.
+
+    The triggers keep the rollups current; this is the periodic repair or
+    backfill job, e.g. after bulk loads with triggers disabled.
+    """
+    if not _is_sqlite(conn):
+        fetch_all(conn, "SELECT refresh_prediction_rollups(?, ?)",
+              (from_day.isoformat() if from_day else None, to_day.isoformat() if to_day else None))
+        conn.commit()
+        return
+    low = from_day.isoformat() if from_day else '0000-01-01'
+    high = to_day.isoformat() if to_day else '9999-12-31'
+    with conn:
+        for table in ('prediction_daily_rollup', 'prediction_accuracy_rollup'):
+            conn.execute(f"DELETE FROM {table} WHERE day BETWEEN ? AND ?", (low, high))
+        conn.execute("""
+            INSERT INTO prediction_daily_rollup
+                (day, category, predictions, predicted_views_sum, with_actual,
+                 predicted_views_with_actual_sum, actual_views_sum, scored, accuracy_sum)
+            SELECT date(created_at), COALESCE(category, ''), COUNT(*), SUM(predicted_views),
+                   COUNT(actual_views),
+                   SUM(CASE WHEN actual_views IS NOT NULL THEN predicted_views ELSE 0 END),
+                   COALESCE(SUM(actual_views), 0), COUNT(accuracy_score),
+                   COALESCE(SUM(accuracy_score), 0)
+            FROM predictions WHERE date(created_at) BETWEEN ? AND ?
+            GROUP BY 1, 2""", (low, high))
+        conn.execute("""
+            INSERT INTO prediction_accuracy_rollup (day, category, bucket, predictions)
+            SELECT date(created_at), COALESCE(category, ''),
+                   MIN(MAX(CAST(accuracy_score * 10 AS INTEGER), 0), 9), COUNT(*)
+            FROM predictions
+            WHERE accuracy_score IS NOT NULL AND date(created_at) BETWEEN ? AND ?
+            GROUP BY 1, 2, 3""", (low, high))
+
+
+def _window(days: int, today: Optional[date]) -> List[str]:
+    today = today or date.today()
+    return [(today - timedelta(days=days - 1)).isoformat(), today.isoformat()]
+
+
+def _mean(total: float, count: int) -> Optional[float]:
+    return total / count if count else None
+
+
+def dashboard(conn: Any, days: int = 30, today: Optional[date] = None) -> Dict[str, Any]:
+    """Summary, daily trends and per-category performance over the last ``days`` days."""
+    window = _window(days, today)
+    daily = fetch_all(conn, """
+        SELECT day, SUM(predictions), SUM(scored), SUM(accuracy_sum)
+        FROM prediction_daily_rollup WHERE day BETWEEN ? AND ?
+        GROUP BY day ORDER BY day""", window)
+    per_category = fetch_all(conn, """
+        SELECT category, SUM(predictions), SUM(predicted_views_sum), SUM(with_actual),
+               SUM(predicted_views_with_actual_sum), SUM(actual_views_sum),
+               SUM(scored), SUM(accuracy_sum)
+        FROM prediction_daily_rollup WHERE day BETWEEN ? AND ?
+        GROUP BY category ORDER BY SUM(predictions) DESC, category""", window)
+    buckets = fetch_all(conn, """
+        SELECT bucket, SUM(predictions) FROM prediction_accuracy_rollup
+        WHERE day BETWEEN ? AND ? GROUP BY bucket ORDER BY bucket""", window)
+
+    categories, scored_by_category = [], {}
+    for name, n, views, with_actual, predicted_with_actual, actual, scored, accuracy in per_category:
+        if not n:
+            continue
+        scored_by_category[name] = int(scored)
+        categories.append({
+            'category': name or None,
+            'predictions': int(n),
+            'average_accuracy': _mean(accuracy, scored),
+            'average_views': views / n,
+            'average_predicted_views_with_actual': _mean(predicted_with_actual, with_actual),
+            'average_actual_views': _mean(actual, with_actual),
+        })
+    total = sum(c['predictions'] for c in categories)
+    total_views = sum(c['average_views'] * c['predictions'] for c in categories)
+    scored_total = sum(int(row[6]) for row in per_category)
+    accuracy_total = sum(float(row[7]) for row in per_category)
+    named = [c for c in categories if c['category']]
+    rated = [c for c in named if scored_by_category[c['category']] >= MIN_SCORED_FOR_BEST]
+    # By accuracy once categories have enough feedback, by predicted views until then
+    best = (max(rated, key=lambda c: c['average_accuracy']) if rated
+            else max(named, key=lambda c: c['average_views']) if named else None)
+    return {
+        'summary': {
+            'total_predictions': total,
+            'average_accuracy': _mean(accuracy_total, scored_total),
+            'best_performing_category': best['category'] if best else None,
+            'total_predicted_views': int(round(total_views)),
+            'average_predicted_views': _mean(total_views, total),
+        },
+        'trends': {
+            'daily_predictions': [{'date': str(day)[:10], 'count': int(n)} for day, n, _, _ in daily],
+            'accuracy_trend': [{'date': str(day)[:10], 'accuracy': accuracy / scored}
+                               for day, _, scored, accuracy in daily if scored],
+        },
+        'category_performance': categories,
+        'accuracy_distribution': [{'bucket': f'{b / 10:.1f}-{(b + 1) / 10:.1f}', 'count': int(n)}
+                                  for b, n in buckets if n],
+    }
+
+
+def categories(conn: Any, days: int = 30, today: Optional[date] = None) -> Dict[str, Any]:
+    """Per-category volume and growth: the last ``days`` days against the ``days`` before."""
+    current, previous = _window(days, today), _window(2 * days, today)
+    rows = fetch_all(conn, """
+        SELECT category,
+               SUM(CASE WHEN day >= ? THEN predictions ELSE 0 END),
+               SUM(CASE WHEN day >= ? THEN predicted_views_sum ELSE 0 END),
+               SUM(CASE WHEN day < ? THEN predictions ELSE 0 END)
+        FROM prediction_daily_rollup WHERE day BETWEEN ? AND ? AND category <> ''
+        GROUP BY category""", [current[0], current[0], current[0]] + previous)
+    stats = [(name, int(n), views / n if n else 0.0, int(before)) for name, n, views, before in rows if n]
+    top_views = max((views for _, _, views, _ in stats), default=0.0)
+    result = [{
+        'name': name,
+        # Mean predicted views relative to the best category in the window
+        'trend_score': views / top_views if top_views else 0.0,
+        'average_views': views,
+        'prediction_count': n,
+        'growth_rate': (n - before) / before if before else None,
+    } for name, n, views, before in stats]
+    result.sort(key=lambda c: c['trend_score'], reverse=True)
+    return {'categories': result}
@@ -0,0 +1,41 @@
+"""
+Wall-clock timing helpers shared by the benchmarks and ``ml.distill``.
+
+Every result is either a latency (``p50_ms``/``p99_ms``/``mean_ms``) or a
+throughput (``rows_per_s``).
+"""
+
+import time
+from typing import Any, Callable, Dict
+
+import numpy as np
+
+
+def time_calls(fn: Callable[[], Any], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    """Per-call latency percentiles of ``fn`` in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    samples *= 1000
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+    }
+
+
+def time_throughput(fn: Callable[[], Any], rows: int, min_seconds: float) -> Dict[str, float]:
+    """Rows per second of ``fn`` (one call processes ``rows`` rows)."""
+    fn()
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return {'rows_per_s': rows * calls / elapsed}
@@ -28,6 +28,7 @@ CREATE TABLE IF NOT EXISTS predictions (
     user_id UUID REFERENCES users(id) ON DELETE SET NULL,
     
     -- Video data
+    video_id VARCHAR(100),  -- caller's id; joins observed views for accuracy tracking
     video_title VARCHAR(500) NOT NULL,
     video_description TEXT,
     duration INTEGER NOT NULL,
@@ -41,8 +42,8 @@ CREATE TABLE IF NOT EXISTS predictions (
     
     -- Prediction results
     predicted_views INTEGER NOT NULL,
-    confidence_lower INTEGER NOT NULL,
-    confidence_upper INTEGER NOT NULL,
+    confidence_lower INTEGER,  -- NULL when no interval calibration is loaded
+    confidence_upper INTEGER,
     prediction_quality VARCHAR(20) NOT NULL,
     expected_performance VARCHAR(200),
     key_factors JSONB,
@@ -56,6 +57,11 @@ CREATE TABLE IF NOT EXISTS predictions (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Databases created before intervals became optional / video ids were stored
+ALTER TABLE predictions ADD COLUMN IF NOT EXISTS video_id VARCHAR(100);
+ALTER TABLE predictions ALTER COLUMN confidence_lower DROP NOT NULL;
+ALTER TABLE predictions ALTER COLUMN confidence_upper DROP NOT NULL;
+
 -- Create analytics table
 CREATE TABLE IF NOT EXISTS analytics (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -65,14 +71,202 @@ CREATE TABLE IF NOT EXISTS analytics (
     recorded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Accuracy backfill progress (ml/accuracy.py), written in the same
+-- transaction as each page's UPDATE
+CREATE TABLE IF NOT EXISTS accuracy_backfill_checkpoints (
+    name VARCHAR(100) PRIMARY KEY,
+    state TEXT NOT NULL,
+    saved_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
-CREATE INDEX IF NOT EXISTS idx_predictions_user_id ON predictions(user_id);
-CREATE INDEX IF NOT EXISTS idx_predictions_created_at ON predictions(created_at);
-CREATE INDEX IF NOT EXISTS idx_predictions_category ON predictions(category);
 CREATE INDEX IF NOT EXISTS idx_analytics_prediction_id ON analytics(prediction_id);
-CREATE INDEX IF NOT EXISTS idx_analytics_metric_name ON analytics(metric_name);
+
+-- predictions and analytics are append-only logs in time order: BRIN
+-- indexes on the timestamps stay a few pages at any size, and composite
+-- indexes serve "this user/category over a date range"
+DROP INDEX IF EXISTS idx_predictions_user_id;
+DROP INDEX IF EXISTS idx_predictions_created_at;
+DROP INDEX IF EXISTS idx_predictions_category;
+DROP INDEX IF EXISTS idx_analytics_metric_name;
+CREATE INDEX IF NOT EXISTS idx_predictions_user_created ON predictions(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_category_created ON predictions(category, created_at);
+CREATE INDEX IF NOT EXISTS brin_predictions_created_at ON predictions
+    USING brin (created_at) WITH (pages_per_range = 32);
+CREATE INDEX IF NOT EXISTS idx_analytics_metric_recorded ON analytics(metric_name, recorded_at);
+CREATE INDEX IF NOT EXISTS brin_analytics_recorded_at ON analytics
+    USING brin (recorded_at) WITH (pages_per_range = 32);
+
+-- Dashboard rollups: one row per (UTC day, category), maintained by the
+-- statement-level triggers below, so dashboard queries read O(days) rows
+-- whatever the size of predictions. '' is the uncategorised bucket.
+CREATE TABLE IF NOT EXISTS prediction_daily_rollup (
+    day DATE NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    predictions BIGINT NOT NULL DEFAULT 0,
+    predicted_views_sum BIGINT NOT NULL DEFAULT 0,
+    -- Rows with actual_views: predicted vs actual over the same videos
+    with_actual BIGINT NOT NULL DEFAULT 0,
+    predicted_views_with_actual_sum BIGINT NOT NULL DEFAULT 0,
+    actual_views_sum BIGINT NOT NULL DEFAULT 0,
+    -- Rows with accuracy_score
+    scored BIGINT NOT NULL DEFAULT 0,
+    accuracy_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category)
+);
+
+-- accuracy_score histogram: bucket b holds scores in [b/10, (b+1)/10), 1.0 in 9
+CREATE TABLE IF NOT EXISTS prediction_accuracy_rollup (
+    day DATE NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    bucket SMALLINT NOT NULL,
+    predictions BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category, bucket)
+);
+
+-- The rolled-up columns of a changed prediction
+DO $$
+BEGIN
+    IF to_regtype('prediction_rollup_change') IS NULL THEN
+        CREATE TYPE prediction_rollup_change AS (
+            created_at TIMESTAMP WITH TIME ZONE,
+            category VARCHAR(100),
+            predicted_views INTEGER,
+            actual_views INTEGER,
+            accuracy_score FLOAT
+        );
+    END IF;
+END $$;
+
+-- Adds (direction 1) or subtracts (-1) `changes` in both rollups. The
+-- trigger reads its transition tables itself and passes the rows in: a
+-- nested function cannot see them, so no SQL naming them may be EXECUTEd here.
+DROP FUNCTION IF EXISTS add_to_prediction_rollups(TEXT);
+CREATE OR REPLACE FUNCTION add_to_prediction_rollups(direction INTEGER,
+                                                     changes prediction_rollup_change[])
+RETURNS VOID AS $$
+BEGIN
+    IF cardinality(changes) = 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO prediction_daily_rollup AS r
+        (day, category, predictions, predicted_views_sum, with_actual,
+         predicted_views_with_actual_sum, actual_views_sum, scored, accuracy_sum)
+    SELECT (c.created_at AT TIME ZONE 'UTC')::date, COALESCE(c.category, ''),
+           direction * COUNT(*),
+           direction * SUM(c.predicted_views::bigint),
+           direction * COUNT(c.actual_views),
+           direction * COALESCE(SUM(c.predicted_views::bigint) FILTER (WHERE c.actual_views IS NOT NULL), 0),
+           direction * COALESCE(SUM(c.actual_views::bigint), 0),
+           direction * COUNT(c.accuracy_score),
+           direction * COALESCE(SUM(c.accuracy_score), 0)
+    FROM unnest(changes) AS c
+    GROUP BY 1, 2
+    ON CONFLICT (day, category) DO UPDATE SET
+        predictions = r.predictions + EXCLUDED.predictions,
+        predicted_views_sum = r.predicted_views_sum + EXCLUDED.predicted_views_sum,
+        with_actual = r.with_actual + EXCLUDED.with_actual,
+        predicted_views_with_actual_sum =
+            r.predicted_views_with_actual_sum + EXCLUDED.predicted_views_with_actual_sum,
+        actual_views_sum = r.actual_views_sum + EXCLUDED.actual_views_sum,
+        scored = r.scored + EXCLUDED.scored,
+        accuracy_sum = r.accuracy_sum + EXCLUDED.accuracy_sum;
+
+    INSERT INTO prediction_accuracy_rollup AS r (day, category, bucket, predictions)
+    SELECT (c.created_at AT TIME ZONE 'UTC')::date, COALESCE(c.category, ''),
+           LEAST(GREATEST(FLOOR(c.accuracy_score * 10)::int, 0), 9), direction * COUNT(*)
+    FROM unnest(changes) AS c
+    WHERE c.accuracy_score IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, category, bucket) DO UPDATE SET
+        predictions = r.predictions + EXCLUDED.predictions;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One aggregated upsert per statement (a COPY batch of predictions is one
+-- statement), not one per row
+CREATE OR REPLACE FUNCTION maintain_prediction_rollups()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM add_to_prediction_rollups(1, ARRAY(
+            SELECT ROW(created_at, category, predicted_views, actual_views, accuracy_score)
+                   ::prediction_rollup_change
+            FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM add_to_prediction_rollups(-1, ARRAY(
+            SELECT ROW(created_at, category, predicted_views, actual_views, accuracy_score)
+                   ::prediction_rollup_change
+            FROM old_rows));
+    ELSE
+        -- Only rows whose rolled-up columns changed (e.g. actual_views feedback)
+        PERFORM add_to_prediction_rollups(-1, ARRAY(
+            SELECT ROW(o.created_at, o.category, o.predicted_views, o.actual_views, o.accuracy_score)
+                   ::prediction_rollup_change
+            FROM new_rows n JOIN old_rows o USING (id)
+            WHERE (n.created_at, n.category, n.predicted_views, n.actual_views, n.accuracy_score)
+                  IS DISTINCT FROM
+                  (o.created_at, o.category, o.predicted_views, o.actual_views, o.accuracy_score)));
+        PERFORM add_to_prediction_rollups(1, ARRAY(
+            SELECT ROW(n.created_at, n.category, n.predicted_views, n.actual_views, n.accuracy_score)
+                   ::prediction_rollup_change
+            FROM new_rows n JOIN old_rows o USING (id)
+            WHERE (n.created_at, n.category, n.predicted_views, n.actual_views, n.accuracy_score)
+                  IS DISTINCT FROM
+                  (o.created_at, o.category, o.predicted_views, o.actual_views, o.accuracy_score)));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS predictions_rollup_insert ON predictions;
+DROP TRIGGER IF EXISTS predictions_rollup_update ON predictions;
+DROP TRIGGER IF EXISTS predictions_rollup_delete ON predictions;
+CREATE TRIGGER predictions_rollup_insert AFTER INSERT ON predictions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_prediction_rollups();
+CREATE TRIGGER predictions_rollup_update AFTER UPDATE ON predictions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_prediction_rollups();
+CREATE TRIGGER predictions_rollup_delete AFTER DELETE ON predictions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION maintain_prediction_rollups();
+
+-- Periodic repair/backfill: recompute the rollups of [from_day, to_day]
+-- (all days by default) from predictions, one day at a time through the
+-- BRIN index. The locks make concurrent inserts wait, so their deltas
+-- land on the recomputed rows rather than being counted twice.
+CREATE OR REPLACE FUNCTION refresh_prediction_rollups(from_day DATE DEFAULT NULL,
+                                                      to_day DATE DEFAULT NULL)
+RETURNS VOID AS $$
+DECLARE
+    first_day DATE;
+    last_day DATE;
+    day_start TIMESTAMPTZ;
+BEGIN
+    LOCK TABLE prediction_daily_rollup, prediction_accuracy_rollup IN EXCLUSIVE MODE;
+    DELETE FROM prediction_daily_rollup
+        WHERE day >= COALESCE(from_day, '-infinity') AND day <= COALESCE(to_day, 'infinity');
+    DELETE FROM prediction_accuracy_rollup
+        WHERE day >= COALESCE(from_day, '-infinity') AND day <= COALESCE(to_day, 'infinity');
+    SELECT GREATEST((MIN(created_at) AT TIME ZONE 'UTC')::date, from_day),
+           LEAST((MAX(created_at) AT TIME ZONE 'UTC')::date, to_day)
+        INTO first_day, last_day FROM predictions;
+    FOR day_offset IN 0 .. COALESCE(last_day - first_day, -1) LOOP
+        day_start := (first_day + day_offset)::timestamp AT TIME ZONE 'UTC';
+        PERFORM add_to_prediction_rollups(1, ARRAY(
+            SELECT ROW(created_at, category, predicted_views, actual_views, accuracy_score)
+                   ::prediction_rollup_change
+            FROM predictions
+            WHERE created_at >= day_start AND created_at < day_start + INTERVAL '1 day'));
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT refresh_prediction_rollups();
 
 -- Insert sample data (optional)
 INSERT INTO users (email, username, password_hash) VALUES 
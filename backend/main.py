@@ -0,0 +1,117 @@
+"""
+ViralCast API.
+
+Run with:
+    uvicorn main:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import signal
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from api import analytics, health, monitoring, predictions
+from core import metrics
+from core.batcher import MicroBatcher
+from core.config import settings
+from core.persistence import PredictionWriter, sink_from_url
+from core.profiler import profiler
+from ml.cache import CachedPredictor
+from ml.cascade import cascade_predictor
+from ml.predictor import get_predictor
+from ml.registry import ModelRegistry
+from ml.versioning import ModelReloader
+
+
+def load_predictor(model_path: Path):
+    """Predictor for a model directory, in the configured PREDICT_MODE."""
+    registry = ModelRegistry(model_path)
+    return cascade_predictor(registry) if settings.predict_mode == 'cascade' else registry.predictor()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load (or compile) the models before accepting traffic
+    if settings.predict_mode == 'cascade':
+        predictor = cascade_predictor()
+    else:
+        predictor = get_predictor()
+    app.state.predictor = CachedPredictor(predictor)
+    # Swap in new model versions without a restart (ml/versioning.py)
+    reloader = app.state.reloader = ModelReloader(app.state.predictor, load_predictor)
+    await reloader.start()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reloader.trigger)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass  # no SIGHUP (Windows) or not on the main thread (test clients)
+    app.state.batcher = MicroBatcher(
+        partial(predictions.score_videos, app.state.predictor),
+        max_batch_size=settings.batch_max_size,
+        max_wait_ms=settings.batch_max_wait_ms,
+        max_queue=settings.batch_queue_size,
+    )
+    batcher = app.state.batcher
+    metrics.register_gauge('viralcast_batcher_queue_depth', 'Requests waiting for a micro-batch',
+                           lambda: batcher.queue_depth)
+    metrics.register_gauge('viralcast_batcher_rejected', 'Requests rejected with a full queue',
+                           lambda: batcher.stats.rejected)
+    app.state.database = app.state.writer = None
+    if settings.database_url:
+        app.state.database = sink_from_url(settings.database_url, settings.db_pool_size)
+        writer = app.state.writer = PredictionWriter(
+            app.state.database,
+            flush_rows=settings.persist_flush_rows,
+            flush_interval_ms=settings.persist_flush_interval_ms,
+            max_queue=settings.persist_queue_size,
+        )
+        metrics.register_gauge('viralcast_persist_queue_depth', 'Predictions waiting to be written',
+                               lambda: writer.queue_depth)
+        await writer.start()
+    if settings.profiler_enabled:
+        profiler.interval = settings.profiler_interval_ms / 1000
+        profiler.start()
+    await batcher.start()
+    yield
+    await batcher.stop()
+    await reloader.stop()
+    if app.state.writer is not None:
+        await app.state.writer.stop()
+    profiler.stop()
+
+
+app = FastAPI(
+    title=settings.project_name,
+    version=settings.version,
+    description="YouTube video success prediction API",
+    docs_url="/docs",
+    redoc_url="/redoc",
+    lifespan=lifespan,
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=settings.cors_origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(predictions.router, prefix=settings.api_v1_str)
+app.include_router(health.router, prefix=settings.api_v1_str)
+app.include_router(analytics.router, prefix=settings.api_v1_str)
+app.include_router(monitoring.router)
+if settings.debug or settings.profiler_enabled:
+    app.include_router(monitoring.profiler_router, prefix=settings.api_v1_str)
+
+
+@app.get("/")
+async def root():
+    return {
+        "message": "Welcome to ViralCast API",
+        "version": settings.version,
+        "docs": "/docs",
+    }
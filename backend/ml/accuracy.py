@@ -0,0 +1,324 @@
+"""
+Accuracy backfill: fill ``actual_views`` / ``accuracy_score`` from observed views.
+
+The job reads a local export of observed view counts (``video_id``,
+``view_count``; CSV, JSON Lines or Parquet) into sorted NumPy arrays. It
+then walks ``predictions`` in primary-key order with keyset pagination
+(``WHERE id > last_id ORDER BY id LIMIT n``). Every page is an index
+range scan, however deep into the table the job is, where ``OFFSET``
+would re-read all earlier rows. Each page:
+
+* joins its ``video_id`` values to the export with ``np.searchsorted``
+* reads the per-model predictions of those rows from ``analytics``
+  (``<model>_views``, written by ``core.persistence``)
+* adds the per-model and per-category errors to running sums
+  (``np.bincount`` over group codes, no Python loop per row)
+* writes ``actual_views`` and ``accuracy_score`` back in one bulk UPDATE,
+  skipping rows whose values are unchanged
+* saves the page's last id and the running sums as a named row of
+  ``accuracy_backfill_checkpoints``, and commits
+
+The UPDATE and the checkpoint commit in one transaction, so an interrupted
+run resumes where it stopped without counting any page twice. ``pause_ms``
+between pages and a bounded page size keep the load on the database
+steady.
+
+    python cli.py backfill-accuracy observed.csv --checkpoint nightly
+
+``accuracy_score`` is ``1 - |predicted - actual| / actual``, clipped to
+[0, 1].
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.rollups import fetch_all
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 5000
+VIEWS_SUFFIX = '_views'
+HEADLINE = 'headline'  # predictions.predicted_views, as served
+
+# Running sums per group; see ErrorSums.summary for the derived metrics
+_SUMS = ('n', 'abs_log', 'sq_log', 'log', 'ape', 'accuracy')
+
+
+def accuracy_scores(predicted: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """``1 - |predicted - actual| / actual`` clipped to [0, 1] (actual 0 counts as 1)."""
+    predicted = np.asarray(predicted, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    return np.clip(1 - np.abs(predicted - actual) / np.maximum(actual, 1), 0, 1)
+
+
+class ErrorSums:
+    """Additive error sums per group, so pages and resumed runs combine exactly."""
+
+    def __init__(self, sums: Optional[Dict[str, List[float]]] = None):
+        self.sums: Dict[str, List[float]] = {k: list(v) for k, v in (sums or {}).items()}
+
+    def add(self, groups: np.ndarray, predicted: np.ndarray, actual: np.ndarray) -> None:
+        names, codes = np.unique(np.asarray(groups, dtype=str), return_inverse=True)
+        log_error = np.log1p(np.maximum(predicted, 0)) - np.log1p(actual)
+        ape = np.abs(predicted - actual) / np.maximum(actual, 1)
+        columns = (np.ones(len(codes)), np.abs(log_error), log_error ** 2, log_error, ape,
+                   accuracy_scores(predicted, actual))
+        totals = np.stack([np.bincount(codes, weights=c, minlength=len(names)) for c in columns], axis=1)
+        for name, row in zip(names.tolist(), totals.tolist()):
+            current = self.sums.setdefault(name, [0.0] * len(_SUMS))
+            self.sums[name] = [a + b for a, b in zip(current, row)]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, values in sorted(self.sums.items()):
+            s = dict(zip(_SUMS, values))
+            n = s['n']
+            result[name] = {
+                'rows': int(n),
+                'mae_log': s['abs_log'] / n,
+                'rmse_log': (s['sq_log'] / n) ** 0.5,
+                'bias_log': s['log'] / n,  # > 0: over-predicts
+                'mape': s['ape'] / n,
+                'mean_accuracy': s['accuracy'] / n,
+            }
+        return result
+
+
+def load_observed(path: str, key: str = 'video_id', views: str = 'view_count',
+                  input_format: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Observed views as (sorted keys, views); the last row wins for repeated keys."""
+    from ml.bulk import detect_format
+
+    fmt = input_format or detect_format(path)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=[key, views])
+        keys, values = table.column(key).to_numpy(zero_copy_only=False), table.column(views).to_numpy()
+    else:
+        import pandas as pd
+        if fmt == 'csv':
+            frame = pd.read_csv(path, usecols=[key, views], dtype={key: str})
+        else:
+            frame = pd.read_json(path, lines=True, dtype={key: str})[[key, views]]
+        keys, values = frame[key].to_numpy(), frame[views].to_numpy()
+    keys = np.asarray(keys, dtype=str)
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(values) & (values >= 0)
+    keys, values = keys[valid], values[valid]
+    # Stable sort, then keep each key's last occurrence
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.zeros(0, dtype=bool)
+    return keys[last], values[last].astype(np.int64)
+
+
+def match(keys: np.ndarray, observed: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """(mask of keys found in ``observed``, their views)."""
+    sorted_keys, views = observed
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool), np.zeros(0, dtype=np.int64)
+    keys = np.asarray(keys, dtype=str)
+    position = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    found = sorted_keys[position] == keys
+    return found, views[position[found]]
+
+
+def _is_sqlite(conn: Any) -> bool:
+    return isinstance(conn, sqlite3.Connection)
+
+
+def _execute(conn: Any, sql: str, params: Sequence[Any] = ()) -> None:
+    """Run a statement without results (``?`` placeholders), not committed."""
+    if not _is_sqlite(conn):
+        sql = sql.replace('?', '%s')
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, tuple(params))
+    finally:
+        cursor.close()
+
+
+def fetch_page(conn: Any, last_id: Optional[str], page_size: int) -> List[tuple]:
+    """(id, video_id, category, predicted_views) of the next page with a video id."""
+    after = "AND id > ?" if last_id is not None else ""
+    params = [last_id] if last_id is not None else []
+    return fetch_all(conn, f"""
+        SELECT id, video_id, COALESCE(category, ''), predicted_views FROM predictions
+        WHERE video_id IS NOT NULL {after} ORDER BY id LIMIT ?""", params + [page_size])
+
+
+def fetch_model_predictions(conn: Any, ids: Sequence[str]) -> List[tuple]:
+    """(prediction_id, model, views) of the per-model rows in ``analytics``."""
+    if not ids:
+        return []
+    if _is_sqlite(conn):
+        where, params = f"prediction_id IN ({', '.join('?' * len(ids))})", list(ids)
+    else:
+        where, params = "prediction_id = ANY(?::uuid[])", [list(ids)]
+    rows = fetch_all(conn, f"""
+        SELECT prediction_id, metric_name, metric_value FROM analytics
+        WHERE {where} AND metric_name LIKE ?""", params + ['%' + VIEWS_SUFFIX])
+    return [(str(pid), name[:-len(VIEWS_SUFFIX)], value) for pid, name, value in rows]
+
+
+def write_page(conn: Any, updates: Sequence[Tuple[str, int, float]]) -> int:
+    """Set (id, actual_views, accuracy_score) in one statement; returns rows changed."""
+    if not updates:
+        return 0
+    cursor = conn.cursor()
+    try:
+        if _is_sqlite(conn):
+            cursor.executemany("""
+                UPDATE predictions SET actual_views = ?, accuracy_score = ?
+                WHERE id = ? AND (actual_views IS NOT ? OR accuracy_score IS NOT ?)""",
+                [(actual, score, pid, actual, score) for pid, actual, score in updates])
+        else:
+            from psycopg2.extras import execute_values
+            # One UPDATE ... FROM (VALUES ...) per page; rollup triggers fire once
+            execute_values(cursor, """
+                UPDATE predictions AS p SET actual_views = v.actual, accuracy_score = v.accuracy
+                FROM (VALUES %s) AS v (id, actual, accuracy)
+                WHERE p.id = v.id::uuid
+                  AND (p.actual_views, p.accuracy_score) IS DISTINCT FROM (v.actual, v.accuracy)""",
+                updates, page_size=len(updates))
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+class Checkpoint:
+    """Progress of a backfill run: a row of ``accuracy_backfill_checkpoints``.
+
+    ``save`` does not commit; the page's UPDATE and its checkpoint commit
+    together. Without a name nothing is stored.
+    """
+
+    def __init__(self, name: Optional[str], source: str):
+        self.name = name
+        self.source = source
+        self.last_id: Optional[str] = None
+        self.counts = {'pages': 0, 'rows_seen': 0, 'rows_matched': 0, 'rows_updated': 0}
+        self.by_model = ErrorSums()
+        self.by_category = ErrorSums()
+
+    @classmethod
+    def resume(cls, conn: Any, name: Optional[str], source: str) -> 'Checkpoint':
+        checkpoint = cls(name, source)
+        if name is None:
+            return checkpoint
+        rows = fetch_all(conn, "SELECT state FROM accuracy_backfill_checkpoints WHERE name = ?", [name])
+        if not rows:
+            return checkpoint
+        state = json.loads(rows[0][0])
+        if state['source'] != source:
+            raise ValueError(f"Checkpoint {name!r} belongs to a backfill of {state['source']}; "
+                             "pass --restart or another --checkpoint")
+        checkpoint.last_id = state['last_id']
+        checkpoint.counts.update(state['counts'])
+        checkpoint.by_model = ErrorSums(state['by_model'])
+        checkpoint.by_category = ErrorSums(state['by_category'])
+        return checkpoint
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            'source': self.source,
+            'last_id': self.last_id,
+            'counts': self.counts,
+            'by_model': self.by_model.sums,
+            'by_category': self.by_category.sums,
+            'saved_at': datetime.utcnow().isoformat(),
+        }
+
+    def save(self, conn: Any) -> None:
+        if self.name is not None:
+            _execute(conn, """
+                INSERT INTO accuracy_backfill_checkpoints (name, state, saved_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (name) DO UPDATE SET state = excluded.state, saved_at = excluded.saved_at""",
+                [self.name, json.dumps(self.state())])
+
+    @staticmethod
+    def discard(conn: Any, name: str) -> None:
+        _execute(conn, "DELETE FROM accuracy_backfill_checkpoints WHERE name = ?", [name])
+        conn.commit()
+
+    def report(self) -> Dict[str, Any]:
+        return {**self.counts, 'by_model': self.by_model.summary(),
+                'by_category': self.by_category.summary()}
+
+
+def backfill_page(conn: Any, page: List[tuple], observed: Tuple[np.ndarray, np.ndarray],
+                  checkpoint: Checkpoint) -> None:
+    """Score one page against the observed views, write it back and commit with its checkpoint."""
+    try:
+        _score_page(conn, page, observed, checkpoint)
+        checkpoint.last_id = str(page[-1][0])
+        checkpoint.counts['pages'] += 1
+        checkpoint.save(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def _score_page(conn: Any, page: List[tuple], observed: Tuple[np.ndarray, np.ndarray],
+                checkpoint: Checkpoint) -> None:
+    ids = np.array([str(row[0]) for row in page])
+    found, actual = match([row[1] for row in page], observed)
+    checkpoint.counts['rows_seen'] += len(page)
+    checkpoint.counts['rows_matched'] += int(found.sum())
+    if found.any():
+        ids_found = ids[found]
+        categories = np.array([row[2] for row in page])[found]
+        predicted = np.array([row[3] for row in page], dtype=np.float64)[found]
+        scores = accuracy_scores(predicted, actual)
+        changed = write_page(conn, list(zip(ids_found.tolist(), actual.tolist(), scores.tolist())))
+        checkpoint.counts['rows_updated'] += max(changed, 0)
+
+        checkpoint.by_category.add(categories, predicted, actual)
+        checkpoint.by_model.add(np.full(len(predicted), HEADLINE), predicted, actual)
+        models = fetch_model_predictions(conn, ids_found.tolist())
+        if models:
+            position = {pid: i for i, pid in enumerate(ids_found.tolist())}
+            rows = np.array([position[pid] for pid, _, _ in models])
+            checkpoint.by_model.add(np.array([name for _, name, _ in models]),
+                                    np.array([views for _, _, views in models], dtype=np.float64),
+                                    actual[rows])
+
+
+def run_backfill(conn: Any, observed_path: str, checkpoint: Optional[str] = None,
+                 page_size: int = DEFAULT_PAGE_SIZE, pause_ms: float = 0.0,
+                 max_pages: Optional[int] = None, restart: bool = False,
+                 input_format: Optional[str] = None, **observed_kwargs) -> Dict[str, Any]:
+    """Backfill every stored prediction with a video id in ``observed_path``.
+
+    Resumes from the checkpoint row named ``checkpoint`` unless ``restart``. Stops after
+    ``max_pages`` pages if given, e.g. to spread a run over several nights.
+    Returns the counts and per-model / per-category metrics so far.
+    """
+    source = str(Path(observed_path).resolve())
+    name = checkpoint
+    if restart and name is not None:
+        Checkpoint.discard(conn, name)
+    checkpoint = Checkpoint.resume(conn, name, source)
+    observed = load_observed(observed_path, input_format=input_format, **observed_kwargs)
+    logger.info("Loaded %d observed videos; resuming after %s", len(observed[0]), checkpoint.last_id)
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        page = fetch_page(conn, checkpoint.last_id, page_size)
+        if not page:
+            break
+        backfill_page(conn, page, observed, checkpoint)
+        pages += 1
+        if pages % 100 == 0:
+            logger.info("%d pages, %s", checkpoint.counts['pages'], checkpoint.counts)
+        if pause_ms:
+            time.sleep(pause_ms / 1000)
+    return checkpoint.report()
@@ -0,0 +1,318 @@
+"""
+Streaming bulk scoring for large exports.
+
+Input files are read as a generator of column chunks, each chunk is
+scored with the batch predictor and written out before the next one is
+read, so memory stays flat regardless of file size.
+
+Formats: CSV and JSON Lines (NumPy/pandas only) and Parquet (needs
+pyarrow).
+
+Rows whose ``upload_date`` is missing or unparseable are rejected, not
+scored: every age feature would be derived from NaT. The progress lines
+count them.
+"""
+
+import csv
+import itertools
+import json
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.feature_engineering import (
+    ALL_FEATURE_NAMES, INPUT_FIELDS, compute_features, num_rows, to_columns,
+)
+from utils.text_features import optional_inputs
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+_EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.parquet': 'parquet'}
+
+TEXT_FIELDS = ('title', 'description', 'tags')
+Chunk = Dict[str, Any]
+
+
+def detect_format(path: str) -> str:
+    """Format from a file extension (``.csv``, ``.jsonl``/``.ndjson``, ``.parquet``)."""
+    suffix = Path(path).suffix.lower()
+    if suffix not in _EXTENSIONS:
+        raise ValueError(f"Cannot infer format of {path}; pass --format ({', '.join(FORMATS)})")
+    return _EXTENSIONS[suffix]
+
+
+def _clean_text(columns: Chunk) -> Chunk:
+    """Missing titles, descriptions and tags become empty strings."""
+    for field in TEXT_FIELDS:
+        values = columns[field]
+        if any(not isinstance(v, str) for v in values):
+            columns[field] = ['' if v is None or v != v else str(v) for v in values]
+    return columns
+
+
+def _parse_dates(values: Any) -> np.ndarray:
+    """``datetime64[D]`` per value; NaT for blank, missing or unparseable dates."""
+    try:
+        return np.asarray(values, dtype='datetime64[D]')
+    except (TypeError, ValueError):
+        days = np.empty(len(values), dtype='datetime64[D]')
+        for i, value in enumerate(values):
+            try:
+                days[i] = np.datetime64(value, 'D')
+            except (TypeError, ValueError):
+                days[i] = np.datetime64('NaT')
+        return days
+
+
+def dated_rows(columns: Chunk) -> Tuple[Chunk, int]:
+    """The rows of a chunk with a valid ``upload_date``, and how many were dropped."""
+    days = _parse_dates(columns['upload_date'])
+    valid = ~np.isnat(days)
+    rejected = len(valid) - int(valid.sum())
+    if rejected:
+        columns = {name: (values[valid] if isinstance(values, np.ndarray)
+                          else list(itertools.compress(values, valid)))
+                   for name, values in columns.items()}
+    return columns, rejected
+
+
+def read_csv(path: str, chunk_size: int, keep: Sequence[str] = ()) -> Iterator[Chunk]:
+    import pandas as pd
+    usecols = list(INPUT_FIELDS) + [c for c in keep if c not in INPUT_FIELDS]
+    reader = pd.read_csv(path, usecols=usecols, chunksize=chunk_size,
+                         dtype={field: str for field in TEXT_FIELDS + ('upload_date',)},
+                         keep_default_na=False, na_values={'duration': [''], 'like_count': [''],
+                                                           'dislike_count': ['']})
+    for frame in reader:
+        yield _clean_text({column: frame[column].to_numpy() for column in usecols})
+
+
+def read_jsonl(path: str, chunk_size: int, keep: Sequence[str] = ()) -> Iterator[Chunk]:
+    fields = list(INPUT_FIELDS) + [c for c in keep if c not in INPUT_FIELDS]
+    with _open_text(path, 'r') as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            rows = [json.loads(line) for line in itertools.islice(lines, chunk_size)]
+            if not rows:
+                return
+            yield _clean_text({field: [row.get(field) for row in rows] for field in fields})
+
+
+def read_parquet(path: str, chunk_size: int, keep: Sequence[str] = ()) -> Iterator[Chunk]:
+    import pyarrow.parquet as pq
+    fields = list(INPUT_FIELDS) + [c for c in keep if c not in INPUT_FIELDS]
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=fields):
+        columns = {field: batch.column(field).to_numpy(zero_copy_only=False) for field in fields}
+        upload_date = batch.column('upload_date')
+        if not str(upload_date.type).startswith('string'):
+            # date32/timestamp columns -> datetime64
+            columns['upload_date'] = upload_date.to_numpy(zero_copy_only=False).astype('datetime64[D]')
+        yield _clean_text(columns)
+
+
+READERS: Dict[str, Callable[..., Iterator[Chunk]]] = {
+    'csv': read_csv, 'jsonl': read_jsonl, 'parquet': read_parquet,
+}
+
+
+@contextmanager
+def _open_text(path: str, mode: str):
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+    else:
+        with open(path, mode, newline='' if mode == 'w' else None, encoding='utf-8') as f:
+            yield f
+
+
+class CsvWriter:
+    def __init__(self, path: str):
+        self._context = _open_text(path, 'w')
+        self._writer = csv.writer(self._context.__enter__())
+        self._header = False
+
+    def write(self, columns: Dict[str, Any]) -> None:
+        names = list(columns)
+        if not self._header:
+            self._writer.writerow(names)
+            self._header = True
+        self._writer.writerows(zip(*(_to_list(columns[name]) for name in names)))
+
+    def close(self) -> None:
+        self._context.__exit__(None, None, None)
+
+
+class JsonlWriter:
+    def __init__(self, path: str):
+        self._context = _open_text(path, 'w')
+        self._file = self._context.__enter__()
+
+    def write(self, columns: Dict[str, Any]) -> None:
+        names = list(columns)
+        for values in zip(*(_to_list(columns[name]) for name in names)):
+            self._file.write(json.dumps(dict(zip(names, values))) + '\n')
+
+    def close(self) -> None:
+        self._context.__exit__(None, None, None)
+
+
+class ParquetWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = None
+
+    def write(self, columns: Dict[str, Any]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table(dict(columns))
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+WRITERS = {'csv': CsvWriter, 'jsonl': JsonlWriter, 'parquet': ParquetWriter}
+
+
+def _to_list(values: Any) -> List[Any]:
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+def score_chunks(chunks: Iterable[Chunk], predictor: Any, keep: Sequence[str] = (),
+                 now: Optional[datetime] = None,
+                 progress: Optional['Progress'] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Score each chunk; yields (rows, output columns) with kept columns first.
+
+    With calibrated intervals the headline prediction's bounds are added
+    as ``views_lower`` and ``views_upper``. Rows without a valid
+    ``upload_date`` are left out and counted on ``progress``.
+    """
+    now = now or datetime.now()
+    for columns in chunks:
+        columns, rejected = dated_rows(columns)
+        if rejected and progress is not None:
+            progress.reject(rejected)
+        predictions = predictor.predict_views_batch(columns, now=now)
+        output = {column: columns[column] for column in keep}
+        for name, views in predictions.items():
+            output[f'{name}_views'] = np.round(views, 2)
+        intervals = getattr(predictor, 'intervals', None)
+        if intervals is not None:
+            lower, upper = intervals.headline(predictions)
+            output['views_lower'], output['views_upper'] = np.round(lower, 2), np.round(upper, 2)
+        yield num_rows(columns), output
+
+
+class Progress:
+    """Throughput reporter (rows/s) for long runs."""
+
+    def __init__(self, stream: Optional[IO[str]] = None, interval: float = 5.0):
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = interval
+        self.rows = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def reject(self, rows: int) -> None:
+        """Count rows skipped for a missing or invalid upload_date."""
+        self.rejected += rows
+
+    def _rejected(self) -> str:
+        return f", {self.rejected:,} rejected (missing or invalid upload_date)" if self.rejected else ""
+
+    def update(self, rows: int) -> None:
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.stream.write(f"  {self.rows:,} rows ({self.rows_per_second:,.0f} rows/s)"
+                              f"{self._rejected()}\n")
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        self.stream.write(f"✅ Scored {self.rows:,} rows in {elapsed:.1f}s "
+                          f"({self.rows_per_second:,.0f} rows/s){self._rejected()}\n")
+
+
+def score_file(input_path: str, output_path: str, predictor: Any,
+               input_format: Optional[str] = None, output_format: Optional[str] = None,
+               chunk_size: int = 100_000, keep: Sequence[str] = (),
+               now: Optional[datetime] = None, progress: Optional[Progress] = None) -> int:
+    """Stream ``input_path`` through the predictor into ``output_path``.
+
+    Returns the number of rows scored (rejected rows not included). Only
+    one chunk is held in memory.
+    """
+    input_format = input_format or detect_format(input_path)
+    output_format = output_format or (input_format if output_path == '-' else detect_format(output_path))
+    if output_path == '-' and output_format == 'parquet':
+        raise ValueError("Parquet output needs a file path")
+    progress = progress or Progress()
+
+    chunks = READERS[input_format](input_path, chunk_size, keep)
+    writer = WRITERS[output_format](output_path)
+    try:
+        for rows, output in score_chunks(chunks, predictor, keep, now, progress):
+            writer.write(output)
+            progress.update(rows)
+    finally:
+        writer.close()
+    progress.finish()
+    return progress.rows
+
+
+def feature_chunks(chunks: Iterable[Chunk], feature_names: Sequence[str] = ALL_FEATURE_NAMES,
+                   keep: Sequence[str] = (), now: Optional[datetime] = None,
+                   progress: Optional['Progress'] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Feature columns of each chunk; yields (rows, output columns) with kept columns first."""
+    now = now or datetime.now()
+    for columns in chunks:
+        columns, rejected = dated_rows(columns)
+        if rejected and progress is not None:
+            progress.reject(rejected)
+        features = compute_features(to_columns(columns, optional=optional_inputs(feature_names)),
+                                    now, feature_names)
+        output = {column: columns[column] for column in keep}
+        output.update((name, features[name]) for name in feature_names)
+        yield num_rows(columns), output
+
+
+def export_features(input_path: str, output_path: str,
+                    feature_names: Sequence[str] = ALL_FEATURE_NAMES,
+                    input_format: Optional[str] = None, output_format: Optional[str] = None,
+                    chunk_size: int = 100_000, keep: Sequence[str] = (),
+                    now: Optional[datetime] = None, progress: Optional[Progress] = None) -> int:
+    """Stream ``input_path`` into a feature table for (re)training.
+
+    Add ``comment_count`` to ``keep`` when the export has it; without it
+    ``comment_velocity`` is 0.
+    """
+    input_format = input_format or detect_format(input_path)
+    output_format = output_format or (input_format if output_path == '-' else detect_format(output_path))
+    if output_path == '-' and output_format == 'parquet':
+        raise ValueError("Parquet output needs a file path")
+    progress = progress or Progress()
+
+    chunks = READERS[input_format](input_path, chunk_size, keep)
+    writer = WRITERS[output_format](output_path)
+    try:
+        for rows, output in feature_chunks(chunks, feature_names, keep, now, progress):
+            writer.write(output)
+            progress.update(rows)
+    finally:
+        writer.close()
+    progress.finish()
+    return progress.rows
@@ -0,0 +1,302 @@
+"""
+Content-addressed cache of feature rows and predictions.
+
+The web UI re-submits the same video many times while a creator edits a
+single field. Each video is reduced to a canonical key (only the fields
+the features depend on, normalised), combined with the reference date and
+the model version, so a repeat request skips feature engineering and
+model inference entirely.
+
+The in-process LRU/TTL cache can sit in front of the Redis service from
+docker-compose.yml (``REDIS_URL``) so that all workers share hits.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import metrics
+from core.config import settings
+from ml.routing import predict_routed
+from utils.feature_engineering import INPUT_FIELDS
+from utils.text_features import optional_inputs
+
+logger = logging.getLogger(__name__)
+
+# (feature row, {model name: predicted views})
+CacheEntry = Tuple[np.ndarray, Dict[str, float]]
+
+
+def _normalise_value(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # 1250.0 and 1250 give identical features
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None:
+        return ''
+    return value
+
+
+def canonical_key(video: Dict[str, Any], reference_date: date, version: str,
+                  fields: Sequence[str] = INPUT_FIELDS) -> str:
+    """Hash of the feature-relevant part of a video payload.
+
+    Extra keys (channel_id, ...) and key order do not change the key, and
+    neither does category unless it is in ``fields``; the reference date
+    does, because days_since_upload depends on it.
+    """
+    payload = {field: _normalise_value(video.get(field)) for field in fields}
+    payload['upload_date'] = str(np.datetime64(payload['upload_date'], 'D'))
+    blob = json.dumps([version, reference_date.isoformat(), payload],
+                      sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(blob.encode(), digest_size=16).hexdigest()
+
+
+def key_fields(predictor: Any) -> List[str]:
+    """Video fields a prediction of ``predictor`` depends on.
+
+    The model inputs, the optional fields its extended features read
+    (``comment_count``), and ``category`` when it routes by category.
+    """
+    fields = list(INPUT_FIELDS) + list(optional_inputs(predictor.feature_names))
+    if getattr(predictor, 'router', None) is not None:
+        fields.append('category')
+    return fields
+
+
+class CacheStats:
+    """Hit/miss counters."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hit_rate}
+
+
+class LRUCache:
+    """Bounded in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries or settings.model_cache_size
+        self.ttl = settings.prediction_cache_ttl if ttl is None else ttl
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: 'OrderedDict[str, Tuple[float, CacheEntry]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[CacheEntry]]:
+        now = self.clock()
+        found = []
+        with self._lock:
+            for key in keys:
+                item = self._entries.get(key)
+                if item is not None and item[0] < now:
+                    del self._entries[key]
+                    item = None
+                if item is None:
+                    self.stats.misses += 1
+                    found.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    found.append(item[1])
+        return found
+
+    def set_many(self, items: Dict[str, CacheEntry]) -> None:
+        expires = self.clock() + self.ttl
+        with self._lock:
+            for key, entry in items.items():
+                self._entries[key] = (expires, entry)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Shared cache tier backed by Redis (``REDIS_URL``)."""
+
+    def __init__(self, client: Any = None, url: Optional[str] = None,
+                 ttl: Optional[float] = None, prefix: str = 'viralcast:pred:'):
+        if client is None:
+            import redis  # optional dependency, only needed when REDIS_URL is set
+            client = redis.Redis.from_url(url or settings.redis_url)
+        self.client = client
+        self.ttl = int(settings.prediction_cache_ttl if ttl is None else ttl)
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[CacheEntry]]:
+        if not keys:
+            return []
+        try:
+            raw = self.client.mget([self.prefix + key for key in keys])
+        except Exception as e:
+            # A cache outage must never fail a prediction
+            logger.warning("Redis cache read failed: %s", e)
+            raw = [None] * len(keys)
+        found = []
+        for key, blob in zip(keys, raw):
+            entry = None
+            if blob is not None:
+                try:
+                    payload = json.loads(blob)
+                    entry = (np.asarray(payload['features'], dtype=np.float64), payload['predictions'])
+                except (ValueError, KeyError, TypeError) as e:
+                    # A corrupt entry is rescored (and overwritten) like a miss
+                    logger.warning("Ignoring unreadable Redis cache entry %s: %s", key, e)
+            if entry is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+            found.append(entry)
+        return found
+
+    def set_many(self, items: Dict[str, CacheEntry]) -> None:
+        if not items:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, (row, predictions) in items.items():
+                blob = json.dumps({'features': row.tolist(), 'predictions': predictions})
+                pipe.setex(self.prefix + key, self.ttl, blob)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Redis cache write failed: %s", e)
+
+
+class TieredCache:
+    """Local LRU in front of an optional shared tier."""
+
+    def __init__(self, local: LRUCache, shared: Optional[RedisCache] = None):
+        self.local = local
+        self.shared = shared
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.local.stats
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[CacheEntry]]:
+        found = self.local.get_many(keys)
+        if self.shared is None:
+            return found
+        missing = [i for i, entry in enumerate(found) if entry is None]
+        if missing:
+            shared = self.shared.get_many([keys[i] for i in missing])
+            promote = {}
+            for i, entry in zip(missing, shared):
+                if entry is not None:
+                    found[i] = entry
+                    promote[keys[i]] = entry
+            self.local.set_many(promote)
+        return found
+
+    def set_many(self, items: Dict[str, CacheEntry]) -> None:
+        self.local.set_many(items)
+        if self.shared is not None:
+            self.shared.set_many(items)
+
+
+def default_cache() -> TieredCache:
+    """Local LRU, plus Redis when ``REDIS_URL`` is configured."""
+    shared = RedisCache() if settings.redis_url else None
+    return TieredCache(LRUCache(), shared)
+
+
+class CachedPredictor:
+    """Wraps a BatchPredictor; only cache misses reach feature engineering.
+
+    ``predictor`` may be replaced at any time (``ml.versioning.ModelReloader``);
+    cache keys include the model version.
+    """
+
+    def __init__(self, predictor: Any, cache: Optional[Any] = None):
+        self.predictor = predictor
+        self.cache = cache if cache is not None else default_cache()
+
+    @property
+    def feature_names(self) -> List[str]:
+        return self.predictor.feature_names
+
+    @property
+    def intervals(self) -> Optional[Any]:
+        return getattr(self.predictor, 'intervals', None)
+
+    def predict_with_features(self, videos: Sequence[Dict[str, Any]],
+                              now: Optional[datetime] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Feature matrix and per-model predictions for a list of videos."""
+        now = now or datetime.now()
+        predictor = self.predictor  # one model version for the whole batch, even across a hot swap
+        videos = [videos] if isinstance(videos, dict) else list(videos)
+        fields = key_fields(predictor)
+        keys = [canonical_key(video, now.date(), predictor.version, fields) for video in videos]
+        with metrics.stage_timer('cache_lookup'):
+            found = self.cache.get_many(keys)
+
+        names = list(predictor.models)
+        X = np.empty((len(videos), len(predictor.feature_names)), dtype=np.float64)
+        predictions = {name: np.empty(len(videos), dtype=np.float64) for name in names}
+        for i, entry in enumerate(found):
+            if entry is not None:
+                X[i] = entry[0]
+                for name in names:
+                    predictions[name][i] = entry[1][name]
+
+        missing = [i for i, entry in enumerate(found) if entry is None]
+        metrics.count_cache(len(videos) - len(missing), len(missing))
+        if missing:
+            # Identical payloads in one batch are only scored once
+            unique = {}
+            for i in missing:
+                unique.setdefault(keys[i], i)
+            rows = list(unique.values())
+            X_new = predictor.build_features([videos[i] for i in rows], now)
+            scored = predict_routed(predictor, X_new, [videos[i].get('category') for i in rows])
+            fresh = {}
+            for j, key in enumerate(unique):
+                fresh[key] = (X_new[j].copy(), {name: float(scored[name][j]) for name in names})
+            self.cache.set_many(fresh)
+            for i in missing:
+                row, views = fresh[keys[i]]
+                X[i] = row
+                for name in names:
+                    predictions[name][i] = views[name]
+        return X, predictions
+
+    def explain(self, X: np.ndarray, categories: Optional[Sequence[Any]] = None,
+                model: Optional[str] = None, mode: str = 'fast') -> Tuple[np.ndarray, np.ndarray]:
+        """``BatchPredictor.explain`` of the current predictor (cached by feature row)."""
+        return self.predictor.explain(X, categories, model, mode)
+
+    def predict_views_batch(self, videos: Sequence[Dict[str, Any]],
+                            now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Same contract as ``BatchPredictor.predict_views_batch`` for video dicts."""
+        return self.predict_with_features(videos, now)[1]
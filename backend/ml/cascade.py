@@ -0,0 +1,233 @@
+"""
+Early-exit cascade: ridge first, tree ensembles only where ridge is unreliable.
+
+``predict_views`` runs all four clean models for every video although only
+gradient boosting is reported; the rest feed the agreement check. A
+``Cascade`` scores every row with the linear model (one dot product) and
+escalates to the tree ensembles only the rows that land where ridge is
+known to disagree with the headline model.
+
+Reliability is calibrated offline from the held-out predictions saved with
+the clean models (``y_test_pred`` in ``{name}_clean_model.pkl``): the
+held-out rows are binned by ridge's own (log1p) output, and each bin
+records a high quantile of ``|ridge - gradient_boosting|``. At serving
+time a row's risk is the error of its bin; outputs outside the calibrated
+range are always escalated. The calibration is stored in the compiled
+registry manifest, so nothing is unpickled at startup.
+
+Two modes:
+
+* tolerance (default): escalate rows whose bin error exceeds
+  ``CASCADE_TOLERANCE`` (log1p views, so 1.0 is roughly a factor e). The
+  tolerance is the accuracy target of the ridge-only answers: in every bin
+  ridge answers, 80% of held-out rows are within it of gradient boosting
+* fixed budget (``CASCADE_BUDGET``): escalate at most that fraction of the
+  rows, the riskiest first. The risk threshold is chosen so the held-out
+  set escalates at the budget rate, and every batch is capped at
+  ``ceil(budget * rows)``
+
+Rows answered by ridge alone have NaN for the models that did not run.
+``Cascade.tradeoff`` (and ``python -m ml.cascade report``) gives the share
+of held-out rows escalated next to the error ridge-only rows accept.
+"""
+
+import argparse
+import logging
+import math
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import joblib
+import numpy as np
+
+from core import metrics
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHEAP_MODEL = 'ridge'
+REFERENCE_MODEL = 'gradient_boosting'
+N_BINS = 20
+QUANTILE = 0.8
+
+
+def calibrate(test_predictions: Dict[str, np.ndarray], cheap: str = CHEAP_MODEL,
+              reference: str = REFERENCE_MODEL, n_bins: int = N_BINS,
+              quantile: float = QUANTILE) -> Dict[str, Any]:
+    """Per-bin error of the cheap model against the reference model.
+
+    ``test_predictions`` are raw (transformed-target) held-out predictions
+    of the same rows, by model. Bins are quantiles of the cheap model's
+    output, so each holds the same share of the held-out traffic.
+    """
+    cheap_pred = np.asarray(test_predictions[cheap], dtype=np.float64)
+    error = np.abs(cheap_pred - np.asarray(test_predictions[reference], dtype=np.float64))
+    edges = np.unique(np.quantile(cheap_pred, np.linspace(0, 1, n_bins + 1)))
+    bins = _bin(edges, cheap_pred)
+    n_bins = len(edges) - 1
+    counts = np.bincount(bins, minlength=n_bins)
+    bin_error = np.array([np.quantile(error[bins == b], quantile) if counts[b] else np.inf
+                          for b in range(n_bins)])
+    return {
+        'cheap': cheap,
+        'reference': reference,
+        'quantile': quantile,
+        'edges': edges.tolist(),
+        'error': bin_error.tolist(),
+        'counts': counts.tolist(),
+    }
+
+
+def calibrate_directory(model_path: Optional[Path] = None, **kwargs) -> Dict[str, Any]:
+    """Calibrate from the held-out predictions in the clean model pickles."""
+    model_path = Path(model_path or settings.model_path)
+    cheap = kwargs.get('cheap', CHEAP_MODEL)
+    reference = kwargs.get('reference', REFERENCE_MODEL)
+    test_predictions = {name: joblib.load(model_path / f'{name}_clean_model.pkl')['y_test_pred']
+                        for name in (cheap, reference)}
+    return calibrate(test_predictions, **kwargs)
+
+
+def _bin(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    return np.searchsorted(edges[1:-1], values, side='right')
+
+
+class Cascade:
+    """Escalation policy for ``BatchPredictor(cascade=...)``."""
+
+    def __init__(self, calibration: Dict[str, Any], tolerance: Optional[float] = None,
+                 budget: Optional[float] = None, escalate_to: Optional[Sequence[str]] = None):
+        if budget is not None and not 0 <= budget <= 1:
+            raise ValueError(f"Cascade budget must be a fraction of rows, got {budget}")
+        self.calibration = calibration
+        self.cheap = calibration['cheap']
+        self.edges = np.asarray(calibration['edges'], dtype=np.float64)
+        self.bin_error = np.asarray(calibration['error'], dtype=np.float64)
+        self.counts = np.asarray(calibration['counts'], dtype=np.int64)
+        self.budget = budget
+        if budget is not None:
+            self.threshold = self._budget_threshold(budget)
+        else:
+            self.threshold = settings.cascade_tolerance if tolerance is None else tolerance
+        # None: every other model of the predictor
+        self.escalate_to = list(escalate_to) if escalate_to is not None else None
+
+    @classmethod
+    def from_registry(cls, registry: Any, **kwargs) -> 'Cascade':
+        """Cascade over the calibration stored in a compiled registry."""
+        calibration = registry.manifest.get('cascade')
+        if calibration is None:
+            raise ValueError(f"Compiled set {registry.artifact_set!r} has no cascade calibration")
+        kwargs.setdefault('budget', settings.cascade_budget)
+        return cls(calibration, **kwargs)
+
+    @property
+    def tag(self) -> str:
+        """Part of the predictor version (cache keys differ from full scoring)."""
+        if self.budget is not None:
+            return f"cascade-b{self.budget:g}"
+        return f"cascade-t{self.threshold:g}"
+
+    def _budget_threshold(self, budget: float) -> float:
+        """Smallest bin error whose held-out escalation rate fits the budget."""
+        for threshold in np.unique(np.concatenate([[0.0], self.bin_error])):
+            if self.escalation_rate(threshold) <= budget:
+                return float(threshold)
+        return math.inf
+
+    def escalation_rate(self, threshold: Optional[float] = None) -> float:
+        """Share of the held-out rows that would be escalated."""
+        threshold = self.threshold if threshold is None else threshold
+        return float(self.counts[self.bin_error > threshold].sum() / self.counts.sum())
+
+    def tradeoff(self, threshold: Optional[float] = None) -> Dict[str, float]:
+        """Held-out cost and accuracy of a threshold.
+
+        ``escalated`` is the share of rows sent to the tree ensembles (the
+        work left of full scoring); ``cheap_error`` the largest bin error
+        among the rows ridge answers alone, i.e. 80% of them are within
+        that many log1p views of gradient boosting (``cheap_factor``).
+        """
+        threshold = self.threshold if threshold is None else threshold
+        answered = self.bin_error <= threshold
+        cheap_error = float(self.bin_error[answered].max()) if answered.any() else 0.0
+        return {
+            'threshold': float(threshold),
+            'escalated': self.escalation_rate(threshold),
+            'cheap_error': cheap_error,
+            'cheap_factor': math.exp(cheap_error),
+        }
+
+    def risk(self, cheap_raw: np.ndarray) -> np.ndarray:
+        """Expected cheap-model error per row; inf outside the calibrated range."""
+        cheap_raw = np.asarray(cheap_raw, dtype=np.float64)
+        risk = self.bin_error[_bin(self.edges, cheap_raw)]
+        outside = ~((cheap_raw >= self.edges[0]) & (cheap_raw <= self.edges[-1]))  # NaN too
+        risk[outside] = np.inf
+        return risk
+
+    def select(self, risk: np.ndarray) -> np.ndarray:
+        """Boolean mask of the rows to escalate."""
+        escalate = risk > self.threshold
+        if self.budget is not None:
+            cap = math.ceil(self.budget * len(risk))
+            if escalate.sum() > cap:
+                escalate[:] = False
+                escalate[np.argsort(-risk, kind='stable')[:cap]] = True
+        return escalate
+
+    def predict_raw(self, predictor: Any, X_scaled: np.ndarray) -> Dict[str, np.ndarray]:
+        """Raw outputs: the cheap model for every row, the others for escalated rows."""
+        cheap_raw = predictor.predict_raw(X_scaled, [self.cheap])[self.cheap]
+        escalate = self.select(self.risk(cheap_raw))
+        names = self.escalate_to or [name for name in predictor.models if name != self.cheap]
+        n_escalated = int(escalate.sum())
+        metrics.count_cascade(len(escalate) - n_escalated, n_escalated)
+
+        raw = {name: np.full(len(escalate), np.nan) for name in predictor.models}
+        raw[self.cheap] = np.asarray(cheap_raw, dtype=np.float64)
+        if n_escalated:
+            for name, values in predictor.predict_raw(X_scaled[escalate], names).items():
+                raw[name][escalate] = values
+        return raw
+
+
+def cascade_predictor(registry: Any = None, **kwargs) -> Any:
+    """BatchPredictor over the compiled registry that scores through a Cascade.
+
+    ``kwargs`` go to ``Cascade`` (``tolerance``, ``budget``, ``escalate_to``).
+    """
+    if registry is None:
+        from ml.registry import ModelRegistry
+        registry = ModelRegistry()
+    cascade = Cascade.from_registry(registry, **kwargs)
+    tradeoff = cascade.tradeoff()
+    logger.info("Cascade (%s) escalates %.0f%% of held-out rows; ridge-only answers are within "
+                "%.1fx of %s for %.0f%% of rows", cascade.tag, 100 * tradeoff['escalated'],
+                tradeoff['cheap_factor'], cascade.calibration['reference'],
+                100 * cascade.calibration['quantile'])
+    return registry.predictor(cascade=cascade)
+
+
+def main(argv=None):
+    """Command-line entry point: escalation rate vs ridge-only error per tolerance."""
+    parser = argparse.ArgumentParser(description="Cascade cost/accuracy trade-off")
+    sub = parser.add_subparsers(dest='command', required=True)
+    report = sub.add_parser('report', help="held-out escalation rate and ridge-only error")
+    report.add_argument('--tolerances', type=float, nargs='+', default=None,
+                        help="log1p tolerances to report (default: every calibrated bin error)")
+    args = parser.parse_args(argv)
+
+    from ml.registry import ModelRegistry
+    cascade = Cascade.from_registry(ModelRegistry(), budget=None)
+    tolerances = args.tolerances or [0.0, *sorted(set(cascade.bin_error.tolist()))]
+    quantile = 100 * cascade.calibration['quantile']
+    print(f"{'tolerance':>9}  {'escalated':>9}  {'tree work saved':>15}  ridge-only p{quantile:.0f} error")
+    for tolerance in tolerances:
+        row = cascade.tradeoff(tolerance)
+        error = f"{row['cheap_factor']:.1f}x" if row['escalated'] < 1 else '-'
+        print(f"{tolerance:>9.2f}  {row['escalated']:>9.0%}  {1 - row['escalated']:>15.0%}  {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Distil the clean ensemble into a compact student model (``ml.student``).
+
+The teacher, gradient boosting by default, labels synthetic videos drawn
+from the same distributions as the benchmarks. A shallow LightGBM
+ensemble is fitted to those labels on the raw features. Its thresholds
+are then rewritten as per-feature bin indices (LightGBM's ``max_bin``
+keeps each feature under 256 distinct thresholds) and its leaves are
+stored as float16.
+
+Usage (from backend/):
+    python -m ml.distill export                        # models/student/clean_student.npz
+    python -m ml.distill export --trees 200 --report student_report.json
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from core.config import BACKEND_DIR, settings
+from core.timing import time_calls, time_throughput
+from ml.student import StudentModel
+from ml.trees import TreeEnsemble, from_estimator
+from utils.feature_engineering import build_feature_matrix
+from utils.synthetic import generate_columns
+
+TEACHER_MODEL = 'gradient_boosting'
+DEFAULT_ROWS = 200_000
+NOW = datetime(2024, 6, 1)
+
+# Sized to score as fast as the teacher alone (100 depth-4 trees) while
+# tracking it to ~0.05 log-views; max_bin bounds the edges per feature
+STUDENT_PARAMS = {
+    'n_estimators': 100,
+    'num_leaves': 31,
+    'max_depth': 5,
+    'learning_rate': 0.15,
+    'min_child_samples': 50,
+    'subsample': 0.8,
+    'subsample_freq': 1,
+    'max_bin': 255,
+    'verbose': -1,
+}
+
+
+def default_student_path() -> Path:
+    return settings.model_path / 'student' / 'clean_student.npz'
+
+
+def teacher_dataset(teacher: Any, n_rows: int, seed: int = 0,
+                    teacher_model: str = TEACHER_MODEL) -> Tuple[np.ndarray, np.ndarray]:
+    """Raw features of ``n_rows`` synthetic videos and the teacher's raw output."""
+    columns = generate_columns(n_rows, seed=seed, today=NOW.date())
+    X = build_feature_matrix(columns, teacher.feature_names, now=NOW)
+    y = teacher.predict_raw(teacher.scale(X), [teacher_model])[teacher_model]
+    return X, np.asarray(y, dtype=np.float64)
+
+
+def fit_student(X: np.ndarray, y: np.ndarray, seed: int = 0, **params) -> TreeEnsemble:
+    """Fit the student ensemble on raw features and flatten it."""
+    import lightgbm
+
+    model = lightgbm.LGBMRegressor(**{**STUDENT_PARAMS, **params}, random_state=seed)
+    model.fit(X, y)
+    return from_estimator(model)
+
+
+def quantize(ensemble: TreeEnsemble, feature_names: list, target_transformed: bool = True,
+             leaf_dtype: Any = np.float16) -> StudentModel:
+    """Bin-index thresholds and ``leaf_dtype`` leaves for a flattened ensemble."""
+    is_leaf = ensemble.child == np.arange(len(ensemble.child))
+    edges = []
+    threshold = np.zeros(len(ensemble.threshold), dtype=np.int64)
+    for j in range(len(feature_names)):
+        splits = ~is_leaf & (ensemble.feature == j)
+        feature_edges = np.unique(ensemble.threshold[splits])
+        threshold[splits] = np.searchsorted(feature_edges, ensemble.threshold[splits])
+        edges.append(feature_edges)
+    if max(len(e) for e in edges) > 255:
+        raise ValueError("More than 255 thresholds on one feature; lower max_bin")
+    # StudentModel sums the leaves in float64, so float16 rounding does not accumulate
+    value = np.asarray(ensemble.value, dtype=np.float64).astype(leaf_dtype)
+    node_dtype = np.uint16 if len(ensemble.child) <= np.iinfo(np.uint16).max else np.uint32
+    return StudentModel(
+        feature_names, edges,
+        feature=ensemble.feature.astype(np.uint8), threshold=threshold.astype(np.uint8),
+        child=ensemble.child.astype(node_dtype), value=value, roots=ensemble.roots.astype(node_dtype),
+        base_score=ensemble.base_score, max_depth=ensemble.max_depth,
+        target_transformed=target_transformed,
+    )
+
+
+def distill(teacher: Any = None, n_rows: int = DEFAULT_ROWS, seed: int = 0,
+            teacher_model: str = TEACHER_MODEL, **params) -> StudentModel:
+    """Train and quantize a student of ``teacher`` (the compiled clean models by default)."""
+    if teacher is None:
+        from ml.registry import ModelRegistry
+        teacher = ModelRegistry().predictor()
+    X, y = teacher_dataset(teacher, n_rows, seed, teacher_model)
+    ensemble = fit_student(X, y, seed, **params)
+    return quantize(ensemble, teacher.feature_names, teacher.model_info['target_transformed'])
+
+
+def _agreement(raw: np.ndarray, reference: np.ndarray, target_transformed: bool) -> Dict[str, float]:
+    """Error of ``raw`` against the reference model, in raw units and in views."""
+    diff = raw - reference
+    if target_transformed:
+        relative = np.abs(np.expm1(raw) / np.maximum(np.expm1(reference), 1) - 1)
+    else:
+        relative = np.abs(diff) / np.maximum(np.abs(reference), 1)
+    return {
+        'rmse_raw': float(np.sqrt(np.mean(diff ** 2))),
+        'mae_raw': float(np.mean(np.abs(diff))),
+        'median_views_error': float(np.median(relative)),
+        'p90_views_error': float(np.percentile(relative, 90)),
+    }
+
+
+def _file_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+_RSS_SCRIPT = """
+import re, sys
+from datetime import datetime
+from utils.synthetic import generate_columns
+videos = generate_columns(1000, seed=1)
+if sys.argv[1] == 'student':
+    from ml.student import StudentModel
+    predictor = StudentModel.load(sys.argv[2])
+elif sys.argv[1] == 'compiled':
+    from ml.registry import ModelRegistry
+    predictor = ModelRegistry().predictor()
+else:
+    from ml.predictor import BatchPredictor
+    predictor = BatchPredictor.from_directory()
+predictor.predict_views_batch(videos, now=datetime(2024, 6, 1))
+print(re.search(r'VmHWM:\\s+(\\d+)', open('/proc/self/status').read()).group(1))
+"""
+
+
+def peak_rss_mb(kind: str, student_path: Optional[Path] = None) -> float:
+    """Peak RSS of a fresh interpreter that loads ``kind`` and scores 1000 videos (Linux)."""
+    output = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', _RSS_SCRIPT, kind, str(student_path or '')],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    # VmHWM rather than ru_maxrss, which a forked child inherits from its parent
+    return int(output.split()[-1]) / 1024
+
+
+def report(student: StudentModel, teacher: Any = None, n_rows: int = 20_000, seed: int = 1,
+           teacher_model: str = TEACHER_MODEL, repeat: int = 200, min_seconds: float = 0.5,
+           student_path: Optional[Path] = None, rss: bool = False) -> Dict[str, Any]:
+    """Accuracy against the teacher and speed/size of the student and the originals.
+
+    Evaluated on fresh synthetic videos (``seed`` differs from training).
+    Latencies exclude feature engineering, which every model shares.
+    """
+    if teacher is None:
+        from ml.registry import ModelRegistry
+        teacher = ModelRegistry().predictor()
+    columns = generate_columns(n_rows, seed=seed, today=NOW.date())
+    X = build_feature_matrix(columns, teacher.feature_names, now=NOW)
+    X_scaled = teacher.scale(X)
+    target_transformed = teacher.model_info['target_transformed']
+    originals = teacher.predict_raw(X_scaled)
+    reference = originals[teacher_model]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    candidates = {name: (lambda X_raw, m=teacher.models[name]: m.predict(teacher.scale(X_raw)))
+                  for name in teacher.models}
+    candidates['student'] = student.predict_raw
+    for name, predict_raw in candidates.items():
+        raw = student.predict_raw(X) if name == 'student' else originals[name]
+        results[name] = _agreement(raw, reference, target_transformed)
+        results[name].update(time_calls(lambda f=predict_raw: f(X[:1]), repeat))
+        results[name].update(time_throughput(lambda f=predict_raw: f(X), n_rows, min_seconds))
+
+    model_path = settings.model_path
+    sizes = {
+        'student_bytes': _file_size(student_path) if student_path else None,
+        'clean_pickles_bytes': sum(_file_size(model_path / f'{name}_clean_model.pkl')
+                                   for name in teacher.models),
+        'compiled_bytes': _file_size(model_path / 'compiled' / 'clean'),
+    }
+    summary = {
+        'teacher': teacher_model,
+        'eval_rows': n_rows,
+        'student': {'n_trees': student.n_trees, 'n_nodes': int(len(student.child)),
+                    'max_depth': student.max_depth},
+        'models': results,
+        'sizes': sizes,
+    }
+    if rss:
+        summary['peak_rss_mb'] = {kind: peak_rss_mb(kind, student_path)
+                                  for kind in ('student', 'compiled', 'pickle')}
+    return summary
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    lines = [f"{'model':<18} {'rmse(raw)':>9} {'p90 err':>8} {'p50 ms':>8} {'rows/s':>12}"]
+    for name, r in summary['models'].items():
+        lines.append(f"{name:<18} {r['rmse_raw']:9.4f} {r['p90_views_error']:8.1%} "
+                     f"{r['p50_ms']:8.3f} {r['rows_per_s']:12,.0f}")
+    for name, value in summary['sizes'].items():
+        if value is not None:
+            lines.append(f"{name}: {value / 1024:,.0f} KiB")
+    for kind, mb in summary.get('peak_rss_mb', {}).items():
+        lines.append(f"peak RSS ({kind}): {mb:,.0f} MiB")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Command-line entry point: distil, save and report a student model."""
+    parser = argparse.ArgumentParser(description="Distil the clean models into a compact student")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="train, quantize and save a student model")
+    export.add_argument('-o', '--output', type=Path, default=None,
+                        help="student .npz (default: models/student/clean_student.npz)")
+    export.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="synthetic training rows")
+    export.add_argument('--trees', type=int, default=STUDENT_PARAMS['n_estimators'])
+    export.add_argument('--teacher', default=TEACHER_MODEL, help="model the student mimics")
+    export.add_argument('--seed', type=int, default=0)
+    export.add_argument('--report', type=Path, default=None, help="also write the report as JSON")
+    export.add_argument('--no-rss', action='store_true', help="skip the peak RSS measurement")
+    args = parser.parse_args(argv)
+
+    from ml.registry import ModelRegistry
+    teacher = ModelRegistry().predictor()
+    student = distill(teacher, args.rows, args.seed, args.teacher, n_estimators=args.trees)
+    output = args.output or default_student_path()
+    output.parent.mkdir(parents=True, exist_ok=True)
+    student.save(output)
+    print(f"✅ Student model written to {output}")
+
+    summary = report(student, teacher, teacher_model=args.teacher, student_path=output,
+                     rss=not args.no_rss)
+    print(format_report(summary))
+    if args.report:
+        args.report.write_text(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Columnar on-disk store of engineered feature matrices.
+
+Training (``ml.versioning``), bulk scoring and backfills all start from
+the same features. Building them from raw video dicts in each place is
+slow, and the copies drift apart (``examples/prediction_example.py`` used
+to hard-code the upload hour and age). The store builds the matrix once
+with ``utils.feature_engineering``, in the column order of
+``clean_feature_names.pkl``, and keeps it on disk:
+
+    features/
+      manifest.json                       feature names, as-of date, segments
+      upload_month=2024-01/
+        part-00000.features.npy           (rows, features) float64, column-major
+        part-00000.upload_date.npy        datetime64[D]
+        part-00000.view_count.npy         kept columns (targets, ids, category)
+
+Segments are append-only. Each one is written under a temporary name and
+renamed, then the manifest is replaced atomically, so readers always see
+whole segments. Reads are ``np.load(mmap_mode='r')``: a slice of a segment
+is a view of the page cache and goes straight into ``scaler.transform``
+or ``predict_matrix`` without a copy.
+
+Features that depend on the reference date (``days_since_upload``, its
+log and the velocities) are stored as of the store's ``as_of`` date.
+Reading with another ``now`` recomputes only those columns, on a copy.
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.feature_engineering import (
+    CLEAN_FEATURE_NAMES, assemble_matrix, compute_features, num_rows, to_columns,
+)
+from utils.text_features import optional_inputs
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+# (feature matrix, {column: values}) of one segment slice
+Segment = Tuple[np.ndarray, Dict[str, np.ndarray]]
+
+
+def _age(upload_date: np.ndarray, day: date) -> np.ndarray:
+    """``days_since_upload`` as ``_upload_date_features`` computes it."""
+    days = (np.datetime64(day, 'D') - upload_date).astype(np.int64).astype(np.float64)
+    days[days == 0] = 1
+    return days
+
+
+def _redate(X: np.ndarray, feature_names: Sequence[str], upload_date: np.ndarray,
+            as_of: date, day: date) -> np.ndarray:
+    """Copy of ``X`` with the age features recomputed for ``day``."""
+    X = np.array(X, order='F')
+    stored, age = _age(upload_date, as_of), _age(upload_date, day)
+    for j, name in enumerate(feature_names):
+        if name == 'days_since_upload':
+            X[:, j] = age
+        elif name == 'log_days_since_upload':
+            X[:, j] = np.log1p(age)
+        elif name in ('like_velocity', 'comment_velocity'):
+            X[:, j] *= stored / age  # count / days
+    return X
+
+
+def _save(path: Path, values: np.ndarray) -> None:
+    tmp = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+    with open(tmp, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp, path)
+
+
+def _column(values: Any) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype == object:
+        # Mixed or missing values (ids, categories) are kept as text
+        values = np.array(['' if v is None or v != v else str(v) for v in values.tolist()])
+    return values
+
+
+class FeatureStore:
+    """Append-only feature matrices partitioned by upload month.
+
+    Opens the store at ``path``, creating it with ``feature_names``
+    (default: the clean-model columns) and ``as_of`` (default: today)
+    when it does not exist yet. Only one process should append at a time.
+    """
+
+    def __init__(self, path: Any, feature_names: Optional[Sequence[str]] = None,
+                 as_of: Optional[date] = None):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        manifest_path = self.path / MANIFEST
+        if manifest_path.exists():
+            self.manifest = json.loads(manifest_path.read_text())
+            if feature_names is not None and list(feature_names) != self.manifest['feature_names']:
+                raise ValueError(f"{self.path} stores other features than requested")
+        else:
+            as_of = as_of.date() if isinstance(as_of, datetime) else as_of
+            self.manifest = {
+                'format': FORMAT_VERSION,
+                'feature_names': list(feature_names or CLEAN_FEATURE_NAMES),
+                'as_of': (as_of or date.today()).isoformat(),
+                'partitions': {},
+            }
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._write_manifest()
+
+    @property
+    def feature_names(self) -> List[str]:
+        return self.manifest['feature_names']
+
+    @property
+    def as_of(self) -> date:
+        return date.fromisoformat(self.manifest['as_of'])
+
+    @property
+    def rows(self) -> int:
+        return sum(segment['rows'] for segments in self.manifest['partitions'].values()
+                   for segment in segments)
+
+    def partitions(self) -> Dict[str, int]:
+        """Rows per upload month (``YYYY-MM``), oldest first."""
+        return {month: sum(segment['rows'] for segment in segments)
+                for month, segments in sorted(self.manifest['partitions'].items())}
+
+    def _write_manifest(self) -> None:
+        path = self.path / MANIFEST
+        tmp = path.with_name(f'.{MANIFEST}.{uuid.uuid4().hex}.tmp')
+        tmp.write_text(json.dumps(self.manifest, indent=2))
+        os.replace(tmp, path)
+
+    def append(self, videos: Any, keep: Sequence[str] = ()) -> int:
+        """Build the features of a batch and add one segment per upload month.
+
+        ``keep`` columns (targets, ids, ``category``) are stored alongside.
+        Returns the number of rows added.
+        """
+        feature_names = self.feature_names
+        columns = to_columns(videos, optional=(*optional_inputs(feature_names), *keep))
+        n_rows = num_rows(columns)
+        if not n_rows:
+            return 0
+        features = compute_features(columns, datetime.combine(self.as_of, datetime.min.time()),
+                                    feature_names)
+        X = assemble_matrix(features, feature_names, n_rows,
+                            out=np.empty((n_rows, len(feature_names)), order='F'))
+        upload_date = np.asarray(columns['upload_date'], dtype='datetime64[D]')
+        kept = {name: _column(columns[name]) for name in keep}
+
+        months = upload_date.astype('datetime64[M]')
+        order = np.argsort(months, kind='stable')
+        bounds = np.flatnonzero(np.r_[True, months[order][1:] != months[order][:-1], True])
+        with self._lock:
+            partitions = self.manifest['partitions']
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                rows = order[start:stop]
+                month = str(months[rows[0]])
+                directory = self.path / f'upload_month={month}'
+                directory.mkdir(exist_ok=True)
+                segments = partitions.setdefault(month, [])
+                name = f'part-{len(segments):05d}'
+                for column, values in kept.items():
+                    _save(directory / f'{name}.{column}.npy', values[rows])
+                _save(directory / f'{name}.upload_date.npy', upload_date[rows])
+                _save(directory / f'{name}.features.npy', np.asfortranarray(X[rows]))
+                segments.append({'name': name, 'rows': len(rows), 'columns': list(kept)})
+            self._write_manifest()
+        return n_rows
+
+    def scan(self, since: Optional[str] = None, until: Optional[str] = None,
+             columns: Sequence[str] = (), now: Optional[datetime] = None,
+             chunk_size: Optional[int] = None) -> Iterator[Segment]:
+        """Memory-mapped segments of the months ``since``..``until`` (inclusive).
+
+        Yields (features, {column: values}) with ``upload_date`` always among
+        the columns. Slices are views of the files unless ``now`` is a
+        different day than the store's ``as_of``.
+        """
+        day = now.date() if isinstance(now, datetime) else now
+        for month, segments in sorted(self.manifest['partitions'].items()):
+            if (since and month < since) or (until and month > until):
+                continue
+            directory = self.path / f'upload_month={month}'
+            for segment in segments:
+                name = segment['name']
+                X = np.load(directory / f'{name}.features.npy', mmap_mode='r')
+                values = {column: np.load(directory / f'{name}.{column}.npy', mmap_mode='r')
+                          for column in ('upload_date', *columns)}
+                step = chunk_size or len(X)
+                for start in range(0, len(X), step):
+                    chunk = {column: array[start:start + step] for column, array in values.items()}
+                    X_chunk = X[start:start + step]
+                    if day is not None and day != self.as_of:
+                        X_chunk = _redate(X_chunk, self.feature_names, chunk['upload_date'],
+                                          self.as_of, day)
+                    yield X_chunk, chunk
+
+    def read(self, since: Optional[str] = None, until: Optional[str] = None,
+             columns: Sequence[str] = (), now: Optional[datetime] = None) -> Segment:
+        """All matching segments in one matrix (a copy)."""
+        parts = list(self.scan(since, until, columns, now))
+        if not parts:
+            return np.empty((0, len(self.feature_names))), {}
+        names = parts[0][1]
+        return (np.concatenate([X for X, _ in parts]),
+                {column: np.concatenate([values[column] for _, values in parts]) for column in names})
+
+    def labelled_chunks(self, target: str = 'view_count', now: Optional[datetime] = None,
+                        chunk_size: int = 50_000) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(feature matrix, observed views) chunks for ``ml.versioning.refresh``."""
+        for X, values in self.scan(columns=[target], now=now, chunk_size=chunk_size):
+            yield X, np.asarray(values[target], dtype=np.float64)
+
+    def predict(self, predictor: Any, now: Optional[datetime] = None, columns: Sequence[str] = (),
+                since: Optional[str] = None, until: Optional[str] = None,
+                chunk_size: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Score the stored rows; yields (rows, output columns) like ``ml.bulk.score_chunks``."""
+        if list(predictor.feature_names) != self.feature_names:
+            raise ValueError("The predictor expects other features than the store holds")
+        routed = getattr(predictor, 'router', None) is not None and all(
+            'category' in segment['columns']
+            for segments in self.manifest['partitions'].values() for segment in segments)
+        wanted = list(columns) + (['category'] if routed and 'category' not in columns else [])
+        for X, values in self.scan(since, until, wanted, now or datetime.now(),
+                                   chunk_size or predictor.chunk_size):
+            output = {column: values[column] for column in columns}
+            predictions = predictor.predict_matrix(X, values.get('category'))
+            for name, views in predictions.items():
+                output[f'{name}_views'] = np.round(views, 2)
+            yield len(X), output
+
+
+def main(argv=None):
+    """Command-line entry point: append exports, list partitions, score."""
+    from ml.bulk import FORMATS, READERS, WRITERS, Progress, detect_format
+    from utils.feature_engineering import ALL_FEATURE_NAMES
+
+    def as_of(value: str) -> datetime:
+        return datetime.strptime(value, '%Y-%m-%d')
+
+    parser = argparse.ArgumentParser(description="Columnar ViralCast feature store")
+    parser.add_argument('--store', type=Path, required=True, help="feature store directory")
+    sub = parser.add_subparsers(dest='command', required=True)
+    app = sub.add_parser('append', help="add the features of a CSV, JSON Lines or Parquet export")
+    app.add_argument('input', help="input file")
+    app.add_argument('--format', choices=FORMATS, default=None)
+    app.add_argument('--keep', action='append', default=[], metavar='COLUMN',
+                     help="store an input column too (e.g. view_count, video_id, category)")
+    app.add_argument('--as-of', type=as_of, default=None, metavar='YYYY-MM-DD',
+                     help="reference date of a new store (default: today)")
+    app.add_argument('--all-features', action='store_true',
+                     help="store every documented feature, not only the clean-model ones")
+    app.add_argument('--chunk-size', type=int, default=100_000, help="rows per segment write")
+    sub.add_parser('list', help="show the stored partitions")
+    score = sub.add_parser('score', help="bulk-score the stored rows with the active models")
+    score.add_argument('-o', '--output', required=True, help="CSV, JSON Lines or Parquet output")
+    score.add_argument('--keep', action='append', default=[], metavar='COLUMN',
+                       help="copy a stored column (e.g. video_id) to the output")
+    score.add_argument('--as-of', type=as_of, default=None, metavar='YYYY-MM-DD',
+                       help="reference date for days_since_upload (default: today)")
+    score.add_argument('--since', default=None, metavar='YYYY-MM', help="first upload month")
+    score.add_argument('--until', default=None, metavar='YYYY-MM', help="last upload month")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'append':
+        store = FeatureStore(args.store, ALL_FEATURE_NAMES if args.all_features else None, args.as_of)
+        progress = Progress()
+        for columns in READERS[args.format or detect_format(args.input)](args.input, args.chunk_size,
+                                                                       args.keep):
+            progress.update(store.append(columns, args.keep))
+        progress.finish()
+    elif args.command == 'list':
+        store = FeatureStore(args.store)
+        print(json.dumps({'as_of': store.manifest['as_of'], 'rows': store.rows,
+                          'partitions': store.partitions()}, indent=2))
+    else:
+        from ml.predictor import get_predictor
+        store, progress = FeatureStore(args.store), Progress()
+        writer = WRITERS[detect_format(args.output)](args.output)
+        try:
+            for rows, output in store.predict(get_predictor(), args.as_of, args.keep,
+                                              args.since, args.until):
+                writer.write(output)
+                progress.update(rows)
+        finally:
+            writer.close()
+        progress.finish()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Split-conformal prediction intervals.
+
+``test_clean_models.py`` reported ``prediction * 0.7`` to ``prediction *
+1.3`` as a confidence range. Here the range comes from residuals instead:
+score a labelled calibration set that the models were not trained on,
+and for each model and coverage level store the conformal quantile of
+``|log1p(views) - log1p(predicted)|``. An interval is then the point
+prediction plus or minus that quantile on the log scale. Applying it is a
+lookup and two ``expm1`` calls on arrays the batch call has already
+produced, so no model is called a second time.
+
+The residuals are grouped (Mondrian conformal) into bins of the predicted
+value, because the error of a log-views model is not the same for small
+and large channels. Bins with too few calibration rows use the global
+quantile.
+
+The shipped pickles carry held-out predictions but no labels, so intervals
+need a labelled export:
+
+    python -m ml.intervals calibrate labelled.csv --target view_count --as-of 2024-06-01
+
+This writes ``models/clean_intervals.json`` next to the model artifacts.
+The registry loads it when its version matches the models.
+"""
+
+import argparse
+import json
+import logging
+import math
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVELS = (0.8, 0.9)
+N_BINS = 10
+MIN_BIN_ROWS = 100
+HEADLINE_MODEL = 'gradient_boosting'
+
+
+def intervals_path(model_path: Optional[Path] = None, artifact_set: str = 'clean') -> Path:
+    if model_path is None:
+        from ml.versioning import active_model_path
+        model_path = active_model_path()
+    return Path(model_path) / f'{artifact_set}_intervals.json'
+
+
+def conformal_quantile(scores: np.ndarray, level: float) -> float:
+    """The ``ceil((n + 1) * level)``-th smallest score (inf if n is too small)."""
+    scores = np.sort(np.asarray(scores, dtype=np.float64))
+    rank = math.ceil((len(scores) + 1) * level)
+    return float(scores[rank - 1]) if rank <= len(scores) else math.inf
+
+
+def _bin(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    return np.searchsorted(edges[1:-1], values, side='right')
+
+
+def calibrate(y_true: np.ndarray, predictions: Mapping[str, np.ndarray],
+              levels: Sequence[float] = DEFAULT_LEVELS, n_bins: int = N_BINS,
+              min_bin_rows: int = MIN_BIN_ROWS, version: Optional[str] = None) -> Dict[str, Any]:
+    """Per-model, per-bin conformal quantiles of log-scale absolute residuals.
+
+    ``y_true`` and ``predictions`` are views (not log views).
+    """
+    y_log = np.log1p(np.asarray(y_true, dtype=np.float64))
+    models = {}
+    for name, views in predictions.items():
+        predicted = np.log1p(np.asarray(views, dtype=np.float64))
+        valid = np.isfinite(predicted) & np.isfinite(y_log)
+        predicted, scores = predicted[valid], np.abs(y_log[valid] - predicted[valid])
+        edges = np.unique(np.quantile(predicted, np.linspace(0, 1, n_bins + 1)))
+        bins = _bin(edges, predicted)
+        quantiles = {}
+        for level in levels:
+            overall = conformal_quantile(scores, level)
+            quantiles[f'{level:g}'] = [
+                conformal_quantile(scores[bins == b], level)
+                if np.count_nonzero(bins == b) >= min_bin_rows else overall
+                for b in range(len(edges) - 1)
+            ]
+        models[name] = {'edges': edges.tolist(), 'quantiles': quantiles, 'rows': int(valid.sum())}
+    return {
+        'method': 'split_conformal',
+        'version': version,
+        'levels': [float(level) for level in levels],
+        'models': models,
+        'calibrated_at': datetime.utcnow().isoformat(),
+    }
+
+
+class ConformalIntervals:
+    """Applies a stored calibration to batches of point predictions."""
+
+    def __init__(self, calibration: Dict[str, Any], level: Optional[float] = None):
+        self.calibration = calibration
+        self.version = calibration.get('version')
+        self.level = settings.interval_level if level is None else level
+        self._tables: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+        for name, model in calibration['models'].items():
+            edges = np.asarray(model['edges'], dtype=np.float64)
+            for key, quantiles in model['quantiles'].items():
+                self._tables[name, key] = (edges, np.asarray(quantiles, dtype=np.float64))
+
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> 'ConformalIntervals':
+        return cls(json.loads(Path(path).read_text()), **kwargs)
+
+    def save(self, path: Path) -> None:
+        Path(path).write_text(json.dumps(self.calibration, indent=2))
+
+    def bounds(self, model: str, views: np.ndarray,
+               level: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(lower, upper) views for one model's predictions at ``level`` coverage."""
+        key = f'{self.level if level is None else level:g}'
+        if (model, key) not in self._tables:
+            raise KeyError(f"No {key} calibration for {model}")
+        edges, quantiles = self._tables[model, key]
+        predicted = np.log1p(np.asarray(views, dtype=np.float64))
+        half_width = quantiles[_bin(edges, predicted)]
+        with np.errstate(over='ignore', invalid='ignore'):
+            lower = np.maximum(np.expm1(predicted - half_width), 0)
+            upper = np.expm1(predicted + half_width)
+        return lower, upper
+
+    def headline(self, predictions: Mapping[str, np.ndarray],
+                 level: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Bounds of the headline prediction of each row.
+
+        The headline is gradient boosting, or the first model that ran for
+        rows it did not score (cascade); rows without a calibrated model get
+        NaN bounds.
+        """
+        n_rows = len(next(iter(predictions.values())))
+        lower, upper = np.full(n_rows, np.nan), np.full(n_rows, np.nan)
+        names = sorted(predictions, key=lambda name: name != HEADLINE_MODEL)
+        for name in names:
+            missing = np.isnan(lower) & ~np.isnan(np.asarray(predictions[name], dtype=np.float64))
+            if not missing.any() or name not in self.calibration['models']:
+                continue
+            lower[missing], upper[missing] = self.bounds(name, np.asarray(predictions[name])[missing], level)
+        return lower, upper
+
+
+def load_intervals(model_path: Optional[Path] = None, artifact_set: str = 'clean',
+                   version: Optional[str] = None) -> Optional[ConformalIntervals]:
+    """The stored calibration, if there is one for these models."""
+    path = intervals_path(model_path, artifact_set)
+    if not path.exists():
+        return None
+    intervals = ConformalIntervals.load(path)
+    if version is not None and intervals.version not in (None, version):
+        logger.warning("Ignoring %s: calibrated for models %s, loaded %s",
+                       path.name, intervals.version, version)
+        return None
+    return intervals
+
+
+def calibrate_file(path: str, predictor: Any, target: str = 'view_count',
+                   input_format: Optional[str] = None, chunk_size: int = 100_000,
+                   now: Optional[datetime] = None, **kwargs) -> Dict[str, Any]:
+    """Score a labelled export chunk by chunk and calibrate on its residuals.
+
+    The calibration records the base version of the models (without the
+    cascade or router tags), which is what ``ModelRegistry.predictor``
+    checks it against.
+    """
+    from ml.bulk import READERS, detect_format
+
+    chunks = READERS[input_format or detect_format(path)](path, chunk_size, [target])
+    y_true, predictions = [], {}
+    for columns in chunks:
+        y_true.append(np.asarray(columns[target], dtype=np.float64))
+        for name, views in predictor.predict_views_batch(columns, now=now).items():
+            predictions.setdefault(name, []).append(views)
+    return calibrate(np.concatenate(y_true),
+                     {name: np.concatenate(parts) for name, parts in predictions.items()},
+                     version=predictor.version.split('+')[0], **kwargs)
+
+
+def main(argv=None):
+    """Command-line entry point: calibrate intervals from a labelled export."""
+    parser = argparse.ArgumentParser(description="Calibrate conformal prediction intervals")
+    sub = parser.add_subparsers(dest='command', required=True)
+    cal = sub.add_parser('calibrate', help="calibrate on a labelled CSV, JSON Lines or Parquet file")
+    cal.add_argument('input', help="videos the models were not trained on, with observed views")
+    cal.add_argument('--target', default='view_count', help="column with the observed views")
+    cal.add_argument('--format', choices=('csv', 'jsonl', 'parquet'), default=None)
+    cal.add_argument('--as-of', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                     required=True, metavar='YYYY-MM-DD', help="date the views were observed")
+    cal.add_argument('--levels', type=float, nargs='+', default=list(DEFAULT_LEVELS))
+    cal.add_argument('--model-path', type=Path, default=None)
+    cal.add_argument('-o', '--output', type=Path, default=None,
+                     help="calibration JSON (default: models/clean_intervals.json)")
+    args = parser.parse_args(argv)
+
+    from ml.registry import ModelRegistry
+    logging.basicConfig(level=logging.INFO)
+    # The global models: inputs carry no category, so specialists would never run
+    predictor = ModelRegistry(args.model_path).predictor(router=None)
+    calibration = calibrate_file(args.input, predictor, args.target, args.format,
+                                 now=args.as_of, levels=args.levels)
+    output = args.output or intervals_path(args.model_path)
+    ConformalIntervals(calibration).save(output)
+    rows = next(iter(calibration['models'].values()))['rows']
+    print(f"✅ Calibrated {len(calibration['models'])} models on {rows:,} rows -> {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Multi-core scoring.
+
+``ParallelPredictor`` shards a batch across a process pool. On platforms
+with ``fork`` the workers inherit the already-loaded predictor
+copy-on-write; elsewhere each worker opens the compiled registry, whose
+arrays are memory-mapped and therefore shared through the page cache.
+Nothing is unpickled per worker in either case. A spawned worker rebuilds
+the predictor with the same scaler folding, cascade and category router,
+and refuses to start if its version differs from the wrapped predictor's.
+
+Each worker is pinned to one native thread so N processes do not
+oversubscribe the cores with XGBoost/LightGBM/OpenMP threads. The limit
+goes through ``threadpoolctl``, since OpenMP reads ``OMP_NUM_THREADS``
+only once, when the runtime is loaded, and a forked worker inherits a
+runtime the parent already loaded.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+from utils.feature_engineering import num_rows, slice_columns, to_columns
+
+logger = logging.getLogger(__name__)
+
+MIN_SHARD_ROWS = 4096
+
+# Predictor used inside pool workers (inherited on fork, loaded otherwise)
+_worker_predictor = None
+
+
+def _limit_native_threads(predictor: Any) -> None:
+    for model in predictor.models.values():
+        if hasattr(model, 'set_params') and 'n_jobs' in model.get_params():
+            model.set_params(n_jobs=1)
+
+
+def _worker_spec(predictor: Any, artifact_set: str) -> Dict[str, Any]:
+    """What a spawned worker needs to rebuild ``predictor`` from the registry."""
+    from ml.registry import FusedScaler, ModelRegistry
+    base = predictor.version.split('+')[0]
+    if base != ModelRegistry(artifact_set=artifact_set).version:
+        raise ValueError(f"Spawned workers load the compiled {artifact_set!r} set; cannot "
+                         f"reproduce predictor version {base!r}")
+    return {
+        'artifact_set': artifact_set,
+        'fuse_scaler': isinstance(predictor.scaler, FusedScaler),
+        'cascade': predictor.cascade,
+        'router': predictor.router is not None,
+        'chunk_size': predictor.chunk_size,
+        'version': predictor.version,
+    }
+
+
+def _load_worker_predictor(spec: Dict[str, Any]) -> Any:
+    from ml.registry import ModelRegistry
+    kwargs = {} if spec['router'] else {'router': None}
+    predictor = ModelRegistry(artifact_set=spec['artifact_set']).predictor(
+        fuse_scaler=spec['fuse_scaler'], cascade=spec['cascade'], chunk_size=spec['chunk_size'],
+        **kwargs)
+    if predictor.version != spec['version']:
+        raise RuntimeError(f"Worker loaded {predictor.version!r}, expected {spec['version']!r}")
+    return predictor
+
+
+def _init_worker(spec: Optional[Dict[str, Any]]) -> None:
+    global _worker_predictor
+    if _worker_predictor is None:
+        _worker_predictor = _load_worker_predictor(spec)
+    _limit_native_threads(_worker_predictor)
+    threadpool_limits(limits=1)
+
+
+def _score_shard(args) -> Dict[str, np.ndarray]:
+    columns, now = args
+    return _worker_predictor.predict_views_batch(columns, now=now)
+
+
+class ParallelPredictor:
+    """Shards batches across a process pool; same results as the wrapped predictor.
+
+    Use as a context manager, or call ``close()`` when done.
+    """
+
+    def __init__(self, predictor: Any, processes: Optional[int] = None,
+                 shard_size: Optional[int] = None, artifact_set: str = 'clean',
+                 start_method: Optional[str] = None):
+        self.predictor = predictor
+        self.processes = processes or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.artifact_set = artifact_set
+        if start_method is None:
+            start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self._pool = None
+
+    def _get_pool(self):
+        global _worker_predictor
+        if self._pool is None:
+            if self.start_method == 'fork':
+                # Load everything before forking so workers share the pages
+                for name in self.predictor.models:
+                    self.predictor.models[name]
+                self.predictor._forest_stack()
+                _worker_predictor = self.predictor
+                spec = None
+            else:
+                spec = _worker_spec(self.predictor, self.artifact_set)
+            context = multiprocessing.get_context(self.start_method)
+            self._pool = context.Pool(self.processes, initializer=_init_worker, initargs=(spec,))
+        return self._pool
+
+    @property
+    def intervals(self) -> Optional[Any]:
+        return self.predictor.intervals
+
+    def predict_views_batch(self, videos: Any, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Predict views for a batch, one shard per task, in input order."""
+        columns = to_columns(videos, optional=self.predictor._optional_fields())
+        n_rows = num_rows(columns)
+        now = now or datetime.now()
+        # One shard per process by default, but not so small that IPC dominates
+        shard_size = self.shard_size or max(MIN_SHARD_ROWS, -(-n_rows // self.processes))
+        if n_rows <= shard_size or self.processes == 1:
+            return self.predictor.predict_views_batch(columns, now=now)
+
+        shards = [(slice_columns(columns, start, start + shard_size), now)
+                  for start in range(0, n_rows, shard_size)]
+        results: List[Dict[str, np.ndarray]] = self._get_pool().map(_score_shard, shards)
+        return {name: np.concatenate([result[name] for result in results])
+                for name in results[0]}
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> 'ParallelPredictor':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def predict_models_threaded(predictor: Any, X_scaled: np.ndarray, max_workers: Optional[int] = None,
+                            names: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """Raw predictions with each model in its own thread.
+
+    Worth it for models whose ``predict`` releases the GIL (native
+    XGBoost/LightGBM, NumPy tree traversal); results match ``predict_raw``.
+    """
+    names = list(predictor.models) if names is None else list(names)
+    with ThreadPoolExecutor(max_workers=max_workers or len(names)) as executor:
+        futures = {name: executor.submit(predictor.models[name].predict, X_scaled) for name in names}
+        return {name: np.asarray(future.result()) for name, future in futures.items()}
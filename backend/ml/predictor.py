@@ -0,0 +1,243 @@
+"""
+Batch prediction over the clean models.
+
+``predict_views`` in test_clean_models.py scores one video per call: one
+single-row DataFrame, one ``scaler.transform`` and one ``predict`` per
+model. ``BatchPredictor`` builds the feature matrix for a whole chunk with
+NumPy and calls each model once per chunk.
+"""
+
+import logging
+import pickle
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import metrics
+from core.config import settings
+from ml.trees import ForestStack, TreeEnsemble
+from utils.feature_engineering import (
+    compute_features, assemble_matrix, num_rows, slice_columns, to_columns,
+)
+from utils.text_features import optional_inputs
+
+logger = logging.getLogger(__name__)
+
+
+def load_clean_models(model_path: Optional[Path] = None) -> Tuple[Dict[str, Any], Any, list, dict]:
+    """Load the clean models, scaler, feature names and model info.
+
+    Defaults to the active version (``ml.versioning``) under MODEL_PATH.
+    """
+    if model_path is None:
+        from ml.versioning import active_model_path
+        model_path = active_model_path()
+    model_path = Path(model_path)
+
+    with open(model_path / 'clean_model_info.pkl', 'rb') as f:
+        model_info = pickle.load(f)
+    with open(model_path / 'clean_scaler.pkl', 'rb') as f:
+        scaler = pickle.load(f)
+    with open(model_path / 'clean_feature_names.pkl', 'rb') as f:
+        feature_names = pickle.load(f)
+
+    models = {}
+    for model_name in model_info['model_names']:
+        artifact = model_path / f'{model_name}_clean_model.pkl'
+        if not artifact.exists():
+            # clean_model_info lists random_forest, which is not shipped
+            logger.warning("Skipping %s: %s not found", model_name, artifact.name)
+            continue
+        started = time.perf_counter()
+        with open(artifact, 'rb') as f:
+            models[model_name] = pickle.load(f)['model']
+        metrics.observe_model_load(model_name, time.perf_counter() - started)
+
+    return models, scaler, feature_names, model_info
+
+
+class BatchPredictor:
+    """Vectorized view predictions for batches of videos."""
+
+    def __init__(self, models: Dict[str, Any], scaler: Any, feature_names: list,
+                 model_info: dict, chunk_size: Optional[int] = None, version: str = 'pickle',
+                 model_threads: bool = False, cascade: Optional[Any] = None,
+                 intervals: Optional[Any] = None, router: Optional[Any] = None):
+        self.models = models
+        self.scaler = scaler
+        self.feature_names = list(feature_names)
+        self.model_info = model_info
+        self.chunk_size = chunk_size or settings.predict_chunk_size
+        # Identifies the artifacts behind the predictions (cache keys, result stores)
+        self.version = version
+        # Run each model in its own thread (native XGBoost/LightGBM release the GIL)
+        self.model_threads = model_threads
+        # ml.cascade.Cascade: score with the cheap model, escalate risky rows only
+        self.cascade = cascade
+        if cascade is not None:
+            self.version = f"{version}+{cascade.tag}"
+        # ml.intervals.ConformalIntervals: calibrated bounds for the predictions
+        self.intervals = intervals
+        # ml.routing.CategoryRouter: rows of some categories go to specialist models
+        self.router = router
+        if router is not None:
+            self.version = f"{self.version}+{router.tag}"
+        self._forest: Optional[ForestStack] = None
+        self._forest_built = False
+        self._explainer: Optional[Any] = None
+
+    @classmethod
+    def from_directory(cls, model_path: Optional[Path] = None, **kwargs) -> 'BatchPredictor':
+        """Load the clean model artifacts from a models/ directory."""
+        return cls(*load_clean_models(model_path), **kwargs)
+
+    def scale(self, X: np.ndarray) -> np.ndarray:
+        """Apply the clean scaler to a raw feature matrix."""
+        with metrics.stage_timer('scale'), warnings.catch_warnings():
+            # The scaler was fitted on a DataFrame; columns are already aligned
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            return self.scaler.transform(X)
+
+    def predict_matrix(self, X: np.ndarray,
+                       categories: Optional[Sequence[Any]] = None) -> Dict[str, np.ndarray]:
+        """Predict views for an unscaled feature matrix, one call per model.
+
+        With a router, ``categories`` (one per row) sends each category's
+        rows to its specialist models in one call per category.
+        """
+        if self.router is not None and categories is not None:
+            return self.router.predict_matrix(self, X, categories)
+        metrics.observe_batch(len(X))
+        X_scaled = self.scale(X)
+        if self.cascade is not None:
+            raw = self.cascade.predict_raw(self, X_scaled)
+        else:
+            raw = self.predict_raw(X_scaled)
+        return {name: self._to_views(raw[name]) for name in self.models}
+
+    def predict_raw(self, X_scaled: np.ndarray,
+                    names: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """Raw model outputs for a scaled matrix (all models, or only ``names``).
+
+        For small batches (``STACK_TREES_MAX_ROWS``) the compiled tree
+        ensembles are traversed together in a single pass, which saves the
+        per-level NumPy overhead; larger batches are faster model by model.
+        With ``model_threads`` every model runs in its own thread instead.
+        """
+        names = list(self.models) if names is None else list(names)
+        if self.model_threads:
+            from ml.parallel import predict_models_threaded
+            return predict_models_threaded(self, X_scaled, names=names)
+        n_rows = len(X_scaled)
+        raw = {}
+        forest = self._forest_stack() if n_rows <= settings.stack_trees_max_rows else None
+        if forest is not None and set(forest.names) <= set(names):
+            started = time.perf_counter()
+            raw = forest.predict(X_scaled)
+            elapsed = time.perf_counter() - started
+            for name in forest.names:
+                metrics.observe_model(name, n_rows, elapsed, path='stacked')
+        for name in names:
+            if name not in raw:
+                started = time.perf_counter()
+                raw[name] = self.models[name].predict(X_scaled)
+                metrics.observe_model(name, n_rows, time.perf_counter() - started)
+        return raw
+
+    def _forest_stack(self) -> Optional[ForestStack]:
+        if not self._forest_built:
+            trees = {name: model for name, model in self.models.items()
+                     if isinstance(model, TreeEnsemble)}
+            self._forest = ForestStack(trees) if trees else None
+            self._forest_built = True
+        return self._forest
+
+    def explain(self, X: np.ndarray, categories: Optional[Sequence[Any]] = None,
+                model: Optional[str] = None, mode: str = 'fast') -> Tuple[np.ndarray, np.ndarray]:
+        """(base value per row, per-feature attributions) of one tree model's raw output.
+
+        Defaults to the headline model; rows are routed like
+        ``predict_matrix``. See ``ml.explain``.
+        """
+        if self.router is not None and categories is not None:
+            return self.router.explain(self, X, categories, model, mode)
+        if self._explainer is None:
+            from ml.explain import Explainer
+            self._explainer = Explainer(self)
+        if model is None:
+            from ml.explain import HEADLINE_MODEL
+            model = HEADLINE_MODEL
+        return self._explainer.explain(X, model, mode)
+
+    def _optional_fields(self) -> Tuple[str, ...]:
+        optional = optional_inputs(self.feature_names)
+        return (*optional, 'category') if self.router is not None else optional
+
+    def _matrix(self, columns: Dict[str, Any], now: Optional[datetime]) -> np.ndarray:
+        with metrics.stage_timer('features'):
+            features = compute_features(columns, now or datetime.now(), self.feature_names)
+            return assemble_matrix(features, self.feature_names, num_rows(columns))
+
+    def build_features(self, videos: Any, now: Optional[datetime] = None) -> np.ndarray:
+        """Unscaled feature matrix for a batch of videos, in model column order."""
+        return self._matrix(to_columns(videos, optional=optional_inputs(self.feature_names)), now)
+
+    def predict_with_features(self, videos: Any,
+                              now: Optional[datetime] = None) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Feature matrix and per-model predictions (same contract as CachedPredictor)."""
+        columns = to_columns(videos, optional=self._optional_fields())
+        X = self._matrix(columns, now)
+        return X, self.predict_matrix(X, columns.get('category'))
+
+    def predict_views_batch(self, videos: Any, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Predict views for a batch of videos.
+
+        ``videos`` may be a list of video dicts, a DataFrame, a pyarrow
+        Table or a dict of NumPy columns. Returns one array of predicted
+        views per model, in input order.
+        """
+        columns = to_columns(videos, optional=self._optional_fields())
+        n_rows = num_rows(columns)
+        now = now or datetime.now()
+        categories = columns.get('category')
+
+        predictions = {name: np.empty(n_rows, dtype=np.float64) for name in self.models}
+        X = np.empty((min(self.chunk_size, n_rows), len(self.feature_names)), dtype=np.float64)
+        for start in range(0, n_rows, self.chunk_size):
+            stop = min(start + self.chunk_size, n_rows)
+            with metrics.stage_timer('features'):
+                chunk = slice_columns(columns, start, stop)
+                features = compute_features(chunk, now, self.feature_names)
+                X_chunk = assemble_matrix(features, self.feature_names, stop - start, out=X[:stop - start])
+            chunk_categories = None if categories is None else categories[start:stop]
+            for name, views in self.predict_matrix(X_chunk, chunk_categories).items():
+                predictions[name][start:stop] = views
+        return predictions
+
+    def _to_views(self, raw: np.ndarray) -> np.ndarray:
+        """Undo the log1p target transform and clamp to non-negative views."""
+        raw = np.asarray(raw, dtype=np.float64)
+        if self.model_info['target_transformed']:
+            raw = np.expm1(raw)  # Inverse of log1p
+        return np.maximum(raw, 0, out=raw)
+
+
+_default_predictor: Optional[BatchPredictor] = None
+
+
+def get_predictor() -> BatchPredictor:
+    """Return the process-wide predictor over the compiled model registry."""
+    global _default_predictor
+    if _default_predictor is None:
+        from ml.registry import ModelRegistry
+        _default_predictor = ModelRegistry().predictor()
+    return _default_predictor
+
+
+def predict_views_batch(videos: Any, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """Predict views for a batch of videos with the default predictor."""
+    return get_predictor().predict_views_batch(videos, now=now)
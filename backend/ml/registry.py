@@ -0,0 +1,417 @@
+"""
+Model registry with a compact, pickle-free on-disk format.
+
+The pickles in models/ are converted once into ``models/compiled/<set>/``:
+
+* ridge / scaler -> raw coefficient arrays (``.npy``)
+* GradientBoosting / XGBoost / LightGBM -> flat tree node arrays (see
+  ``ml.trees``), so scoring never imports the native libraries
+
+NumPy arrays are opened with ``mmap_mode='r'``, so every uvicorn worker on
+a node shares the same page-cache pages, and models are only opened the
+first time they are used. The compiled set is rebuilt automatically when a
+source pickle changes.
+
+Usage:
+    python -m ml.registry build [--set clean|legacy] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import joblib
+import numpy as np
+
+from core import metrics
+from core.config import settings
+from ml.cascade import CHEAP_MODEL, REFERENCE_MODEL, calibrate
+from ml.trees import TreeEnsemble, describe, from_estimator
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process build lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 4
+MANIFEST = 'manifest.json'
+
+# Source pickles for each artifact set in models/
+ARTIFACT_SETS = {
+    'clean': {
+        'info': 'clean_model_info.pkl',
+        'scaler': 'clean_scaler.pkl',
+        'feature_names': 'clean_feature_names.pkl',
+        'model_pattern': '{name}_clean_model.pkl',
+    },
+    'legacy': {
+        'info': 'training_metadata.pkl',
+        'scaler': 'main_scaler.pkl',
+        'feature_names': None,  # taken from main_scaler.feature_names_in_
+        'model_pattern': '{name}_model.pkl',
+        'model_names': ['ridge', 'xgboost', 'lightgbm', 'gradient_boosting'],
+    },
+}
+
+
+class LinearModel:
+    """Linear regressor over raw coefficient arrays."""
+
+    def __init__(self, coef: np.ndarray, intercept: float):
+        self.coef = coef
+        self.intercept = float(intercept)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return X @ self.coef + self.intercept
+
+    def fold_scaler(self, mean: np.ndarray, scale: np.ndarray) -> 'LinearModel':
+        """Equivalent model over unscaled inputs: ``x @ (c / s) + (b - mean @ (c / s))``."""
+        coef = np.asarray(self.coef, dtype=np.float64) / scale
+        return LinearModel(coef, self.intercept - float(np.asarray(mean, dtype=np.float64) @ coef))
+
+
+class ArrayScaler:
+    """StandardScaler.transform over raw mean/scale arrays."""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        return (X - self.mean_) / self.scale_
+
+
+class FusedScaler(ArrayScaler):
+    """Scaler already folded into the models: ``transform`` returns its input.
+
+    Keeps ``mean_``/``scale_`` for reference; the models take raw features.
+    """
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        return X
+
+
+class LazyModels(Mapping):
+    """Read-only model mapping that opens each model on first access."""
+
+    def __init__(self, loaders: Dict[str, Callable[[], Any]]):
+        self._loaders = loaders
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Any:
+        model = self._loaded.get(name)
+        if model is None:
+            with self._lock:
+                if name not in self._loaded:
+                    started = time.perf_counter()
+                    self._loaded[name] = self._loaders[name]()
+                    metrics.observe_model_load(name, time.perf_counter() - started)
+                model = self._loaded[name]
+        return model
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._loaders)
+
+    def __len__(self) -> int:
+        return len(self._loaders)
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _load_pickle(source: Any) -> Any:
+    """The fitted model in a pickle path (or an already loaded pickle)."""
+    obj = joblib.load(source) if isinstance(source, Path) else source  # plain pickles and joblib dumps
+    if isinstance(obj, dict) and 'model' in obj:
+        return obj['model']
+    return obj
+
+
+def _convert_model(model: Any, directory: Path, name: str) -> Dict[str, Any]:
+    """Write one fitted model in its compact form and describe it."""
+    kind = type(model).__name__
+    if kind in ('GradientBoostingRegressor', 'XGBRegressor', 'LGBMRegressor'):
+        ensemble = from_estimator(model)
+        ensemble.save(directory / name)
+        return {'kind': 'tree_ensemble', 'source': kind, 'path': name, **describe(ensemble)}
+    if hasattr(model, 'coef_') and hasattr(model, 'intercept_'):
+        np.save(directory / f'{name}_coef.npy', np.asarray(model.coef_, dtype=np.float64).ravel())
+        return {'kind': 'linear', 'path': f'{name}_coef.npy',
+                'intercept': float(np.ravel(model.intercept_)[0])}
+    raise ValueError(f"Unsupported model type for {name}: {kind}")
+
+
+class ModelRegistry:
+    """Compiled, lazily loaded view of one artifact set in models/."""
+
+    def __init__(self, model_path: Optional[Path] = None, artifact_set: str = 'clean',
+                 compiled_path: Optional[Path] = None):
+        if model_path is None:
+            from ml.versioning import active_model_path
+            model_path = active_model_path()
+        self.model_path = Path(model_path)
+        self.artifact_set = artifact_set
+        self.spec = ARTIFACT_SETS[artifact_set]
+        self.compiled_path = Path(compiled_path or self.model_path / 'compiled' / artifact_set)
+        self._manifest: Optional[dict] = None
+
+    # -- building ---------------------------------------------------------
+
+    def source_files(self) -> Dict[str, Path]:
+        """Source pickles of this set that exist on disk."""
+        names = [self.spec['info'], self.spec['scaler']]
+        if self.spec['feature_names']:
+            names.append(self.spec['feature_names'])
+        for model_name in self._source_model_names():
+            names.append(self.spec['model_pattern'].format(name=model_name))
+        return {name: self.model_path / name for name in names if (self.model_path / name).exists()}
+
+    def _source_model_names(self) -> list:
+        if 'model_names' in self.spec:
+            return self.spec['model_names']
+        return list(joblib.load(self.model_path / self.spec['info'])['model_names'])
+
+    def _fingerprint(self, names=None) -> Dict[str, list]:
+        fingerprint = {}
+        for name in names if names is not None else self.source_files():
+            path = self.model_path / name
+            if path.exists():
+                stat = path.stat()
+                fingerprint[name] = [stat.st_size, stat.st_mtime_ns]
+        return fingerprint
+
+    def is_stale(self) -> bool:
+        """True when the compiled set is missing or older than its sources."""
+        manifest_path = self.compiled_path / MANIFEST
+        if not manifest_path.exists():
+            return True
+        manifest = json.loads(manifest_path.read_text())
+        # The info pickle lists the model names, so checking the recorded
+        # sources is enough and avoids unpickling anything on startup
+        sources = manifest.get('sources', {})
+        return (manifest.get('format_version') != FORMAT_VERSION
+                or sources != self._fingerprint(list(sources)))
+
+    def ensure_built(self) -> None:
+        """Build the compiled set if it is missing or stale."""
+        if self.is_stale():
+            with self._build_lock():
+                if self.is_stale():  # another worker may have just built it
+                    self.build()
+
+    def build(self) -> Path:
+        """Convert the source pickles and atomically publish the result.
+
+        Each build goes into its own directory next to ``compiled_path``,
+        which is a symlink swapped over to the new directory in one
+        ``os.replace``, so readers see either the old set or the new one.
+        """
+        self.compiled_path.parent.mkdir(parents=True, exist_ok=True)
+        staging = self.compiled_path.parent / f'.{self.artifact_set}-{uuid.uuid4().hex}'
+        staging.mkdir()
+        try:
+            manifest = self._convert(staging)
+            (staging / MANIFEST).write_text(json.dumps(manifest, indent=2))
+            self._publish(staging)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self._manifest = None
+        logger.info("Compiled %s models into %s", self.artifact_set, self.compiled_path)
+        return self.compiled_path
+
+    def _convert(self, staging: Path) -> dict:
+        fingerprint = self._fingerprint()
+        info = joblib.load(self.model_path / self.spec['info'])
+        scaler = joblib.load(self.model_path / self.spec['scaler'])
+        if self.spec['feature_names']:
+            feature_names = list(joblib.load(self.model_path / self.spec['feature_names']))
+        else:
+            feature_names = [str(name) for name in scaler.feature_names_in_]
+
+        np.save(staging / 'scaler_mean.npy', np.asarray(scaler.mean_, dtype=np.float64))
+        np.save(staging / 'scaler_scale.npy', np.asarray(scaler.scale_, dtype=np.float64))
+
+        models = {}
+        test_predictions = {}
+        for name in self._source_model_names():
+            path = self.model_path / self.spec['model_pattern'].format(name=name)
+            if not path.exists():
+                logger.warning("Skipping %s: %s not found", name, path.name)
+                continue
+            obj = joblib.load(path)
+            if isinstance(obj, dict) and 'y_test_pred' in obj:
+                test_predictions[name] = obj['y_test_pred']
+            models[name] = _convert_model(_load_pickle(obj), staging, name)
+
+        cascade = None
+        if {CHEAP_MODEL, REFERENCE_MODEL} <= set(test_predictions):
+            cascade = calibrate(test_predictions)
+
+        return {
+            'format_version': FORMAT_VERSION,
+            'artifact_set': self.artifact_set,
+            'feature_names': feature_names,
+            'target_transformed': bool(info.get('target_transformed', True)),
+            'model_info': _jsonable(info),
+            'models': models,
+            'cascade': cascade,
+            'sources': fingerprint,
+        }
+
+    def _publish(self, staging: Path) -> None:
+        link = self.compiled_path.parent / f'.{self.artifact_set}-link-{uuid.uuid4().hex}'
+        os.symlink(staging.name, link, target_is_directory=True)
+        retired = None
+        try:
+            if self.compiled_path.is_symlink():
+                retired = self.compiled_path.parent / os.readlink(self.compiled_path)
+            elif self.compiled_path.exists():
+                # A set compiled before publishing went through a symlink;
+                # a link cannot replace a directory, so move it aside once
+                retired = self.compiled_path.parent / f'.{self.artifact_set}-retired-{uuid.uuid4().hex}'
+                os.rename(self.compiled_path, retired)
+            os.replace(link, self.compiled_path)
+        except BaseException:
+            link.unlink(missing_ok=True)
+            raise
+        if retired is not None:
+            # Workers that still map the old files keep them until unmapped
+            shutil.rmtree(retired, ignore_errors=True)
+
+    @contextmanager
+    def _build_lock(self):
+        self.compiled_path.parent.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(self.compiled_path.parent / f'.{self.artifact_set}.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # -- loading ----------------------------------------------------------
+
+    @property
+    def manifest(self) -> dict:
+        if self._manifest is None:
+            self.ensure_built()
+            self._manifest = json.loads((self.compiled_path / MANIFEST).read_text())
+        return self._manifest
+
+    @property
+    def feature_names(self) -> list:
+        return list(self.manifest['feature_names'])
+
+    @property
+    def version(self) -> str:
+        """Short fingerprint of the source artifacts the set was built from."""
+        sources = json.dumps(self.manifest['sources'], sort_keys=True)
+        return hashlib.sha1(f"{FORMAT_VERSION}:{sources}".encode()).hexdigest()[:12]
+
+    @property
+    def model_info(self) -> dict:
+        return {**self.manifest['model_info'],
+                'target_transformed': self.manifest['target_transformed'],
+                'model_names': list(self.manifest['models'])}
+
+    def load_scaler(self) -> ArrayScaler:
+        return ArrayScaler(self._load_array('scaler_mean.npy'), self._load_array('scaler_scale.npy'))
+
+    def load_model(self, name: str) -> Any:
+        """Open one compiled model."""
+        entry = self.manifest['models'][name]
+        path = self.compiled_path / entry['path']
+        kind = entry['kind']
+        if kind == 'linear':
+            return LinearModel(self._load_array(entry['path']), entry['intercept'])
+        if kind == 'tree_ensemble':
+            return TreeEnsemble.load(path)
+        raise ValueError(f"Unknown compiled model kind: {kind}")
+
+    def models(self, scaler: Optional[ArrayScaler] = None) -> LazyModels:
+        """All models of the set, each opened on first access.
+
+        With ``scaler``, each model is folded over it when opened and takes
+        unscaled features.
+        """
+        if scaler is None:
+            return LazyModels({name: (lambda name=name: self.load_model(name))
+                               for name in self.manifest['models']})
+        return LazyModels({name: (lambda name=name: self.load_model(name).fold_scaler(
+                               scaler.mean_, scaler.scale_))
+                           for name in self.manifest['models']})
+
+    def predictor(self, fuse_scaler: Optional[bool] = None, **kwargs):
+        """A BatchPredictor backed by the compiled artifacts.
+
+        With ``fuse_scaler`` (``FUSE_SCALER``, on by default) the scaler is
+        folded into the ridge coefficients and tree thresholds, so raw
+        feature matrices go straight into the models without a scaled copy.
+        Conformal intervals calibrated for these models and category
+        specialists trained from them (``ml.routing``) are attached if
+        present.
+        """
+        from ml.intervals import load_intervals
+        from ml.predictor import BatchPredictor
+        from ml.routing import load_router
+        kwargs.setdefault('version', self.version)
+        kwargs.setdefault('intervals', load_intervals(self.model_path, self.artifact_set, self.version))
+        if 'router' not in kwargs and self.artifact_set == 'clean':
+            kwargs['router'] = load_router(self.model_path, self.feature_names,
+                                           list(self.manifest['models']), fuse_scaler)
+        scaler = self.load_scaler()
+        if settings.fuse_scaler if fuse_scaler is None else fuse_scaler:
+            return BatchPredictor(self.models(scaler), FusedScaler(scaler.mean_, scaler.scale_),
+                                  self.feature_names, self.model_info, **kwargs)
+        return BatchPredictor(self.models(), scaler, self.feature_names, self.model_info, **kwargs)
+
+    def _load_array(self, name: str) -> np.ndarray:
+        # Plain ndarray view over the mapping; np.memmap indexing is slow
+        return np.load(self.compiled_path / name, mmap_mode='r').view(np.ndarray)
+
+
+def main(argv=None):
+    """Command-line entry point: compile an artifact set."""
+    parser = argparse.ArgumentParser(description="Compile ViralCast model artifacts")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="convert pickles into the compiled format")
+    build.add_argument('--set', dest='artifact_set', default='clean', choices=sorted(ARTIFACT_SETS))
+    build.add_argument('--model-path', type=Path, default=None)
+    build.add_argument('--force', action='store_true', help="rebuild even if up to date")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    registry = ModelRegistry(args.model_path, artifact_set=args.artifact_set)
+    if args.force:
+        with registry._build_lock():
+            registry.build()
+    else:
+        registry.ensure_built()
+    print(f"✅ {args.artifact_set} models compiled to {registry.compiled_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Persistent prediction results for repeated catalog scoring.
+
+Nightly jobs re-score whole channel catalogs whose videos rarely change,
+except for ``days_since_upload`` which moves with the reference date. The
+tree models only see a feature through their split thresholds, so each
+row is reduced to its bin per feature (how many of the ensemble's
+thresholds lie below the value). Two rows with the same bins reach the
+same leaves in every tree. So a day's ageing changes a video's key only
+when it crosses a split.
+
+``StoredPredictor`` scores each batch like ``BatchPredictor``:
+
+1. features for the (injectable) reference date;
+2. identical bin rows within the batch are collapsed (``np.unique``);
+3. their tree outputs are looked up in a SQLite ``ResultStore`` keyed by
+   (model version, bin hash);
+4. only the missing rows go to the tree models, and their outputs are
+   stored.
+
+Linear models (ridge) are a dot product and are computed for every row.
+Cascade predictors are not supported, since their escalation depends on
+the whole row.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ml.cache import CacheStats
+from ml.trees import TreeEnsemble, from_estimator
+from utils.feature_engineering import num_rows, to_columns
+from utils.text_features import optional_inputs
+
+# Parameters per SQLite statement (the default SQLITE_MAX_VARIABLE_NUMBER is 999+)
+LOOKUP_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    version TEXT NOT NULL,
+    key BLOB NOT NULL,
+    raw BLOB NOT NULL,
+    PRIMARY KEY (version, key)
+) WITHOUT ROWID
+"""
+
+
+class ResultStore:
+    """On-disk map of (model version, row key) -> raw tree-model outputs."""
+
+    def __init__(self, path: Any):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, version: str, keys: Sequence[bytes]) -> Dict[bytes, bytes]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, raw FROM results WHERE version = ? AND key IN ({placeholders})",
+                    [version, *batch]))
+        return found
+
+    def set_many(self, version: str, items: Iterable[Tuple[bytes, bytes]]) -> None:
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO results (version, key, raw) VALUES (?, ?, ?)",
+                                   ((version, key, raw) for key, raw in items))
+            self._conn.commit()
+
+    def versions(self) -> Dict[str, int]:
+        """Stored rows per model version."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT version, COUNT(*) FROM results GROUP BY version"))
+
+    def prune(self, keep: Sequence[str]) -> int:
+        """Delete the results of every version not in ``keep``; returns rows deleted."""
+        with self._lock:
+            placeholders = ','.join('?' * len(keep)) or "''"
+            deleted = self._conn.execute(
+                f"DELETE FROM results WHERE version NOT IN ({placeholders})", list(keep)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class TreeBins:
+    """Bin codes of a scaled matrix under the split thresholds of some tree models."""
+
+    def __init__(self, models: Dict[str, Any], n_features: int):
+        self.names = []
+        thresholds: List[List[float]] = [[] for _ in range(n_features)]
+        for name, model in models.items():
+            try:
+                ensemble = model if isinstance(model, TreeEnsemble) else from_estimator(model)
+            except ValueError:
+                continue  # linear models are recomputed per row
+            self.names.append(name)
+            split = np.isfinite(ensemble.threshold)
+            for feature, threshold in zip(ensemble.feature[split].tolist(),
+                                          ensemble.threshold[split].tolist()):
+                thresholds[feature].append(threshold)
+        self.columns = [j for j, values in enumerate(thresholds) if values]
+        self.thresholds = [np.unique(thresholds[j]) for j in self.columns]
+
+    def codes(self, X_scaled: np.ndarray) -> np.ndarray:
+        """(n_rows, used features) int32; -1 for missing values.
+
+        A node sends ``x <= threshold`` left, so rows with the same number
+        of thresholds strictly below each value take the same path.
+        """
+        codes = np.empty((len(X_scaled), len(self.columns)), dtype=np.int32)
+        for i, (j, thresholds) in enumerate(zip(self.columns, self.thresholds)):
+            x = X_scaled[:, j]
+            codes[:, i] = np.searchsorted(thresholds, x, side='left')
+            codes[np.isnan(x), i] = -1
+        return codes
+
+
+class StoredPredictor:
+    """``predict_views_batch`` that only sends changed rows to the tree models."""
+
+    def __init__(self, predictor: Any, store: ResultStore):
+        if getattr(predictor, 'cascade', None) is not None:
+            raise ValueError("The result store does not support cascade predictors")
+        self.predictor = predictor
+        self.store = store
+        self.stats = CacheStats()
+        self.rows = 0
+        self._bins: Dict[int, TreeBins] = {}
+
+    @property
+    def intervals(self) -> Optional[Any]:
+        return self.predictor.intervals
+
+    def predict_views_batch(self, videos: Any, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Same contract as ``BatchPredictor.predict_views_batch``."""
+        predictor = self.predictor
+        now = now or datetime.now()
+        columns = to_columns(videos, optional=(*optional_inputs(predictor.feature_names), 'category'))
+        X = predictor.build_features(columns, now)
+        predictions = {name: np.empty(num_rows(columns), dtype=np.float64) for name in predictor.models}
+        router = predictor.router
+        categories = columns.get('category')
+        if router is None or categories is None:
+            groups = [(predictor, slice(None))]
+        else:
+            # Same split as CategoryRouter.predict_matrix: route 0 is the global set
+            from ml.routing import _groups
+            scorers = [predictor] + list(router.specialists.values())
+            groups = [(scorers[route], rows) for route, rows in _groups(router.route(categories))]
+        for scorer, rows in groups:
+            for name, views in self._score(scorer, X[rows]).items():
+                predictions[name][rows] = views
+        self.rows += len(X)
+        return predictions
+
+    def _score(self, scorer: Any, X: np.ndarray) -> Dict[str, np.ndarray]:
+        bins = self._bins.get(id(scorer))
+        if bins is None:
+            bins = self._bins[id(scorer)] = TreeBins(scorer.models, X.shape[1])
+        X_scaled = scorer.scale(X)
+        linear = [name for name in scorer.models if name not in bins.names]
+        raw = scorer.predict_raw(X_scaled, linear) if linear else {}
+        if bins.names and len(X):
+            raw.update(self._tree_raw(scorer, bins, X_scaled))
+        return {name: scorer._to_views(raw[name]) for name in scorer.models}
+
+    def _tree_raw(self, scorer: Any, bins: TreeBins, X_scaled: np.ndarray) -> Dict[str, np.ndarray]:
+        codes, first, inverse = np.unique(bins.codes(X_scaled), axis=0, return_index=True,
+                                          return_inverse=True)
+        prefix = f"{':'.join(bins.names)}:".encode()
+        keys = [hashlib.blake2b(prefix + row.tobytes(), digest_size=16).digest() for row in codes]
+        found = self.store.get_many(scorer.version, keys)
+        tree_raw = np.empty((len(keys), len(bins.names)), dtype=np.float64)
+        missing = []
+        for i, key in enumerate(keys):
+            entry = found.get(key)
+            if entry is None:
+                missing.append(i)
+            else:
+                tree_raw[i] = np.frombuffer(entry, dtype=np.float64)
+        self.stats.hits += len(keys) - len(missing)
+        self.stats.misses += len(missing)
+        if missing:
+            fresh = scorer.predict_raw(X_scaled[first[missing]], bins.names)
+            tree_raw[missing] = np.column_stack([fresh[name] for name in bins.names])
+            self.store.set_many(scorer.version, ((keys[i], tree_raw[i].tobytes()) for i in missing))
+
+        inverse = inverse.reshape(-1)
+        return {name: tree_raw[inverse, k] for k, name in enumerate(bins.names)}
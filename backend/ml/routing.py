@@ -0,0 +1,353 @@
+"""
+Category-aware routing to per-category specialist models.
+
+``models/category_label_encoder.pkl`` holds the YouTube categories the
+models were built for, but the clean features ignore category, so every
+video goes through the same four global models. A ``CategoryRouter``
+encodes the ``category`` of a whole batch at once (``searchsorted`` over
+the encoder's sorted classes) and groups the rows by route. Each group is
+scored with one ``predict_matrix`` call: the specialist set of its
+category, or the global set for categories without one. The results are
+scattered back into input order, so every group still scores vectorized.
+
+Specialists are clean sets warm-started from the global set on one
+category's labelled rows (``ml.versioning.IncrementalFit``). They share
+its features and scaler, so the batch's feature matrix is built once.
+A specialist is kept only if its headline model beats the global one on
+that category's held-out rows (by ``MIN_GAIN``)::
+
+    <model set>/
+        categories/
+            routing.json          encoder classes, specialists and their evaluation
+            gaming/               clean set for "Gaming"
+                compiled/clean/   built by ModelRegistry on first use
+
+``ModelRegistry.predictor()`` attaches the router when ``routing.json``
+exists. Specialists belong to the set they were trained from; a refreshed
+version (``ml.versioning``) serves globally until they are retrained.
+Running servers pick up new specialists on SIGHUP.
+
+Usage:
+    python -m ml.routing train labelled.csv --as-of 2024-06-01 [--min-rows 2000]
+    python -m ml.routing train --database-url sqlite:///predictions.db --as-of 2024-06-01
+    python -m ml.routing list
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+
+from core import metrics
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES_DIR = 'categories'
+ROUTING = 'routing.json'
+ENCODER = 'category_label_encoder.pkl'
+GLOBAL_ROUTE = 'global'
+MIN_ROWS = 2000
+STEP_ROWS = 10_000
+# Relative held-out RMSE cut a specialist must make to be worth a route
+MIN_GAIN = 0.01
+
+
+def slug(category: str) -> str:
+    """Directory name of a category ("Howto & Style" -> "howto-style")."""
+    return re.sub(r'[^a-z0-9]+', '-', category.lower()).strip('-')
+
+
+def encoder_classes(model_path: Optional[Path] = None) -> List[str]:
+    """Categories of the label encoder, sorted (its NaN class dropped).
+
+    Looked up next to the model set, then in MODEL_PATH (versions do not
+    copy the encoder).
+    """
+    for directory in (Path(model_path or settings.model_path), settings.model_path):
+        path = directory / ENCODER
+        if path.exists():
+            classes = joblib.load(path).classes_
+            return sorted(str(c) for c in classes if isinstance(c, str))
+    raise FileNotFoundError(f"{ENCODER} not found in {model_path} or {settings.model_path}")
+
+
+class CategoryEncoder:
+    """Label-encodes a batch of category names in one vectorized lookup."""
+
+    def __init__(self, classes: Sequence[str]):
+        self.classes = np.asarray(sorted(classes), dtype=str)
+
+    def encode(self, categories: Sequence[Any]) -> np.ndarray:
+        """Index of each category in ``classes``; -1 for unknown or missing."""
+        values = np.asarray(['' if c is None or c != c else str(c).strip() for c in categories],
+                            dtype=str)
+        if not len(self.classes) or not len(values):
+            return np.full(len(values), -1, dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.classes, values), len(self.classes) - 1)
+        return np.where(self.classes[index] == values, index, -1)
+
+
+def _groups(keys: np.ndarray) -> Iterator[Tuple[int, np.ndarray]]:
+    """(key, row indices) per distinct key, rows in input order."""
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    for start, stop in zip(starts, np.r_[starts[1:], len(keys)]):
+        yield int(ordered[start]), order[start:stop]
+
+
+class CategoryRouter:
+    """Routing policy for ``BatchPredictor(router=...)``."""
+
+    def __init__(self, encoder: CategoryEncoder, specialists: Dict[str, Any]):
+        self.encoder = encoder
+        self.specialists = dict(specialists)
+        self.labels = [GLOBAL_ROUTE] + [slug(name) for name in self.specialists]
+        self._scorers = [None] + list(self.specialists.values())
+        # Route of each encoder code, shifted by one so unknown (-1) is global
+        self._routes = np.zeros(len(encoder.classes) + 1, dtype=np.int64)
+        for route, name in enumerate(self.specialists, start=1):
+            code = int(encoder.encode([name])[0])
+            if code < 0:
+                raise ValueError(f"Specialist category {name!r} is not in the label encoder")
+            self._routes[code + 1] = route
+
+    @property
+    def tag(self) -> str:
+        """Part of the predictor version (cache keys differ from global scoring)."""
+        versions = json.dumps(sorted((name, p.version) for name, p in self.specialists.items()))
+        return f"cat-{hashlib.sha1(versions.encode()).hexdigest()[:8]}"
+
+    def route(self, categories: Sequence[Any]) -> np.ndarray:
+        """Route index per row: 0 for the global set, i for the i-th specialist."""
+        return self._routes[self.encoder.encode(categories) + 1]
+
+    def predict_matrix(self, predictor: Any, X: np.ndarray,
+                       categories: Sequence[Any]) -> Dict[str, np.ndarray]:
+        """Score each route's rows with one call and reassemble them in input order."""
+        routes = self.route(categories)
+        if not routes.any():
+            metrics.count_routed(GLOBAL_ROUTE, len(X))
+            return predictor.predict_matrix(X)
+        predictions = {name: np.empty(len(X), dtype=np.float64) for name in predictor.models}
+        for route, rows in _groups(routes):
+            scorer = self._scorers[route] or predictor
+            for name, views in scorer.predict_matrix(X[rows]).items():
+                predictions[name][rows] = views
+            metrics.count_routed(self.labels[route], len(rows))
+        return predictions
+
+    def explain(self, predictor: Any, X: np.ndarray, categories: Sequence[Any],
+                model: Optional[str], mode: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Attributions from the models that scored each row."""
+        base, phi = np.empty(len(X)), np.empty(X.shape)
+        for route, rows in _groups(self.route(categories)):
+            scorer = self._scorers[route] or predictor
+            base[rows], phi[rows] = scorer.explain(X[rows], model=model, mode=mode)
+        return base, phi
+
+
+def predict_routed(predictor: Any, X: np.ndarray, categories: Sequence[Any]) -> Dict[str, np.ndarray]:
+    """``predictor.predict_matrix(X)``, routed by category if the predictor has a router."""
+    if getattr(predictor, 'router', None) is None:
+        return predictor.predict_matrix(X)
+    return predictor.predict_matrix(X, categories)
+
+
+def categories_path(model_path: Optional[Path] = None) -> Path:
+    if model_path is None:
+        from ml.versioning import active_model_path
+        model_path = active_model_path()
+    return Path(model_path) / CATEGORIES_DIR
+
+
+def load_routing(model_path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """The stored ``routing.json`` of a model set, if there is one."""
+    path = categories_path(model_path) / ROUTING
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def load_router(model_path: Optional[Path] = None, feature_names: Optional[List[str]] = None,
+                model_names: Optional[List[str]] = None,
+                fuse_scaler: Optional[bool] = None) -> Optional[CategoryRouter]:
+    """Router over the specialists stored with a model set, or None without any.
+
+    Specialists whose features or models differ from the global set's are
+    skipped with a warning.
+    """
+    from ml.registry import ModelRegistry
+    routing = load_routing(model_path)
+    if not routing or not routing.get('specialists'):
+        return None
+    root = categories_path(model_path)
+    specialists = {}
+    for name, entry in routing['specialists'].items():
+        predictor = ModelRegistry(root / entry['path']).predictor(fuse_scaler=fuse_scaler, router=None)
+        if ((feature_names is not None and predictor.feature_names != list(feature_names))
+                or (model_names is not None and set(predictor.models) != set(model_names))):
+            logger.warning("Skipping %s specialist: it does not match the global models", name)
+            continue
+        specialists[name] = predictor
+    if not specialists:
+        return None
+    return CategoryRouter(CategoryEncoder(routing['classes']), specialists)
+
+
+# -- training ---------------------------------------------------------------
+
+def train(chunks: Iterable[Tuple[Dict[str, Any], np.ndarray]], model_path: Optional[Path] = None,
+          min_rows: int = MIN_ROWS, trees_per_step: int = 10, step_rows: int = STEP_ROWS,
+          holdout_every: int = 10, now: Optional[datetime] = None,
+          min_gain: float = MIN_GAIN) -> Dict[str, Any]:
+    """Warm-start one specialist per category and store the ones that help.
+
+    ``chunks`` are (video columns with ``category``, observed views).
+    Categories with fewer than ``min_rows`` labelled rows are skipped, and
+    a specialist is kept only if its headline model cuts the global
+    model's held-out RMSE on the category by at least ``min_gain``
+    (relative).
+    The stored specialists replace the previous ones of the set.
+    """
+    from ml.predictor import load_clean_models
+    from ml.versioning import IncrementalFit, improved, labelled_matrix, write_set
+
+    if model_path is None:
+        from ml.versioning import active_model_path
+        model_path = active_model_path()
+    source = Path(model_path)
+    models, scaler, feature_names, info = load_clean_models(source)
+    target_transformed = info.get('target_transformed', True)
+    encoder = CategoryEncoder(encoder_classes(source))
+
+    fits: Dict[int, IncrementalFit] = {}
+    rows = unknown = 0
+    for columns, views in chunks:
+        X, y, observed = labelled_matrix(columns, views, feature_names, scaler, target_transformed, now)
+        codes = encoder.encode(np.asarray(columns['category'], dtype=object)[observed])
+        for code, group in _groups(codes):
+            if code < 0:
+                unknown += len(group)
+                continue
+            fit = fits.get(code)
+            if fit is None:
+                fit = fits[code] = IncrementalFit(models, trees_per_step, holdout_every, step_rows)
+            fit.add(X[group], y[group])
+        rows += len(y)
+        logger.info("Routing: %d labelled rows read", rows)
+    if not rows:
+        raise ValueError("No rows with observed views to train on")
+
+    specialists, skipped, written = {}, {}, {}
+    for code, fit in sorted(fits.items()):
+        name = str(encoder.classes[code])
+        if fit.rows < min_rows:
+            skipped[name] = f"{fit.rows} rows (< {min_rows})"
+            continue
+        test_predictions, evaluation = fit.evaluate()
+        entry = {'path': slug(name), 'rows': fit.rows, 'holdout_rows': fit.holdout_rows,
+                 'evaluation': evaluation}
+        if not improved(evaluation, -min_gain):
+            skipped[name] = f"held-out RMSE not {min_gain:.0%} better than the global models"
+            continue
+        specialists[name] = entry
+        written[name] = (fit.models, test_predictions)
+
+    routing = {
+        'classes': encoder.classes.tolist(),
+        'base_version': info.get('version') or 'shipped',
+        'trained_at': datetime.utcnow().isoformat(),
+        'rows': rows,
+        'unknown_category_rows': unknown,
+        'specialists': specialists,
+        'skipped': skipped,
+    }
+    root = categories_path(source)
+    staging = root.parent / f'.{CATEGORIES_DIR}-{uuid.uuid4().hex}'
+    staging.mkdir()
+    try:
+        for name, (fitted, test_predictions) in written.items():
+            write_set(source, fitted, test_predictions,
+                      {**info, 'category': name, 'routing': specialists[name]},
+                      staging / specialists[name]['path'])
+        (staging / ROUTING).write_text(json.dumps(routing, indent=2))
+        _publish(staging, root)
+    finally:
+        if staging.exists():
+            shutil.rmtree(staging, ignore_errors=True)
+    return routing
+
+
+def _publish(staging: Path, root: Path) -> None:
+    retired = None
+    if root.exists():
+        retired = root.parent / f'.{CATEGORIES_DIR}-retired-{uuid.uuid4().hex}'
+        os.rename(root, retired)
+    os.rename(staging, root)
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+def main(argv=None):
+    """Command-line entry point: train and inspect category specialists."""
+    from ml.versioning import database_chunks, file_chunks
+
+    parser = argparse.ArgumentParser(description="Train per-category specialist models")
+    parser.add_argument('--model-path', type=Path, default=None,
+                        help="model set to route (default: the active version)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    tr = sub.add_parser('train', help="warm-start a specialist per category on observed views")
+    tr.add_argument('input', nargs='?', help="labelled CSV, JSON Lines or Parquet export with a category column")
+    tr.add_argument('--database-url', default=None,
+                    help="train on logged predictions with actual_views instead")
+    tr.add_argument('--since', type=date.fromisoformat, default=None, metavar='YYYY-MM-DD',
+                    help="only predictions logged since this day (with --database-url)")
+    tr.add_argument('--target', default='view_count', help="column with the observed views")
+    tr.add_argument('--format', choices=('csv', 'jsonl', 'parquet'), default=None)
+    tr.add_argument('--as-of', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                    required=True, metavar='YYYY-MM-DD', help="date the views were observed")
+    tr.add_argument('--chunk-size', type=int, default=50_000, help="rows read at a time")
+    tr.add_argument('--min-rows', type=int, default=MIN_ROWS,
+                    help="labelled rows a category needs for a specialist")
+    tr.add_argument('--trees-per-step', type=int, default=10)
+    tr.add_argument('--step-rows', type=int, default=STEP_ROWS,
+                    help="rows of one category per warm-start step")
+    sub.add_parser('list', help="show the stored specialists")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'list':
+        print(json.dumps(load_routing(args.model_path), indent=2))
+        return
+    options = dict(min_rows=args.min_rows, trees_per_step=args.trees_per_step,
+                   step_rows=args.step_rows, now=args.as_of)
+    if args.database_url:
+        from core.persistence import sink_from_url
+        database = sink_from_url(args.database_url)
+        try:
+            with database.connection() as conn:
+                routing = train(database_chunks(conn, args.chunk_size, args.since), args.model_path,
+                                **options)
+        finally:
+            database.close()
+    elif args.input:
+        routing = train(file_chunks(args.input, args.target, args.format, args.chunk_size, ['category']),
+                        args.model_path, **options)
+    else:
+        parser.error("train needs an input file or --database-url")
+    print(json.dumps(routing, indent=2))
+    print(f"✅ {len(routing['specialists'])} specialists; send SIGHUP to running servers to load them")
+
+
+if __name__ == '__main__':
+    main()
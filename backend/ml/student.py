@@ -0,0 +1,119 @@
+"""
+Runtime for distilled student models (see ``ml.distill``).
+
+A student is one small tree ensemble trained to mimic the clean ensemble,
+stored as a single ``.npz`` of a few hundred kilobytes:
+
+* inputs are raw features: splits do not care about a monotone scaling,
+  so the student is trained on unscaled features and needs no scaler
+* every split threshold is stored as the ``uint8`` index ``k`` of one of
+  the per-feature bin edges (``x <= edges[k]`` exactly when
+  ``bin(x) <= k``), so quantizing the thresholds loses nothing; at load
+  time the indices are expanded back to edge values for the traversal
+* leaf values are float16
+
+Scoring needs NumPy and ``utils.feature_engineering`` only: no pickles,
+scikit-learn, XGBoost or LightGBM, which keeps a sidecar's RSS small.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from ml.trees import traverse
+from utils.feature_engineering import build_feature_matrix
+
+STUDENT_FORMAT_VERSION = 1
+
+
+class StudentModel:
+    """Binned sum-of-trees regressor over raw feature matrices."""
+
+    def __init__(self, feature_names: Sequence[str], edges: List[np.ndarray], feature: np.ndarray,
+                 threshold: np.ndarray, child: np.ndarray, value: np.ndarray, roots: np.ndarray,
+                 base_score: float, max_depth: int, target_transformed: bool = True,
+                 name: str = 'student'):
+        self.feature_names = list(feature_names)
+        self.edges = edges
+        self.feature = feature
+        self.threshold = threshold  # bin index per node; leaves are never compared
+        self.child = child
+        self.value = value
+        self.roots = roots
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth)
+        self.target_transformed = bool(target_transformed)
+        self.name = name
+        # Traverse raw features against the edge values the indices point at
+        is_leaf = child == np.arange(len(child))
+        all_edges = np.concatenate(edges + [np.zeros(1)])
+        offsets = np.cumsum([0] + [len(e) for e in edges])
+        position = offsets[feature.astype(np.intp)] + threshold.astype(np.intp)
+        self._threshold = np.where(is_leaf, np.inf, all_edges[np.where(is_leaf, -1, position)])
+        self._feature = feature.astype(np.intp)
+        self._child = child.astype(np.intp)
+        self._value = value.astype(np.float64)
+        self._roots = roots.astype(np.intp)
+        self._nan_left = np.zeros(len(child), dtype=bool)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def bin(self, X: np.ndarray) -> np.ndarray:
+        """uint8 bin codes of a raw feature matrix (number of edges below each value)."""
+        X = np.asarray(X, dtype=np.float64)
+        codes = np.empty(X.shape, dtype=np.uint8)
+        for j, edges in enumerate(self.edges):
+            codes[:, j] = np.searchsorted(edges, X[:, j], side='left')
+        return codes
+
+    def predict_raw(self, X: np.ndarray) -> np.ndarray:
+        """Raw (transformed-target) output for a raw feature matrix."""
+        leaves = traverse(X, self._feature, self._threshold, self._child,
+                          self._nan_left, self._roots, self.max_depth)
+        return self.base_score + self._value.take(leaves).sum(axis=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predicted views for a raw feature matrix."""
+        raw = self.predict_raw(X)
+        if self.target_transformed:
+            raw = np.expm1(raw)
+        return np.maximum(raw, 0, out=raw)
+
+    def predict_views_batch(self, videos: Any, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """Predicted views for a batch of videos, as ``{name: views}``."""
+        X = build_feature_matrix(videos, self.feature_names, now=now or datetime.now())
+        return {self.name: self.predict(X)}
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the model as one compressed ``.npz``."""
+        offsets = np.cumsum([0] + [len(e) for e in self.edges])
+        np.savez_compressed(
+            path,
+            format_version=np.int64(STUDENT_FORMAT_VERSION),
+            feature_names=np.array(self.feature_names),
+            edges=np.concatenate(self.edges) if self.edges else np.empty(0),
+            edge_offsets=offsets.astype(np.int64),
+            feature=self.feature, threshold=self.threshold, child=self.child,
+            value=self.value, roots=self.roots,
+            base_score=np.float64(self.base_score), max_depth=np.int64(self.max_depth),
+            target_transformed=np.bool_(self.target_transformed), name=np.array(self.name),
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'StudentModel':
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['format_version']) != STUDENT_FORMAT_VERSION:
+                raise ValueError(f"{path}: unsupported student format {int(data['format_version'])}")
+            offsets = data['edge_offsets']
+            edges = [data['edges'][start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+            return cls(
+                feature_names=[str(name) for name in data['feature_names']], edges=edges,
+                feature=data['feature'], threshold=data['threshold'], child=data['child'],
+                value=data['value'], roots=data['roots'], base_score=float(data['base_score']),
+                max_depth=int(data['max_depth']), target_transformed=bool(data['target_transformed']),
+                name=str(data['name']),
+            )
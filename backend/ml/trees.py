@@ -0,0 +1,438 @@
+"""
+Flat-array tree ensembles.
+
+Every tree of an ensemble is stored in the same contiguous node arrays
+(``feature``, ``threshold``, ``left``, ``right``, ``value``, ``nan_left``,
+and ``cover``, the training weight that reached each node, which only
+``ml.explain`` reads).
+Leaves point back at themselves, so a batch is traversed level by level
+with a fixed number of vectorized gather steps and no per-row Python.
+
+Thresholds are rewritten at conversion time so that every model uses the
+same test, ``x <= threshold`` on float64 inputs, while reproducing the
+native library's own comparison:
+
+* sklearn:  ``float32(x) <= threshold``
+* XGBoost:  ``float32(x) <  split_condition`` (float32)
+* LightGBM: ``x <= threshold`` (float64)
+
+Conversion needs the native libraries; prediction only needs NumPy.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+NODE_ARRAYS = ('feature', 'threshold', 'child', 'value', 'nan_left', 'roots')
+# Node arrays older compiled sets and distilled students may lack
+OPTIONAL_ARRAYS = ('cover',)
+
+# Rows traversed together; larger blocks fall out of cache
+BLOCK_ROWS = 256
+
+# XGBoost objectives whose margin is the prediction itself
+_XGB_IDENTITY_OBJECTIVES = {'reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror'}
+
+
+def traverse(X: np.ndarray, feature: np.ndarray, threshold: np.ndarray, child: np.ndarray,
+              nan_left: np.ndarray, roots: np.ndarray, max_depth: int) -> np.ndarray:
+    """Leaf index reached by every row in every tree, shape (n_rows, n_trees).
+
+    Children of a node are adjacent (``child`` is the left one), so one
+    step is ``node = child[node] + go_right``. Leaves are their own child
+    with an infinite threshold and therefore never move. Rows are walked in
+    blocks so the (rows x trees) working set stays in cache.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    n_rows, n_features = X.shape
+    has_nan = bool(np.isnan(X).any())
+    leaves = np.empty((n_rows, len(roots)), dtype=np.intp)
+    for start in range(0, n_rows, BLOCK_ROWS):
+        block = X[start:start + BLOCK_ROWS]
+        flat = block.ravel()
+        row_offsets = np.repeat(np.arange(len(block), dtype=np.intp) * n_features, len(roots))
+        node = np.tile(roots, len(block))
+        for _ in range(max_depth):
+            x = flat.take(feature.take(node) + row_offsets)
+            if has_nan:
+                go_right = ~((x <= threshold.take(node)) | (np.isnan(x) & nan_left.take(node)))
+            else:
+                go_right = x > threshold.take(node)
+            node = child.take(node) + go_right
+        leaves[start:start + len(block)] = node.reshape(len(block), -1)
+    return leaves
+
+
+def _sum_leaves(leaf_values: np.ndarray, base_score: float, accumulate: str) -> np.ndarray:
+    if accumulate == 'float32':
+        # XGBoost sums leaves in float32, in tree order, starting from base_score
+        partial = leaf_values.astype(np.float32)
+        partial[:, 0] += np.float32(base_score)
+        return np.cumsum(partial, axis=1, dtype=np.float32)[:, -1].astype(np.float64)
+    return base_score + leaf_values.sum(axis=1)
+
+
+class TreeEnsemble:
+    """Sum-of-trees regressor over flat node arrays."""
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, child: np.ndarray,
+                 value: np.ndarray, nan_left: np.ndarray, roots: np.ndarray,
+                 base_score: float, max_depth: int, accumulate: str = 'float64',
+                 cover: Optional[np.ndarray] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.child = child
+        self.value = value
+        self.nan_left = nan_left
+        self.roots = roots
+        self.base_score = float(base_score)
+        self.max_depth = int(max_depth)
+        self.accumulate = accumulate
+        self.cover = cover
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index reached in every tree, shape (n_rows, n_trees)."""
+        return traverse(X, self.feature, self.threshold, self.child, self.nan_left,
+                        self.roots, self.max_depth)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Raw ensemble output (before any target transform)."""
+        return _sum_leaves(self.value.take(self.apply(X)), self.base_score, self.accumulate)
+
+    def fold_scaler(self, mean: np.ndarray, scale: np.ndarray) -> 'TreeEnsemble':
+        """Equivalent ensemble over unscaled inputs.
+
+        Every split ``(x - mean) / scale <= t`` becomes ``x <= t'``, with
+        ``t'`` chosen so the test agrees with the scaled one for every
+        float64 ``x`` (see ``unscaled_threshold``).
+        """
+        feature = np.asarray(self.feature)
+        threshold = np.asarray(self.threshold, dtype=np.float64)
+        folded = threshold.copy()
+        splits = np.isfinite(threshold)
+        mean = np.asarray(mean, dtype=np.float64)
+        scale = np.asarray(scale, dtype=np.float64)
+        folded[splits] = unscaled_threshold(threshold[splits], mean[feature[splits]], scale[feature[splits]])
+        return TreeEnsemble(self.feature, folded, self.child, self.value, self.nan_left, self.roots,
+                            self.base_score, self.max_depth, self.accumulate, self.cover)
+
+    def save(self, directory: Path) -> None:
+        """Write the node arrays as .npy files plus a small JSON header."""
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in NODE_ARRAYS + OPTIONAL_ARRAYS:
+            if getattr(self, name) is not None:
+                np.save(directory / f'{name}.npy', np.ascontiguousarray(getattr(self, name)))
+        header = {
+            'base_score': self.base_score,
+            'max_depth': self.max_depth,
+            'accumulate': self.accumulate,
+        }
+        (directory / 'tree_ensemble.json').write_text(json.dumps(header))
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: Optional[str] = 'r') -> 'TreeEnsemble':
+        """Load node arrays written by ``save``, memory-mapped by default."""
+        header = json.loads((directory / 'tree_ensemble.json').read_text())
+        arrays = {}
+        for name in NODE_ARRAYS:
+            # Plain ndarray views over the mapping skip np.memmap's per-index overhead
+            arrays[name] = np.load(directory / f'{name}.npy', mmap_mode=mmap_mode).view(np.ndarray)
+        for name in OPTIONAL_ARRAYS:
+            if (directory / f'{name}.npy').exists():
+                arrays[name] = np.load(directory / f'{name}.npy', mmap_mode=mmap_mode).view(np.ndarray)
+        return cls(**arrays, **header)
+
+
+class ForestStack:
+    """Several tree ensembles traversed together in one pass.
+
+    Scoring the clean models one after another repeats the per-level NumPy
+    overhead for every model, which dominates single-row latency. The stack
+    concatenates their node arrays once and splits the leaf values back
+    into per-model sums.
+    """
+
+    def __init__(self, ensembles: Dict[str, TreeEnsemble]):
+        self.names = list(ensembles)
+        members = list(ensembles.values())
+        node_offsets = np.cumsum([0] + [len(e.feature) for e in members[:-1]])
+        self.feature = np.concatenate([e.feature for e in members])
+        self.threshold = np.concatenate([e.threshold for e in members])
+        self.child = np.concatenate([e.child + offset for e, offset in zip(members, node_offsets)])
+        self.value = np.concatenate([np.asarray(e.value, dtype=np.float64) for e in members])
+        self.nan_left = np.concatenate([e.nan_left for e in members])
+        self.roots = np.concatenate([e.roots + offset for e, offset in zip(members, node_offsets)])
+        self.max_depth = max(e.max_depth for e in members)
+        tree_offsets = np.cumsum([0] + [e.n_trees for e in members])
+        self._segments = [(e.base_score, e.accumulate, start, stop)
+                          for e, start, stop in zip(members, tree_offsets[:-1], tree_offsets[1:])]
+
+    def predict(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """Raw output of every member ensemble."""
+        leaf_values = self.value.take(traverse(X, self.feature, self.threshold, self.child,
+                                          self.nan_left, self.roots, self.max_depth))
+        return {name: _sum_leaves(leaf_values[:, start:stop], base_score, accumulate)
+                for name, (base_score, accumulate, start, stop) in zip(self.names, self._segments)}
+
+
+def _ordered(x: np.ndarray) -> np.ndarray:
+    """float64 -> int64 keys with the same order (adjacent floats differ by 1)."""
+    bits = x.view(np.int64)
+    return np.where(bits < 0, -(bits & np.int64(0x7FFFFFFFFFFFFFFF)), bits)
+
+
+def _from_ordered(keys: np.ndarray) -> np.ndarray:
+    bits = np.where(keys < 0, (-keys) | np.int64(-0x8000000000000000), keys)
+    return bits.view(np.float64)
+
+
+def unscaled_threshold(threshold: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Largest float64 ``x`` with ``(x - mean) / scale <= threshold``, elementwise.
+
+    ``StandardScaler`` arithmetic is monotone in ``x``, so the inputs passing
+    a scaled split are exactly ``x <= t'``. The algebraic value
+    ``threshold * scale + mean`` can be off by many ulps (``x - mean``
+    rounds to the ulp of ``mean``), so ``t'`` is found by bisection over
+    the float64 values around it.
+    """
+    def passes(keys):
+        with np.errstate(over='ignore', invalid='ignore'):
+            return (_from_ordered(keys) - mean) / scale <= threshold
+
+    guess = _ordered(np.asarray(threshold * scale + mean, dtype=np.float64))
+    lo, hi = guess.copy(), guess.copy()
+    step = np.ones_like(guess)
+    # Bracket: passes(lo) and not passes(hi)
+    while True:
+        failing = ~passes(lo)
+        if not failing.any():
+            break
+        lo[failing] -= step[failing]
+        step[failing] *= 2
+    step[:] = 1
+    while True:
+        passing = passes(hi)
+        if not passing.any():
+            break
+        hi[passing] += step[passing]
+        step[passing] *= 2
+    while True:
+        open_ = hi - lo > 1
+        if not open_.any():
+            break
+        mid = lo + (hi - lo) // 2
+        ok = passes(mid)
+        lo = np.where(open_ & ok, mid, lo)
+        hi = np.where(open_ & ~ok, mid, hi)
+    return _from_ordered(lo)
+
+
+def float32_input_threshold(threshold: np.ndarray) -> np.ndarray:
+    """Float64 ``t'`` with ``x <= t'`` exactly when ``float32(x) <= threshold``."""
+    t = np.asarray(threshold, dtype=np.float64)
+    below = t.astype(np.float32)
+    # Largest float32 not above the threshold
+    below = np.where(below.astype(np.float64) > t, np.nextafter(below, np.float32(-np.inf)), below)
+    above = np.nextafter(below, np.float32(np.inf))
+    with np.errstate(over='ignore', invalid='ignore'):
+        midpoint = (below.astype(np.float64) + above.astype(np.float64)) / 2
+        # A tie at the midpoint rounds to even; keep it only if that is `below`
+        keep_tie = midpoint.astype(np.float32) == below
+    result = np.where(keep_tie, midpoint, np.nextafter(midpoint, -np.inf))
+    return np.where(np.isfinite(above), result, np.where(np.isinf(t), t, np.inf))
+
+
+def _adjacent_layout(tree: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """Renumber one tree breadth-first so that siblings are adjacent."""
+    left = np.asarray(tree['left'], dtype=np.int64)
+    right = np.asarray(tree['right'], dtype=np.int64)
+    order, new_id, queue = [], {0: 0}, [0]
+    while queue:
+        node = queue.pop(0)
+        order.append(node)
+        if left[node] >= 0:
+            new_id[left[node]] = len(new_id)
+            new_id[right[node]] = len(new_id)
+            queue.extend((left[node], right[node]))
+    order = np.asarray(order)
+    is_leaf = left[order] < 0
+    first_child = np.asarray([new_id[left[n]] if left[n] >= 0 else new_id[n] for n in order])
+    return {
+        'feature': np.where(is_leaf, 0, np.asarray(tree['feature'])[order]),
+        'threshold': np.where(is_leaf, np.inf, np.asarray(tree['threshold'], dtype=np.float64)[order]),
+        'child': first_child,
+        'value': np.asarray(tree['value'])[order],
+        # NaN must not move a row off a leaf either
+        'nan_left': np.where(is_leaf, True, np.asarray(tree['nan_left'], dtype=bool)[order]),
+        'cover': np.asarray(tree['cover'], dtype=np.float64)[order],
+        'size': len(order),
+    }
+
+
+def _concat_trees(trees: List[Dict[str, Any]], base_score: float, value_dtype: Any,
+                  accumulate: str = 'float64') -> TreeEnsemble:
+    """Lay out every tree with adjacent siblings and concatenate them."""
+    laid_out = [_adjacent_layout(tree) for tree in trees]
+    sizes = [tree['size'] for tree in laid_out]
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    return TreeEnsemble(
+        # Index arrays are stored as intp so ndarray.take never converts them
+        feature=np.concatenate([t['feature'] for t in laid_out]).astype(np.intp),
+        threshold=np.concatenate([t['threshold'] for t in laid_out]).astype(np.float64),
+        child=np.concatenate([t['child'] + offset for t, offset in zip(laid_out, offsets)]).astype(np.intp),
+        value=np.concatenate([t['value'] for t in laid_out]).astype(value_dtype),
+        nan_left=np.concatenate([t['nan_left'] for t in laid_out]),
+        roots=offsets.astype(np.intp),
+        base_score=base_score,
+        max_depth=max(t['depth'] for t in trees),
+        accumulate=accumulate,
+        cover=np.concatenate([t['cover'] for t in laid_out]),
+    )
+
+
+def _depth(left: np.ndarray, right: np.ndarray) -> int:
+    """Depth of a single tree rooted at node 0."""
+    deepest, stack = 0, [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        if left[node] >= 0:
+            stack.append((left[node], depth + 1))
+            stack.append((right[node], depth + 1))
+    return deepest
+
+
+def from_sklearn_gradient_boosting(model: Any) -> TreeEnsemble:
+    """Flatten a fitted sklearn GradientBoostingRegressor."""
+    base_score = float(np.ravel(model._raw_predict_init(np.zeros((1, model.n_features_in_))))[0])
+    trees = []
+    for estimator in model.estimators_[:, 0]:
+        tree = estimator.tree_
+        trees.append({
+            'feature': tree.feature,
+            'threshold': float32_input_threshold(tree.threshold),
+            'left': tree.children_left,
+            'right': tree.children_right,
+            'value': tree.value[:, 0, 0] * model.learning_rate,
+            'nan_left': np.zeros(tree.node_count, dtype=bool),
+            'cover': tree.weighted_n_node_samples,
+            'depth': tree.max_depth,
+        })
+    return _concat_trees(trees, base_score, np.float64)
+
+
+def from_xgboost(booster: Any) -> TreeEnsemble:
+    """Flatten a fitted XGBoost booster (or XGBRegressor)."""
+    if hasattr(booster, 'get_booster'):
+        booster = booster.get_booster()
+    learner = json.loads(booster.save_raw('json'))['learner']
+    objective = learner['objective']['name']
+    if objective not in _XGB_IDENTITY_OBJECTIVES:
+        raise ValueError(f"Unsupported XGBoost objective: {objective}")
+    gbtree = learner['gradient_booster']
+    if gbtree.get('name', 'gbtree') != 'gbtree':
+        raise ValueError(f"Unsupported XGBoost booster: {gbtree.get('name')}")
+
+    trees = []
+    for tree in gbtree['model']['trees']:
+        if any(tree['split_type']):
+            raise ValueError("Categorical XGBoost splits are not supported")
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        right = np.asarray(tree['right_children'], dtype=np.int64)
+        condition = np.asarray(tree['split_conditions'], dtype=np.float32)
+        is_leaf = left < 0
+        # x < c  <=>  x <= previous float32 before c
+        strict = np.nextafter(condition, np.float32(-np.inf)).astype(np.float64)
+        trees.append({
+            'feature': np.asarray(tree['split_indices'], dtype=np.int64),
+            'threshold': np.where(is_leaf, 0.0, float32_input_threshold(strict)),
+            'left': left,
+            'right': right,
+            'value': np.where(is_leaf, condition, np.float32(0)),
+            'nan_left': np.asarray(tree['default_left'], dtype=bool),
+            'cover': np.asarray(tree['sum_hessian'], dtype=np.float64),
+            'depth': _depth(left, right),
+        })
+    base_score = float(np.float32(learner['learner_model_param']['base_score'].strip('[]')))
+    return _concat_trees(trees, base_score, np.float32, accumulate='float32')
+
+
+def from_lightgbm(booster: Any) -> TreeEnsemble:
+    """Flatten a fitted LightGBM booster (or LGBMRegressor)."""
+    if hasattr(booster, 'booster_'):
+        booster = booster.booster_
+    dump = booster.dump_model()
+    if dump.get('average_output'):
+        raise ValueError("LightGBM random-forest mode is not supported")
+
+    trees = []
+    for info in dump['tree_info']:
+        nodes = []
+        stack = [(info['tree_structure'], -1, None)]
+        while stack:  # pre-order, so parents precede children
+            node, parent, side = stack.pop()
+            index = len(nodes)
+            nodes.append(node)
+            if parent >= 0:
+                nodes[parent][side] = index
+            if 'leaf_value' not in node:
+                node = dict(node)
+                nodes[index] = node
+                stack.append((node['right_child'], index, '_right'))
+                stack.append((node['left_child'], index, '_left'))
+        feature, threshold, left, right, value, nan_left, cover = [], [], [], [], [], [], []
+        for node in nodes:
+            if 'leaf_value' in node:
+                feature.append(0)
+                threshold.append(0.0)
+                left.append(-1)
+                right.append(-1)
+                value.append(node['leaf_value'])
+                nan_left.append(False)
+                cover.append(node.get('leaf_count', 0))
+                continue
+            if node['decision_type'] != '<=':
+                raise ValueError(f"Unsupported LightGBM split: {node['decision_type']}")
+            if node['missing_type'] == 'Zero':
+                raise ValueError("LightGBM zero-as-missing splits are not supported")
+            feature.append(node['split_feature'])
+            threshold.append(node['threshold'])
+            left.append(node['_left'])
+            right.append(node['_right'])
+            value.append(0.0)
+            cover.append(node['internal_count'])
+            # missing_type None routes NaN as if it were 0.0
+            nan_left.append(node['default_left'] if node['missing_type'] == 'NaN'
+                            else 0.0 <= node['threshold'])
+        left, right = np.asarray(left), np.asarray(right)
+        trees.append({
+            'feature': np.asarray(feature), 'threshold': np.asarray(threshold, dtype=np.float64),
+            'left': left, 'right': right, 'value': np.asarray(value, dtype=np.float64),
+            'nan_left': np.asarray(nan_left), 'cover': np.asarray(cover, dtype=np.float64),
+            'depth': _depth(left, right),
+        })
+    return _concat_trees(trees, 0.0, np.float64)
+
+
+def from_estimator(model: Any) -> TreeEnsemble:
+    """Flatten any supported fitted tree ensemble."""
+    kind = type(model).__name__
+    if kind == 'GradientBoostingRegressor':
+        return from_sklearn_gradient_boosting(model)
+    if hasattr(model, 'get_booster') or hasattr(model, 'save_raw'):
+        return from_xgboost(model)
+    if hasattr(model, 'booster_') or hasattr(model, 'dump_model'):
+        return from_lightgbm(model)
+    raise ValueError(f"Unsupported tree ensemble: {kind}")
+
+
+def describe(ensemble: TreeEnsemble) -> Dict[str, Any]:
+    """Summary used by the registry manifest."""
+    return {'n_trees': ensemble.n_trees, 'n_nodes': int(len(ensemble.feature)),
+            'max_depth': ensemble.max_depth}
@@ -0,0 +1,99 @@
+"""
+Upload-time optimizer.
+
+Expands one video across every hour x weekday slot (168, optionally times
+a set of months), writes the cyclical upload-time columns for all slots at
+once and scores the whole grid in a single batch.
+
+Note: the shipped clean models were trained on ``upload_date`` strings,
+which always parse to midnight, so ``upload_hour`` is constant in the
+training data and the hour axis is currently flat. The grid is still
+searched over hours so retrained models pick it up without changes.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ml.routing import predict_routed
+from utils.feature_engineering import (
+    OVERRIDE_GROUPS, assemble_matrix, compute_features, to_columns,
+)
+from utils.text_features import extended_features, optional_inputs
+
+HOURS = np.arange(24)
+WEEKDAYS = np.arange(7)
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Model used for ranking, as in test_clean_models.py
+RANKING_MODEL = 'gradient_boosting'
+
+
+def slot_grid(months: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+    """Hour, weekday (and month) for every slot, hour varying fastest."""
+    month_axis = np.asarray(months if months else [0], dtype=np.float64)
+    month, weekday, hour = np.meshgrid(month_axis, WEEKDAYS, HOURS, indexing='ij')
+    grid = {'upload_hour': hour.ravel().astype(np.float64),
+            'upload_day_of_week': weekday.ravel().astype(np.float64)}
+    if months:
+        grid['upload_month'] = month.ravel()
+    return grid
+
+
+def build_slot_matrix(video: Dict[str, Any], feature_names: Sequence[str],
+                      months: Optional[Sequence[int]] = None,
+                      now: Optional[datetime] = None) -> np.ndarray:
+    """Feature matrix with one row per upload slot of ``slot_grid``."""
+    grid = slot_grid(months)
+    n_slots = len(grid['upload_hour'])
+    columns = to_columns(video, optional=optional_inputs(feature_names))
+    base = assemble_matrix(compute_features(columns, now, feature_names), feature_names, 1)
+    X = np.repeat(base, n_slots, axis=0)
+
+    features = {}
+    for (field,), builder in OVERRIDE_GROUPS:
+        features.update(builder(grid[field]))
+    if 'upload_month' in grid:
+        features['upload_month'] = grid['upload_month']
+        features.update(extended_features(columns, features, ['upload_season']))
+    for j, name in enumerate(feature_names):
+        if name in features:
+            X[:, j] = features[name]
+    return X
+
+
+def optimize_upload_time(video: Dict[str, Any], predictor: Any = None, top_k: int = 5,
+                         months: Optional[Sequence[int]] = None, model: Optional[str] = None,
+                         now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Rank upload slots for a video by predicted views.
+
+    Returns the ``top_k`` best slots, each with the hour, weekday, month
+    (when ``months`` is given) and every model's predicted views.
+    """
+    if predictor is None:
+        from ml.predictor import get_predictor
+        predictor = get_predictor()
+    grid = slot_grid(months)
+    X = build_slot_matrix(video, predictor.feature_names, months, now)
+    predictions = predict_routed(predictor, X, [video.get('category')] * len(X))
+
+    model = model or (RANKING_MODEL if RANKING_MODEL in predictions else next(iter(predictions)))
+    scores = predictions[model]
+    # Stable sort keeps the earliest slot first among ties
+    order = np.argsort(-scores, kind='stable')[:top_k]
+
+    slots = []
+    for i in order:
+        weekday = int(grid['upload_day_of_week'][i])
+        slot = {
+            'upload_hour': int(grid['upload_hour'][i]),
+            'upload_day_of_week': weekday,
+            'weekday': WEEKDAY_NAMES[weekday],
+            'predicted_views': float(scores[i]),
+            'predictions': {name: float(views[i]) for name, views in predictions.items()},
+        }
+        if months:
+            slot['upload_month'] = int(grid['upload_month'][i])
+        slots.append(slot)
+    return slots
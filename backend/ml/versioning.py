@@ -0,0 +1,511 @@
+"""
+Versioned model sets, incremental refresh and hot-swapping.
+
+Refreshed model sets live next to the shipped pickles::
+
+    models/
+        clean_*.pkl, *_clean_model.pkl     the shipped set
+        versions/
+            CURRENT                        id of the active version
+            20240601T120000-3f9a1c/        same files as the shipped set
+                compiled/clean/            built by ModelRegistry on first use
+
+Without ``versions/CURRENT`` the shipped set is active. ``refresh``
+warm-starts the boosted models of the active set on newly observed
+views, chunk by chunk: each chunk adds a few trees to LightGBM, XGBoost
+and GradientBoosting (ridge has no incremental fit and is carried over).
+It then writes the result as a new version. ``activate`` repoints
+``CURRENT`` with an atomic rename.
+
+Running servers do not restart. ``ModelReloader`` polls ``CURRENT``
+(and reloads at once on SIGHUP), then loads, compiles and warms the new
+version on a worker thread. It swaps the new predictor in with one
+attribute assignment. Batches already scoring keep the predictor they
+started with, and nothing is reloaded per request.
+
+Usage:
+    python -m ml.versioning refresh observed.csv --as-of 2024-06-01 [--activate]
+    python -m ml.versioning refresh --database-url sqlite:///predictions.db --as-of 2024-06-01
+    python -m ml.versioning list
+    python -m ml.versioning activate 20240601T120000-3f9a1c
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from core import metrics
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR = 'versions'
+CURRENT = 'CURRENT'
+
+# Files of a clean set that a refresh copies unchanged
+_SHARED_FILES = ('clean_scaler.pkl', 'clean_feature_names.pkl')
+
+Chunk = Tuple[Dict[str, Any], np.ndarray]
+
+
+def versions_root(model_path: Optional[Path] = None) -> Path:
+    return Path(model_path or settings.model_path) / VERSIONS_DIR
+
+
+def current_version(model_path: Optional[Path] = None) -> Optional[str]:
+    """Id of the active version, or None while the shipped set is active."""
+    pointer = versions_root(model_path) / CURRENT
+    try:
+        version = pointer.read_text().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def active_model_path(model_path: Optional[Path] = None) -> Path:
+    """Directory of the active model set."""
+    root = Path(model_path or settings.model_path)
+    version = current_version(root)
+    if version is not None:
+        path = root / VERSIONS_DIR / version
+        if path.is_dir():
+            return path
+        logger.warning("Active model version %s is missing; using %s", version, root)
+    return root
+
+
+def list_versions(model_path: Optional[Path] = None) -> List[Dict[str, Any]]:
+    """Every stored version with its refresh metadata, oldest first."""
+    root = versions_root(model_path)
+    active = current_version(model_path)
+    versions = []
+    for path in sorted(root.iterdir()) if root.is_dir() else ():
+        info_path = path / 'clean_model_info.pkl'
+        if path.name.startswith('.') or not info_path.exists():
+            continue
+        with open(info_path, 'rb') as f:
+            info = pickle.load(f)
+        versions.append({'version': path.name, 'active': path.name == active,
+                         'parent_version': info.get('parent_version'),
+                         'refresh': info.get('refresh', {})})
+    return versions
+
+
+def activate(version: Optional[str], model_path: Optional[Path] = None) -> None:
+    """Point ``CURRENT`` at ``version`` (None: back to the shipped set)."""
+    root = versions_root(model_path)
+    if version is not None and not (root / version / 'clean_model_info.pkl').exists():
+        raise ValueError(f"Unknown model version: {version}")
+    root.mkdir(parents=True, exist_ok=True)
+    staging = root / f'.{CURRENT}-{uuid.uuid4().hex}'
+    staging.write_text(f"{version or ''}\n")
+    os.replace(staging, root / CURRENT)  # readers see the old or the new id, never a torn file
+    logger.info("Active model version: %s", version or 'shipped')
+
+
+# -- incremental training -------------------------------------------------
+
+def warm_start(model: Any, X: np.ndarray, y: np.ndarray, n_trees: int) -> Optional[Any]:
+    """A copy of ``model`` with ``n_trees`` more trees fitted on ``(X, y)``.
+
+    None for models without an incremental fit (ridge). ``model`` itself
+    is left unchanged.
+    """
+    kind = type(model).__name__
+    if kind == 'LGBMRegressor':
+        refreshed = type(model)(**{**model.get_params(), 'n_estimators': n_trees})
+        refreshed.fit(X, y, init_model=model.booster_)
+        return refreshed
+    if kind == 'XGBRegressor':
+        refreshed = type(model)(**{**model.get_params(), 'n_estimators': n_trees})
+        refreshed.fit(X, y, xgb_model=model.get_booster())
+        return refreshed
+    if kind == 'GradientBoostingRegressor':
+        refreshed = copy.deepcopy(model)
+        refreshed.set_params(warm_start=True, n_estimators=model.n_estimators_ + n_trees)
+        refreshed.fit(X, y)
+        return refreshed
+    return None
+
+
+def _rmse(predicted: np.ndarray, actual: np.ndarray) -> float:
+    return float(np.sqrt(np.mean((predicted - actual) ** 2))) if len(actual) else float('nan')
+
+
+def file_chunks(path: str, target: str = 'view_count', input_format: Optional[str] = None,
+                chunk_size: int = 50_000, keep: Iterable[str] = ()) -> Iterator[Chunk]:
+    """(video columns, observed views) chunks of a labelled export.
+
+    ``keep`` adds non-feature columns (``category``) to the video columns.
+    """
+    from ml.bulk import READERS, detect_format
+    for columns in READERS[input_format or detect_format(path)](path, chunk_size, [target, *keep]):
+        yield columns, np.asarray(columns[target], dtype=np.float64)
+
+
+def database_chunks(conn: Any, chunk_size: int = 50_000,
+                    since: Optional[date] = None) -> Iterator[Chunk]:
+    """Logged predictions with backfilled ``actual_views``, in id order."""
+    from core.rollups import fetch_all
+    last_id = ''
+    while True:
+        params: List[Any] = [last_id]
+        where = "actual_views IS NOT NULL AND id > ?"
+        if since is not None:
+            where += " AND created_at >= ?"
+            params.append(since.isoformat())
+        rows = fetch_all(conn, f"""
+            SELECT id, video_title, video_description, duration, like_count, dislike_count,
+                   upload_date, tags, COALESCE(category, ''), actual_views
+            FROM predictions WHERE {where} ORDER BY id LIMIT ?""", params + [chunk_size])
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        _, title, description, duration, likes, dislikes, uploaded, tags, category, actual = zip(*rows)
+        yield {
+            'title': [text or '' for text in title],
+            'description': [text or '' for text in description],
+            'duration': np.array(duration, dtype=np.float64),
+            'like_count': np.array([n or 0 for n in likes], dtype=np.float64),
+            'dislike_count': np.array([n or 0 for n in dislikes], dtype=np.float64),
+            'upload_date': [str(day)[:10] for day in uploaded],
+            'tags': [text or '' for text in tags],
+            'category': list(category),
+        }, np.array(actual, dtype=np.float64)
+
+
+def write_set(source: Path, models: Dict[str, Any], test_predictions: Dict[str, np.ndarray],
+              info: dict, destination: Path) -> None:
+    """Write a clean set: ``models`` plus the scaler and feature names of ``source``."""
+    destination.mkdir(parents=True)
+    for name in _SHARED_FILES:
+        shutil.copy2(source / name, destination / name)
+    with open(destination / 'clean_model_info.pkl', 'wb') as f:
+        pickle.dump(info, f)
+    for name, model in models.items():
+        with open(destination / f'{name}_clean_model.pkl', 'wb') as f:
+            pickle.dump({'model': model, 'y_test_pred': test_predictions[name]}, f)
+
+
+def _write_version(source: Path, models: Dict[str, Any], test_predictions: Dict[str, np.ndarray],
+                   info: dict, model_path: Optional[Path]) -> str:
+    root = versions_root(model_path)
+    root.mkdir(parents=True, exist_ok=True)
+    version = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    staging = root / f'.staging-{version}'
+    try:
+        write_set(source, models, test_predictions, {**info, 'version': version}, staging)
+        os.rename(staging, root / version)
+    finally:
+        if staging.exists():
+            shutil.rmtree(staging, ignore_errors=True)
+    return version
+
+
+class IncrementalFit:
+    """Warm-starts a model set on labelled rows, a step at a time.
+
+    Every ``holdout_every``-th row is held out for ``evaluate``. Rows are
+    buffered until ``step_rows`` are pending, so small inputs do not each
+    add ``trees_per_step`` trees.
+    """
+
+    def __init__(self, models: Dict[str, Any], trees_per_step: int = 10, holdout_every: int = 10,
+                 step_rows: int = 1):
+        self.base = models
+        self.models = dict(models)
+        self.trees_per_step = trees_per_step
+        self.holdout_every = holdout_every
+        self.step_rows = step_rows
+        self.added = {name: 0 for name in models}
+        self.rows = 0
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_rows = 0
+        self._held: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    def add(self, X: np.ndarray, y: np.ndarray) -> None:
+        """Add scaled features and transformed targets."""
+        held = np.arange(self.rows, self.rows + len(y)) % self.holdout_every == 0
+        self.rows += len(y)
+        self._held.append((X[held], y[held]))
+        if (~held).any():
+            self._pending.append((X[~held], y[~held]))
+            self._pending_rows += int((~held).sum())
+        if self._pending_rows >= self.step_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Fit the pending rows now."""
+        if not self._pending:
+            return
+        X = np.concatenate([X for X, _ in self._pending])
+        y = np.concatenate([y for _, y in self._pending])
+        self._pending, self._pending_rows = [], 0
+        for name, model in self.models.items():
+            model = warm_start(model, X, y, self.trees_per_step)
+            if model is not None:
+                self.models[name] = model
+                self.added[name] += self.trees_per_step
+
+    def evaluate(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Dict[str, float]]]:
+        """(held-out predictions, per-model RMSE before/after) after a final flush."""
+        self.flush()
+        X_held = np.concatenate([X for X, _ in self._held])
+        y_held = np.concatenate([y for _, y in self._held])
+        test_predictions = {name: model.predict(X_held) for name, model in self.models.items()}
+        evaluation = {name: {'rmse_before': _rmse(self.base[name].predict(X_held), y_held),
+                             'rmse_after': _rmse(test_predictions[name], y_held),
+                             'trees_added': self.added[name]}
+                      for name in self.models}
+        return test_predictions, evaluation
+
+    @property
+    def holdout_rows(self) -> int:
+        return sum(len(y) for _, y in self._held)
+
+
+def improved(evaluation: Dict[str, Dict[str, float]], tolerance: float = 0.0) -> bool:
+    """True unless the headline model got worse by more than ``tolerance`` (relative)."""
+    from ml.intervals import HEADLINE_MODEL
+    headline = evaluation.get(HEADLINE_MODEL)
+    return headline is None or headline['rmse_after'] <= headline['rmse_before'] * (1 + tolerance)
+
+
+def labelled_matrix(columns: Any, views: np.ndarray, feature_names: List[str],
+                    scaler: Any, target_transformed: bool,
+                    now: Optional[datetime]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(scaled features, training target, observed mask) of a labelled chunk.
+
+    ``columns`` are video columns, or an unscaled feature matrix already in
+    ``feature_names`` order (``ml.feature_store``). Rows without valid
+    observed views are dropped from the features and target; the mask says
+    which input rows were kept.
+    """
+    from utils.feature_engineering import build_feature_matrix
+    observed = np.isfinite(views) & (views >= 0)
+    if not isinstance(columns, np.ndarray):
+        columns = build_feature_matrix(columns, feature_names, now=now)
+    X = (columns[observed]
+         - np.asarray(scaler.mean_, dtype=np.float64)) / np.asarray(scaler.scale_, dtype=np.float64)
+    views = views[observed]
+    return X, np.log1p(views) if target_transformed else views, observed
+
+
+def refresh(chunks: Iterable[Chunk], model_path: Optional[Path] = None, trees_per_chunk: int = 10,
+            holdout_every: int = 10, now: Optional[datetime] = None, activate_if_better: bool = False,
+            tolerance: float = 0.0) -> Dict[str, Any]:
+    """Warm-start the active set on labelled chunks and store a new version.
+
+    Every ``holdout_every``-th row is held out. The report compares each
+    model's RMSE (log views) on those rows before and after. With
+    ``activate_if_better`` the version goes live unless the headline
+    model got worse by more than ``tolerance`` (relative).
+    """
+    from ml.intervals import HEADLINE_MODEL
+    from ml.predictor import load_clean_models
+
+    source = active_model_path(model_path)
+    models, scaler, feature_names, info = load_clean_models(source)
+    target_transformed = info.get('target_transformed', True)
+
+    fit = IncrementalFit(models, trees_per_chunk, holdout_every)
+    n_chunks = 0
+    for columns, views in chunks:
+        X, y, _ = labelled_matrix(columns, views, feature_names, scaler, target_transformed, now)
+        fit.add(X, y)
+        n_chunks += 1
+        logger.info("Refresh chunk %d: %d rows (%d total)", n_chunks, len(y), fit.rows)
+    if not fit.rows:
+        raise ValueError("No rows with observed views to refresh on")
+
+    test_predictions, evaluation = fit.evaluate()
+    parent = current_version(model_path)
+    report = {
+        'parent_version': parent,
+        'refreshed_at': datetime.utcnow().isoformat(),
+        'rows': fit.rows,
+        'holdout_rows': fit.holdout_rows,
+        'chunks': n_chunks,
+        'trees_per_chunk': trees_per_chunk,
+        'evaluation': evaluation,
+    }
+    version = _write_version(source, fit.models, test_predictions,
+                             {**info, 'parent_version': parent, 'refresh': report}, model_path)
+    report['version'] = version
+    report['activated'] = bool(activate_if_better and improved(evaluation, tolerance))
+    if report['activated']:
+        activate(version, model_path)
+    elif activate_if_better:
+        headline = evaluation[HEADLINE_MODEL]
+        logger.warning("Not activating %s: %s RMSE %.4f -> %.4f", version, HEADLINE_MODEL,
+                       headline['rmse_before'], headline['rmse_after'])
+    return report
+
+
+# -- hot swap -------------------------------------------------------------
+
+def warm_up(predictor: Any) -> None:
+    """Open every model and score one row, so the first request pays nothing."""
+    for name in predictor.models:
+        predictor.models[name]
+    predictor.predict_matrix(np.zeros((1, len(predictor.feature_names))))
+    router = getattr(predictor, 'router', None)
+    for specialist in router.specialists.values() if router is not None else ():
+        warm_up(specialist)
+
+
+class ModelReloader:
+    """Keeps ``target.predictor`` on the active model version.
+
+    ``target`` is the ``CachedPredictor`` the API scores through and
+    ``load(model_path)`` builds a predictor for a model directory. Loading
+    runs off the event loop; the swap itself is one attribute assignment,
+    so in-flight batches finish on the predictor they started with.
+    """
+
+    def __init__(self, target: Any, load: Callable[[Path], Any], model_path: Optional[Path] = None,
+                 interval: Optional[float] = None):
+        self.target = target
+        self.load = load
+        self.model_path = Path(model_path or settings.model_path)
+        self.interval = settings.model_watch_interval if interval is None else interval
+        self.loaded_version = current_version(self.model_path)
+        self.reloads = 0
+        self.failures = 0
+        self._failed_version: Optional[str] = None
+        self._force = False
+        self._lock = threading.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def check(self, force: bool = False) -> bool:
+        """Swap in the active version if it changed (or always with ``force``)."""
+        with self._lock:
+            version = current_version(self.model_path)
+            if not force and version in (self.loaded_version, self._failed_version):
+                return False
+            try:
+                predictor = self.load(active_model_path(self.model_path))
+                warm_up(predictor)
+            except Exception:
+                # Keep serving the loaded version; retry once CURRENT changes again
+                logger.exception("Could not load model version %s", version or 'shipped')
+                self._failed_version = version
+                self.failures += 1
+                metrics.count_model_reload('failed')
+                return False
+            self.target.predictor = predictor
+            self.loaded_version = version
+            self._failed_version = None
+            self.reloads += 1
+            metrics.count_model_reload('swapped')
+            logger.info("Swapped in model version %s (%s)", version or 'shipped', predictor.version)
+            return True
+
+    def trigger(self) -> None:
+        """Reload now, even if the version did not change (SIGHUP)."""
+        self._force = True
+        if self._wake is not None:
+            self._wake.set()
+
+    async def start(self) -> None:
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        timeout = self.interval if self.interval > 0 else None  # 0: only on SIGHUP
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            force, self._force = self._force, False
+            await loop.run_in_executor(None, self.check, force)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'loaded_version': self.loaded_version or 'shipped',
+                'reloads': self.reloads, 'failures': self.failures}
+
+
+def main(argv=None):
+    """Command-line entry point: refresh, list and activate model versions."""
+    parser = argparse.ArgumentParser(description="Refresh and switch ViralCast model versions")
+    parser.add_argument('--model-path', type=Path, default=None)
+    sub = parser.add_subparsers(dest='command', required=True)
+    ref = sub.add_parser('refresh', help="warm-start the active models on observed views")
+    ref.add_argument('input', nargs='?', help="labelled CSV, JSON Lines or Parquet export")
+    ref.add_argument('--database-url', default=None,
+                     help="train on logged predictions with actual_views instead")
+    ref.add_argument('--feature-store', type=Path, default=None,
+                     help="train on a feature store (ml.feature_store) with a --target column")
+    ref.add_argument('--since', type=date.fromisoformat, default=None, metavar='YYYY-MM-DD',
+                     help="only predictions logged since this day (with --database-url)")
+    ref.add_argument('--target', default='view_count', help="column with the observed views")
+    ref.add_argument('--format', choices=('csv', 'jsonl', 'parquet'), default=None)
+    ref.add_argument('--as-of', type=lambda value: datetime.strptime(value, '%Y-%m-%d'),
+                     required=True, metavar='YYYY-MM-DD', help="date the views were observed")
+    ref.add_argument('--chunk-size', type=int, default=50_000, help="rows per warm-start step")
+    ref.add_argument('--trees-per-chunk', type=int, default=10)
+    ref.add_argument('--activate', action='store_true',
+                     help="make the new version active unless it did worse on the held-out rows")
+    sub.add_parser('list', help="show stored versions")
+    act = sub.add_parser('activate', help="make a stored version active")
+    act.add_argument('version', help="version id, or 'shipped' for the original pickles")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'list':
+        print(json.dumps(list_versions(args.model_path), indent=2))
+    elif args.command == 'activate':
+        activate(None if args.version == 'shipped' else args.version, args.model_path)
+    elif args.database_url:
+        from core.persistence import sink_from_url
+        database = sink_from_url(args.database_url)
+        try:
+            with database.connection() as conn:
+                report = refresh(database_chunks(conn, args.chunk_size, args.since), args.model_path,
+                                 args.trees_per_chunk, now=args.as_of, activate_if_better=args.activate)
+        finally:
+            database.close()
+        print(json.dumps(report, indent=2))
+    elif args.feature_store:
+        from ml.feature_store import FeatureStore
+        store = FeatureStore(args.feature_store)
+        report = refresh(store.labelled_chunks(args.target, args.as_of, args.chunk_size),
+                         args.model_path, args.trees_per_chunk, now=args.as_of,
+                         activate_if_better=args.activate)
+        print(json.dumps(report, indent=2))
+    elif args.input:
+        report = refresh(file_chunks(args.input, args.target, args.format, args.chunk_size),
+                         args.model_path, args.trees_per_chunk, now=args.as_of,
+                         activate_if_better=args.activate)
+        print(json.dumps(report, indent=2))
+    else:
+        parser.error("refresh needs an input file, --database-url or --feature-store")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+What-if scoring: one base video, many single-field edits.
+
+Each edit only recomputes the derived features that depend on the fields
+it changes (``feature_dependencies``); every other column is copied from
+the base row. All variants are then scored with one ``predict_matrix``
+call, so a 50-variant sweep costs about as much as one prediction.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ml.routing import predict_routed
+from utils.feature_engineering import (
+    FEATURE_GROUPS, INPUT_FIELDS, OVERRIDE_GROUPS, compute_features, assemble_matrix, to_columns,
+)
+from utils.text_features import EXTENDED_FEATURE_NAMES, optional_inputs
+
+# Groups applied in order, so an upload_hour edit wins over the hour
+# implied by a changed upload_date
+WHAT_IF_GROUPS = FEATURE_GROUPS + OVERRIDE_GROUPS
+
+EDITABLE_FIELDS = list(INPUT_FIELDS) + [fields[0] for fields, _ in OVERRIDE_GROUPS]
+
+_PLACEHOLDER_VIDEO = {
+    'title': '', 'description': '', 'duration': 0, 'like_count': 0,
+    'dislike_count': 0, 'upload_date': '2000-01-01', 'tags': '',
+    'upload_hour': 0, 'upload_day_of_week': 0,
+}
+
+_dependencies: Optional[Dict[str, List[str]]] = None
+
+
+def feature_dependencies() -> Dict[str, List[str]]:
+    """Map each editable field to the derived features it affects.
+
+    e.g. ``'duration' -> ['duration', 'duration_minutes', 'log_duration']``
+    """
+    global _dependencies
+    if _dependencies is None:
+        dependencies = {}
+        for fields, builder in WHAT_IF_GROUPS:
+            args = [datetime(2000, 1, 2) if field == 'now' else [_PLACEHOLDER_VIDEO[field]]
+                    for field in fields]
+            outputs = list(builder(*args))
+            for field in fields:
+                if field != 'now':
+                    dependencies.setdefault(field, []).extend(outputs)
+        _dependencies = dependencies
+    return {field: list(outputs) for field, outputs in _dependencies.items()}
+
+
+def build_variant_matrix(video: Dict[str, Any], deltas: Sequence[Dict[str, Any]],
+                         feature_names: Sequence[str], now: Optional[datetime] = None) -> np.ndarray:
+    """Feature matrix with the base video in row 0 and one row per delta.
+
+    Each delta maps editable fields to their new values, e.g.
+    ``{'title': 'Longer title', 'tags': 'a,b,c'}``.
+    """
+    now = now or datetime.now()
+    for delta in deltas:
+        unknown = set(delta) - set(EDITABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot edit {sorted(unknown)}; editable fields: {EDITABLE_FIELDS}")
+
+    optional = optional_inputs(feature_names)
+    base = assemble_matrix(compute_features(to_columns(video, optional=optional), now, feature_names),
+                           feature_names, 1)
+    X = np.repeat(base, len(deltas) + 1, axis=0)
+    column = {name: j for j, name in enumerate(feature_names)}
+
+    for fields, builder in WHAT_IF_GROUPS:
+        edited = [i for i, delta in enumerate(deltas) if any(field in delta for field in fields)]
+        if not edited:
+            continue
+        args = []
+        for field in fields:
+            if field == 'now':
+                args.append(now)
+            else:
+                args.append([deltas[i].get(field, video.get(field)) for i in edited])
+        rows = np.asarray(edited) + 1
+        for name, values in builder(*args).items():
+            if name in column:
+                X[rows, column[name]] = values
+
+    extended = [name for name in feature_names if name in EXTENDED_FEATURE_NAMES]
+    if extended and deltas:
+        # Extended features combine several fields; recompute them per variant
+        variants = to_columns([{**video, **delta} for delta in deltas], optional=optional)
+        features = compute_features(variants, now, extended)
+        for name in extended:
+            X[1:, column[name]] = features[name]
+    return X
+
+
+def score_variants(video: Dict[str, Any], deltas: Sequence[Dict[str, Any]],
+                   predictor: Any = None, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """Predicted views for the base video (index 0) and each delta (1..n)."""
+    if predictor is None:
+        from ml.predictor import get_predictor
+        predictor = get_predictor()
+    X = build_variant_matrix(video, deltas, predictor.feature_names, now)
+    return predict_routed(predictor, X, [video.get('category')] * len(X))
+
+
+def compare_variants(video: Dict[str, Any], deltas: Sequence[Dict[str, Any]],
+                     predictor: Any = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Base prediction plus each variant's predictions and change vs. the base."""
+    predictions = score_variants(video, deltas, predictor, now)
+    base = {name: float(views[0]) for name, views in predictions.items()}
+    variants = []
+    for i, delta in enumerate(deltas, start=1):
+        views = {name: float(values[i]) for name, values in predictions.items()}
+        variants.append({
+            'changes': dict(delta),
+            'predictions': views,
+            'delta_views': {name: views[name] - base[name] for name in views},
+        })
+    return {'base': base, 'variants': variants}
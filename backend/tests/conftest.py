@@ -0,0 +1,67 @@
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REPO_DIR = BACKEND_DIR.parent
+for path in (BACKEND_DIR, REPO_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from ml.predictor import BatchPredictor  # noqa: E402
+
+# Frozen reference clock so days_since_upload is stable across runs
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+SAMPLE_VIDEOS = [
+    {
+        "title": "Complete Python Tutorial for Beginners - Learn Programming from Scratch",
+        "description": "A comprehensive guide to Python programming for absolute beginners, covering basics to advanced topics.",
+        "duration": 900,
+        "like_count": 1250,
+        "dislike_count": 45,
+        "upload_date": "2024-01-15",
+        "tags": "python,tutorial,programming,beginners,coding"
+    },
+    {
+        "title": "iPhone 15 Pro Max Review - Is It Worth $1200?",
+        "description": "An in-depth review of the new iPhone 15 Pro Max, focusing on camera, battery, and performance.",
+        "duration": 1200,
+        "like_count": 2500,
+        "dislike_count": 120,
+        "upload_date": "2024-01-10",
+        "tags": "iphone,review,tech,apple,smartphone"
+    },
+    {
+        "title": "Epic Gaming Montage - Best Plays of 2024",
+        "description": "Compilation of the most epic gaming moments and highlights from various games in 2024.",
+        "duration": 300,
+        "like_count": 5000,
+        "dislike_count": 200,
+        "upload_date": "2024-01-20",
+        "tags": "gaming,montage,epic,plays,highlights"
+    },
+    {
+        "title": "vlog",
+        "description": "",
+        "duration": 45,
+        "like_count": 0,
+        "dislike_count": 0,
+        "upload_date": "2024-06-01",
+        "tags": ""
+    },
+]
+
+
+@pytest.fixture(scope="session")
+def predictor():
+    """Batch predictor over the shipped clean models."""
+    return BatchPredictor.from_directory()
+
+
+@pytest.fixture
+def sample_videos():
+    """Copies of the sample videos from test_clean_models.py plus an edge case."""
+    return [dict(video) for video in SAMPLE_VIDEOS]
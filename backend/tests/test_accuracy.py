@@ -0,0 +1,133 @@
+import csv
+import sqlite3
+
+import numpy as np
+import pytest
+
+import cli
+from core.persistence import PREDICTION_COLUMNS, SQLiteSink
+from ml.accuracy import Checkpoint, ErrorSums, accuracy_scores, load_observed, match, run_backfill
+
+N_ROWS = 250
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "predictions.db"
+    sink = SQLiteSink(str(path))
+    rng = np.random.default_rng(0)
+    predictions, analytics = [], []
+    for i in range(N_ROWS):
+        row = dict.fromkeys(PREDICTION_COLUMNS)
+        views = int(rng.integers(100, 100000))
+        row.update(id=f"{i:08d}-pred", video_id=f"v{i}" if i % 10 else None, video_title="t",
+                   duration=60, upload_date="2024-01-01", category=["Education", "Gaming"][i % 2],
+                   predicted_views=views, prediction_quality="High",
+                   created_at="2024-06-01T12:00:00+00:00")
+        predictions.append(tuple(row[c] for c in PREDICTION_COLUMNS))
+        for name, factor in (("ridge", 0.5), ("gradient_boosting", 1.0)):
+            analytics.append((row["id"], f"{name}_views", views * factor, row["created_at"]))
+        analytics.append((row["id"], "processing_time", 0.01, row["created_at"]))
+    sink.write(predictions, analytics)
+    sink.close()
+    return path
+
+
+@pytest.fixture
+def observed(tmp_path, database):
+    with sqlite3.connect(database) as conn:
+        rows = conn.execute("SELECT video_id, predicted_views FROM predictions "
+                            "WHERE video_id IS NOT NULL").fetchall()
+    path = tmp_path / "observed.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["video_id", "view_count"])
+        writer.writerow(["v1", 1])  # superseded by the later row for v1
+        # Every third video observed at twice its prediction; v-unknown is not stored
+        writer.writerows((video, views * 2) for j, (video, views) in enumerate(rows) if j % 3 == 0)
+        writer.writerow(["v-unknown", 5])
+    return path
+
+
+def test_accuracy_and_error_sums():
+    np.testing.assert_allclose(accuracy_scores([100, 150, 500, 0], [100, 100, 100, 0]), [1, 0.5, 0, 1])
+    sums = ErrorSums()
+    sums.add(np.array(["a", "b", "a"]), np.array([100.0, 10.0, 300.0]), np.array([100.0, 10.0, 100.0]))
+    summary = sums.summary()
+    assert summary["a"]["rows"] == 2 and summary["b"]["mae_log"] == 0
+    assert summary["a"]["bias_log"] > 0  # over-predicted
+
+
+def test_observed_keys_dedupe_and_match(observed):
+    keys, views = load_observed(str(observed))
+    assert list(keys) == sorted(keys) and len(set(keys)) == len(keys)
+    found, matched = match(np.array(["v1", "nope", "v-unknown"]), (keys, views))
+    assert found.tolist() == [True, False, True]
+    assert matched[1] == 5 and matched[0] != 1
+
+
+def test_resumed_run_matches_single_pass(tmp_path, database, observed, monkeypatch):
+    save = Checkpoint.save
+
+    def crash_on_third_page(checkpoint, conn):
+        save(checkpoint, conn)
+        if checkpoint.counts["pages"] == 3:
+            raise KeyboardInterrupt  # after the page's UPDATE and checkpoint, before the commit
+
+    with sqlite3.connect(database) as conn:
+        partial = run_backfill(conn, str(observed), "nightly", page_size=40, max_pages=2)
+        assert partial["pages"] == 2 and partial["rows_seen"] == 80
+        monkeypatch.setattr(Checkpoint, "save", crash_on_third_page)
+        with pytest.raises(KeyboardInterrupt):
+            run_backfill(conn, str(observed), "nightly", page_size=40)
+        monkeypatch.setattr(Checkpoint, "save", save)
+        resumed = run_backfill(conn, str(observed), "nightly", page_size=40)
+        scores = dict(conn.execute("SELECT id, accuracy_score FROM predictions "
+                                   "WHERE accuracy_score IS NOT NULL").fetchall())
+        rollup = conn.execute("SELECT SUM(scored), SUM(accuracy_sum) FROM prediction_daily_rollup").fetchone()
+
+    fresh = tmp_path / "fresh.db"
+    with sqlite3.connect(database) as source, sqlite3.connect(fresh) as target:
+        source.backup(target)
+        target.execute("UPDATE predictions SET actual_views = NULL, accuracy_score = NULL")
+        target.commit()
+        single = run_backfill(target, str(observed), None, page_size=1000)
+
+    with_video = N_ROWS - N_ROWS // 10
+    assert resumed["rows_seen"] == single["rows_seen"] == with_video
+    assert resumed["rows_updated"] == single["rows_updated"] == len(scores)
+    assert resumed["rows_matched"] == single["rows_matched"] == len(scores)
+    for group in ("by_model", "by_category"):
+        assert resumed[group].keys() == single[group].keys()
+        for name, metrics in resumed[group].items():
+            assert metrics == pytest.approx(single[group][name])
+    assert set(resumed["by_model"]) == {"headline", "ridge", "gradient_boosting"}
+    # Observed at twice the prediction (v1's earlier row is superseded): accuracy 0.5
+    assert set(np.round(list(scores.values()), 6)) == {0.5}
+    assert resumed["by_model"]["ridge"]["mae_log"] > resumed["by_model"]["headline"]["mae_log"]
+    # The rollup triggers saw the feedback
+    assert rollup == (len(scores), pytest.approx(0.5 * len(scores)))
+
+
+def test_rerun_rewrites_nothing(tmp_path, database, observed):
+    with sqlite3.connect(database) as conn:
+        first = run_backfill(conn, str(observed), "a")
+        again = run_backfill(conn, str(observed), "a", restart=True)
+    assert first["rows_updated"] == first["rows_matched"] > 0
+    assert again["rows_updated"] == 0 and again["rows_matched"] == first["rows_matched"]
+
+
+def test_checkpoint_rejects_another_export(tmp_path, database, observed):
+    other = tmp_path / "other.csv"
+    other.write_text(observed.read_text())
+    with sqlite3.connect(database) as conn:
+        run_backfill(conn, str(observed), "c", max_pages=1, page_size=10)
+        with pytest.raises(ValueError):
+            run_backfill(conn, str(other), "c")
+
+
+def test_cli_backfill(tmp_path, database, observed, capsys):
+    report = tmp_path / "report.json"
+    assert cli.main(["backfill-accuracy", str(observed), "--database-url", f"sqlite:///{database}",
+                     "--checkpoint", "cli", "--report", str(report)]) == 0
+    assert '"by_category"' in report.read_text()
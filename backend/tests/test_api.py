@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def client(predictor, monkeypatch):
+    monkeypatch.setattr(main, "get_predictor", lambda: predictor)
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_predict_single_video(client, predictor, sample_videos):
+    video = sample_videos[0]
+    response = client.post("/api/v1/predict", json=video)
+    assert response.status_code == 200
+    body = response.json()
+    expected = predictor.predict_views_batch([video])
+    assert body["predicted_views"] == round(expected["gradient_boosting"][0])
+    assert set(body["model_predictions"]) == set(expected)
+    assert body["prediction_quality"] in {"High", "Medium", "Low", "Unverified"}
+
+
+def test_predict_batch_keeps_order(client, sample_videos):
+    videos = [{"video_id": f"v{i}", **video} for i, video in enumerate(sample_videos)]
+    response = client.post("/api/v1/predict/batch", json={"videos": videos})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total_videos"] == len(videos)
+    assert [p["video_id"] for p in body["predictions"]] == [v["video_id"] for v in videos]
+
+
+def test_invalid_upload_date_is_rejected(client, sample_videos):
+    response = client.post("/api/v1/predict", json={**sample_videos[0], "upload_date": "15/01/2024"})
+    assert response.status_code == 422
+
+
+def test_health_reports_batcher_metrics(client, sample_videos):
+    client.post("/api/v1/predict", json=sample_videos[0])
+    body = client.get("/api/v1/health").json()
+    assert body["status"] == "healthy"
+    assert body["metrics"]["batcher"]["requests"] >= 1
+    assert client.get("/api/v1/models/health").json()["models_loaded"] is True
+
+
+def test_success_factors_in_response(client, sample_videos):
+    body = client.post("/api/v1/predict", json=sample_videos[0]).json()
+    assert "✅ Educational keywords in title - great for long-term views" in body["key_factors"]
+    assert all(text.startswith("💡") for text in body["recommendations"])
+
+
+def test_metrics_endpoint(client, sample_videos):
+    pytest.importorskip("prometheus_client")
+    client.post("/api/v1/predict", json=sample_videos[0])
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "viralcast_batcher_queue_depth" in response.text
+    assert 'viralcast_stage_seconds_count{stage="success_factors"}' in response.text
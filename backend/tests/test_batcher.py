@@ -0,0 +1,53 @@
+import asyncio
+
+from core.batcher import MicroBatcher, QueueFullError
+
+
+def test_concurrent_requests_are_coalesced():
+    calls = []
+
+    def score_batch(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def scenario():
+        batcher = MicroBatcher(score_batch, max_batch_size=16, max_wait_ms=20)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(40)))
+        metrics = batcher.metrics()
+        await batcher.stop()
+        return results, metrics
+
+    results, metrics = asyncio.run(scenario())
+    assert results == [i * 2 for i in range(40)]
+    assert [len(batch) for batch in calls] == [16, 16, 8]
+    assert metrics["batches"] == 3 and metrics["queue_depth"] == 0
+
+
+def test_lone_request_waits_at_most_max_wait():
+    async def scenario():
+        batcher = MicroBatcher(lambda items: items, max_batch_size=64, max_wait_ms=5)
+        await batcher.start()
+        result = await asyncio.wait_for(batcher.submit("x"), timeout=1)
+        await batcher.stop()
+        return result
+
+    assert asyncio.run(scenario()) == "x"
+
+
+def test_full_queue_rejects_and_errors_fan_out():
+    def failing(items):
+        raise ValueError("model exploded")
+
+    async def scenario():
+        batcher = MicroBatcher(failing, max_batch_size=4, max_wait_ms=1, max_queue=2)
+        await batcher.start()
+        pending = [asyncio.ensure_future(batcher.submit(i)) for i in range(3)]
+        outcomes = await asyncio.gather(*pending, return_exceptions=True)
+        await batcher.stop()
+        return outcomes, batcher.stats.rejected
+
+    outcomes, rejected = asyncio.run(scenario())
+    assert rejected == 1
+    assert isinstance(outcomes[2], QueueFullError)
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes[:2])
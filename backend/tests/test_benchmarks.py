@@ -0,0 +1,38 @@
+import json
+
+import numpy as np
+
+from benchmarks import run
+from utils.feature_engineering import build_feature_matrix
+from utils.synthetic import generate_videos
+
+
+def test_synthetic_videos_are_valid_inputs():
+    videos = generate_videos(500, seed=1)
+    assert generate_videos(500, seed=1) == videos
+    X = build_feature_matrix(videos)
+    assert np.isfinite(X).all()
+    title_lengths = np.array([len(v["title"]) for v in videos])
+    assert 30 < np.median(title_lengths) < 80
+    assert any(v["description"] == "" for v in videos)
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    baseline = {"a": {"p50_ms": 1.0, "p99_ms": 2.0}, "b": {"rows_per_s": 1000.0}}
+    current = {"a": {"p50_ms": 1.1, "p99_ms": 3.0}, "b": {"rows_per_s": 700.0}, "new": {"p50_ms": 9.0}}
+    regressions = run.compare(current, baseline, tolerance=0.2)
+    assert {(r["benchmark"], r["metric"]) for r in regressions} == {("a", "p99_ms"), ("b", "rows_per_s")}
+
+
+def test_smoke_run_writes_results(tmp_path, monkeypatch):
+    output = tmp_path / "results.json"
+    baseline = tmp_path / "baseline.json"
+    args = ["--batch-sizes", "10", "--output", str(output), "--save-baseline", str(baseline)]
+    original = run.run_benchmarks
+    monkeypatch.setattr(run, "run_benchmarks", lambda quick, sizes, reference: original(
+        quick, sizes, reference, repeat=3, min_seconds=0.01))
+    assert run.main(args) == 0
+    report = json.loads(output.read_text())
+    assert "reference.end_to_end_single" in report["results"]
+    assert report["results"]["throughput.compiled.10"]["rows_per_s"] > 0
+    assert json.loads(baseline.read_text())["results"].keys() == report["results"].keys()
@@ -0,0 +1,138 @@
+import csv
+import io
+import json
+
+import numpy as np
+import pytest
+
+import cli
+from ml.bulk import Progress, read_csv, read_jsonl, score_file
+from ml.intervals import ConformalIntervals, calibrate
+from tests.conftest import NOW
+from tests.test_intervals import _with_intervals
+from utils.synthetic import generate_videos
+
+N_COPIES = 25
+
+
+@pytest.fixture
+def rows(sample_videos):
+    return [{"video_id": f"v{i}", **video}
+            for i, video in enumerate(sample_videos * N_COPIES)]
+
+
+@pytest.fixture
+def csv_path(tmp_path, rows):
+    path = tmp_path / "videos.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+@pytest.fixture
+def jsonl_path(tmp_path, rows):
+    path = tmp_path / "videos.jsonl"
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    return path
+
+
+def _expected(predictor, rows):
+    return predictor.predict_views_batch(rows, now=NOW)
+
+
+def test_readers_stream_fixed_size_chunks(csv_path, jsonl_path, rows):
+    for reader, path in ((read_csv, csv_path), (read_jsonl, jsonl_path)):
+        sizes = [len(chunk["title"]) for chunk in reader(str(path), 30)]
+        assert sizes[:-1] == [30] * (len(sizes) - 1)
+        assert sum(sizes) == len(rows)
+
+
+def test_csv_scoring_matches_batch_predictor(predictor, csv_path, tmp_path, rows):
+    out = tmp_path / "scored.csv"
+    n = score_file(str(csv_path), str(out), predictor, chunk_size=7, keep=["video_id"],
+                   now=NOW, progress=Progress(io.StringIO()))
+    assert n == len(rows)
+    with open(out) as f:
+        scored = list(csv.DictReader(f))
+    assert [row["video_id"] for row in scored] == [row["video_id"] for row in rows]
+    for name, views in _expected(predictor, rows).items():
+        got = np.array([float(row[f"{name}_views"]) for row in scored])
+        np.testing.assert_allclose(got, np.round(views, 2))
+
+
+def test_cli_jsonl_to_parquet(predictor, jsonl_path, tmp_path, rows, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr("ml.predictor.get_predictor", lambda: predictor)
+    out = tmp_path / "scored.parquet"
+    assert cli.main(["score", str(jsonl_path), "-o", str(out), "--keep", "video_id",
+                     "--chunk-size", "10", "--as-of", NOW.strftime("%Y-%m-%d")]) == 0
+    table = pq.read_table(out)
+    assert table.column("video_id").to_pylist() == [row["video_id"] for row in rows]
+    for name, views in _expected(predictor, rows).items():
+        np.testing.assert_allclose(table.column(f"{name}_views").to_numpy(), np.round(views, 2))
+
+
+def test_cli_processes_keeps_interval_columns(predictor, csv_path, tmp_path, rows, monkeypatch):
+    predictions = predictor.predict_views_batch(generate_videos(2000, seed=3), now=NOW)
+    noise = np.random.default_rng(0).normal(0, 0.3, len(predictions["gradient_boosting"]))
+    y = np.expm1(np.log1p(predictions["gradient_boosting"]) + noise)
+    scorer = _with_intervals(predictor, ConformalIntervals(calibrate(y, predictions)))
+    monkeypatch.setattr("ml.predictor.get_predictor", lambda: scorer)
+    monkeypatch.setattr("ml.parallel.MIN_SHARD_ROWS", 16)  # small enough to use the pool
+    out = tmp_path / "scored.csv"
+    assert cli.main(["score", str(csv_path), "-o", str(out), "--processes", "2",
+                     "--as-of", NOW.strftime("%Y-%m-%d")]) == 0
+    with open(out, newline="") as f:
+        scored = list(csv.DictReader(f))
+    expected = _expected(predictor, rows)["gradient_boosting"]
+    lower = np.array([float(row["views_lower"]) for row in scored])
+    upper = np.array([float(row["views_upper"]) for row in scored])
+    assert len(scored) == len(rows)
+    assert np.all(lower <= np.round(expected, 2)) and np.all(np.round(expected, 2) <= upper)
+
+
+def test_parquet_input_with_date_column(predictor, tmp_path, rows):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    columns = {key: [row[key] for row in rows] for key in rows[0]}
+    columns["upload_date"] = pa.array(np.array(columns["upload_date"], dtype="datetime64[D]"))
+    columns["tags"][0] = None
+    source = tmp_path / "videos.parquet"
+    pq.write_table(pa.table(columns), source, row_group_size=16)
+
+    out = tmp_path / "scored.jsonl"
+    score_file(str(source), str(out), predictor, chunk_size=16, now=NOW,
+               progress=Progress(io.StringIO()))
+    scored = [json.loads(line) for line in out.read_text().splitlines()]
+    rows[0] = {**rows[0], "tags": ""}
+    expected = _expected(predictor, rows)
+    np.testing.assert_allclose([row["ridge_views"] for row in scored], np.round(expected["ridge"], 2))
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_rows_without_upload_date_are_rejected(predictor, tmp_path, rows, fmt):
+    rows[3]["upload_date"] = ""
+    rows[8]["upload_date"] = "soon"
+    del rows[11]["upload_date"]
+    source = tmp_path / f"videos.{fmt}"
+    with open(source, "w", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            f.write("".join(json.dumps(row) + "\n" for row in rows))
+
+    out, stream = tmp_path / "scored.csv", io.StringIO()
+    n = score_file(str(source), str(out), predictor, chunk_size=7, keep=["video_id"], now=NOW,
+                   progress=Progress(stream))
+    assert n == len(rows) - 3
+    assert "3 rejected (missing or invalid upload_date)" in stream.getvalue()
+    with open(out) as f:
+        scored = list(csv.DictReader(f))
+    dated = [row for i, row in enumerate(rows) if i not in (3, 8, 11)]
+    assert [row["video_id"] for row in scored] == [row["video_id"] for row in dated]
+    got = np.array([float(row["gradient_boosting_views"]) for row in scored])
+    np.testing.assert_allclose(got, np.round(_expected(predictor, dated)["gradient_boosting"], 2))
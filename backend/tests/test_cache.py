@@ -0,0 +1,142 @@
+import json
+from datetime import date
+
+import numpy as np
+
+from ml.cache import CachedPredictor, LRUCache, RedisCache, TieredCache, canonical_key
+from tests.conftest import NOW
+from tests.test_parallel import _comment_predictor
+
+
+class CountingPredictor:
+    """Delegates to the real predictor and records how many rows it built."""
+
+    def __init__(self, predictor):
+        self.inner = predictor
+        self.models = predictor.models
+        self.feature_names = predictor.feature_names
+        self.version = predictor.version
+        self.rows_built = 0
+
+    def build_features(self, videos, now):
+        self.rows_built += len(videos)
+        return self.inner.build_features(videos, now)
+
+    def predict_matrix(self, X):
+        return self.inner.predict_matrix(X)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def setex(self, key, ttl, value):
+        self.store[key] = value.encode()
+
+    def execute(self):
+        pass
+
+
+def test_canonical_key_ignores_irrelevant_differences(sample_videos):
+    video = sample_videos[0]
+    key = canonical_key(video, NOW.date(), "v1")
+    shuffled = dict(reversed(list(video.items())))
+    shuffled["channel_id"] = "UC123"
+    shuffled["like_count"] = float(video["like_count"])
+    shuffled["duration"] = np.int64(video["duration"])
+    assert canonical_key(shuffled, NOW.date(), "v1") == key
+    assert canonical_key(video, date(2024, 6, 2), "v1") != key
+    assert canonical_key(video, NOW.date(), "v2") != key
+    assert canonical_key({**video, "title": video["title"] + "!"}, NOW.date(), "v1") != key
+
+
+def test_lru_evicts_oldest_and_expires():
+    clock = [0.0]
+    cache = LRUCache(max_entries=2, ttl=10, clock=lambda: clock[0])
+    entry = (np.zeros(1), {"ridge": 1.0})
+    cache.set_many({"a": entry, "b": entry})
+    cache.get_many(["a"])
+    cache.set_many({"c": entry})
+    assert cache.get_many(["a", "b", "c"])[1] is None
+    assert cache.stats.evictions == 1
+    clock[0] = 11
+    assert cache.get_many(["a", "c"]) == [None, None]
+    assert len(cache) == 0
+
+
+def test_hits_skip_feature_engineering(predictor, sample_videos):
+    counting = CountingPredictor(predictor)
+    cached = CachedPredictor(counting, TieredCache(LRUCache(max_entries=100)))
+    first = cached.predict_views_batch(sample_videos * 2, now=NOW)
+    assert counting.rows_built == len(sample_videos)
+    second = cached.predict_views_batch(sample_videos, now=NOW)
+    assert counting.rows_built == len(sample_videos)
+
+    expected = predictor.predict_views_batch(sample_videos, now=NOW)
+    for name in expected:
+        np.testing.assert_allclose(first[name], np.tile(expected[name], 2), rtol=1e-12)
+        np.testing.assert_allclose(second[name], expected[name], rtol=1e-12)
+
+
+def test_optional_inputs_are_part_of_the_key(predictor, sample_videos):
+    videos = [{**sample_videos[0], "comment_count": 5}, {**sample_videos[0], "comment_count": 5000}]
+    training = [{**video, "comment_count": 37 * i} for i, video in enumerate(sample_videos * 10)]
+    uses_comments = _comment_predictor(predictor, training, seed=0)
+    cached = CachedPredictor(uses_comments, cache=LRUCache(100, 60))
+    for _ in range(2):
+        views = cached.predict_views_batch(videos, now=NOW)["ridge"]
+        np.testing.assert_array_equal(views, uses_comments.predict_views_batch(videos, now=NOW)["ridge"])
+    assert views[0] != views[1]
+
+
+def test_redis_tier_is_shared_between_workers(predictor, sample_videos):
+    redis = FakeRedis()
+    worker_a = CachedPredictor(CountingPredictor(predictor),
+                               TieredCache(LRUCache(max_entries=100), RedisCache(client=redis)))
+    counting = CountingPredictor(predictor)
+    worker_b = CachedPredictor(counting,
+                               TieredCache(LRUCache(max_entries=100), RedisCache(client=redis)))
+
+    X_a, views_a = worker_a.predict_with_features(sample_videos, now=NOW)
+    X_b, views_b = worker_b.predict_with_features(sample_videos, now=NOW)
+    assert counting.rows_built == 0
+    np.testing.assert_array_equal(X_a, X_b)
+    assert json.loads(next(iter(redis.store.values())))["predictions"]
+    for name in views_a:
+        np.testing.assert_array_equal(views_a[name], views_b[name])
+
+
+def test_redis_outage_falls_back_to_scoring(predictor, sample_videos):
+    class BrokenRedis(FakeRedis):
+        def mget(self, keys):
+            raise ConnectionError("down")
+
+    counting = CountingPredictor(predictor)
+    cached = CachedPredictor(counting, TieredCache(LRUCache(), RedisCache(client=BrokenRedis())))
+    cached.predict_views_batch(sample_videos, now=NOW)
+    assert counting.rows_built == len(sample_videos)
+
+
+def test_corrupt_redis_entries_count_as_misses(predictor, sample_videos):
+    redis = FakeRedis()
+    warm = CachedPredictor(CountingPredictor(predictor),
+                           TieredCache(LRUCache(), RedisCache(client=redis)))
+    expected = warm.predict_views_batch(sample_videos, now=NOW)
+    keys = list(redis.store)
+    redis.store[keys[0]] = b"{not json"
+    redis.store[keys[1]] = json.dumps({"predictions": {}}).encode()
+
+    shared = RedisCache(client=redis)
+    counting = CountingPredictor(predictor)
+    cached = CachedPredictor(counting, TieredCache(LRUCache(), shared))
+    views = cached.predict_views_batch(sample_videos, now=NOW)
+    assert counting.rows_built == 2
+    assert (shared.stats.hits, shared.stats.misses) == (len(sample_videos) - 2, 2)
+    for name in expected:
+        np.testing.assert_array_equal(views[name], expected[name])
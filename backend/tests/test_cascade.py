@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+import pytest
+
+from api.predictions import _prediction_quality, score_videos
+from ml.cascade import Cascade, calibrate, calibrate_directory
+from ml.predictor import BatchPredictor
+from tests.conftest import NOW
+from utils.success_factors import FactorCode, evaluate, feature_columns
+from utils.synthetic import generate_videos
+
+
+@pytest.fixture(scope="module")
+def calibration():
+    return calibrate_directory()
+
+
+def _with_cascade(predictor, cascade):
+    return BatchPredictor(predictor.models, predictor.scaler, predictor.feature_names,
+                          predictor.model_info, cascade=cascade)
+
+
+def test_calibration_bins_held_out_rows(calibration):
+    assert calibration["cheap"] == "ridge"
+    assert len(calibration["edges"]) == len(calibration["error"]) + 1
+    assert np.all(np.diff(calibration["edges"]) > 0)
+    assert sum(calibration["counts"]) == 9988
+    cascade = Cascade(calibration, tolerance=0)
+    rates = [cascade.escalation_rate(t) for t in (0, 2, 2.5, 3, math.inf)]
+    assert rates[0] == 1.0 and rates[-1] == 0.0
+    assert rates == sorted(rates, reverse=True)
+
+
+def test_default_tolerance_is_an_accuracy_target(calibration):
+    cascade = Cascade(calibration)
+    tradeoff = cascade.tradeoff()
+    # Ridge misses the default target in every bin: nothing is answered by ridge alone
+    assert tradeoff["escalated"] == 1.0 and tradeoff["cheap_error"] == 0.0
+    loose = cascade.tradeoff(2.5)
+    assert 0 < loose["escalated"] < 1
+    assert loose["cheap_error"] <= 2.5 and loose["cheap_factor"] > 5
+
+
+def test_risk_is_infinite_outside_calibrated_range():
+    calibration = calibrate({"ridge": np.arange(100.0), "gradient_boosting": np.arange(100.0) * 1.1},
+                            n_bins=4)
+    cascade = Cascade(calibration, tolerance=10)
+    risk = cascade.risk(np.array([-1.0, 0.0, 50.0, 99.0, 120.0, np.nan]))
+    assert np.isinf(risk[[0, 4, 5]]).all()
+    assert np.isfinite(risk[1:4]).all()
+    assert risk[1] < risk[3]  # disagreement grows with the prediction
+
+
+def test_escalated_rows_match_full_scoring(predictor, calibration):
+    videos = generate_videos(400, seed=3)
+    full = predictor.predict_views_batch(videos, now=NOW)
+    cascade = _with_cascade(predictor, Cascade(calibration, tolerance=2.5))
+    scored = cascade.predict_views_batch(videos, now=NOW)
+
+    np.testing.assert_allclose(scored["ridge"], full["ridge"])
+    escalated = ~np.isnan(scored["gradient_boosting"])
+    assert 0 < escalated.sum() < len(videos)
+    for name in ("gradient_boosting", "xgboost", "lightgbm"):
+        assert np.array_equal(~np.isnan(scored[name]), escalated)
+        np.testing.assert_allclose(scored[name][escalated], full[name][escalated], rtol=1e-9)
+
+
+def test_zero_tolerance_escalates_everything(predictor, calibration, sample_videos):
+    cascade = _with_cascade(predictor, Cascade(calibration, tolerance=0))
+    scored = cascade.predict_views_batch(sample_videos, now=NOW)
+    full = predictor.predict_views_batch(sample_videos, now=NOW)
+    for name in full:
+        np.testing.assert_allclose(scored[name], full[name], rtol=1e-9)
+
+
+def test_budget_caps_escalations_per_batch(predictor, calibration):
+    cascade = Cascade(calibration, budget=0.1)
+    assert cascade.escalation_rate() <= 0.1
+    risk = np.linspace(0, 10, 50)
+    escalated = cascade.select(risk)
+    assert escalated.sum() <= 5
+    assert escalated[-1]  # riskiest rows first
+
+    scored = _with_cascade(predictor, cascade).predict_views_batch(generate_videos(200, seed=5), now=NOW)
+    assert (~np.isnan(scored["gradient_boosting"])).sum() <= 20
+    with pytest.raises(ValueError):
+        Cascade(calibration, budget=1.5)
+
+
+def test_versions_differ_per_policy(predictor, calibration):
+    tolerance = _with_cascade(predictor, Cascade(calibration, tolerance=2.5))
+    budget = _with_cascade(predictor, Cascade(calibration, budget=0.2))
+    assert len({predictor.version, tolerance.version, budget.version}) == 3
+
+
+def test_cheap_rows_report_single_model(predictor, calibration, sample_videos):
+    cascade = _with_cascade(predictor, Cascade(calibration, tolerance=math.inf))
+    results = score_videos(cascade, sample_videos)
+    for predictions, codes, interval, _ in results:
+        assert list(predictions) == ["ridge"]
+        assert _prediction_quality(predictions) == "Unverified"
+
+    X, predictions = cascade.predict_with_features(sample_videos, now=NOW)
+    codes = evaluate(feature_columns(X, cascade.feature_names),
+                     [video["title"] for video in sample_videos], predictions)
+    assert FactorCode.AGREEMENT_MIXED in codes
+    assert FactorCode.AGREEMENT_HIGH not in codes
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from ml.distill import fit_student, quantize, report, teacher_dataset
+from ml.student import StudentModel
+from tests.conftest import NOW
+from utils.synthetic import generate_columns
+
+SMALL = {"n_estimators": 20}
+
+
+@pytest.fixture(scope="module")
+def dataset(predictor):
+    return teacher_dataset(predictor, 5000, seed=0)
+
+
+@pytest.fixture(scope="module")
+def ensemble(dataset):
+    return fit_student(*dataset, **SMALL)
+
+
+def test_bin_index_thresholds_are_exact(predictor, dataset, ensemble):
+    X, _ = dataset
+    student = quantize(ensemble, predictor.feature_names, leaf_dtype=np.float64)
+    assert student.threshold.dtype == np.uint8 and student.feature.dtype == np.uint8
+    assert all(len(edges) <= 255 for edges in student.edges)
+    np.testing.assert_array_equal(student.predict_raw(X), ensemble.predict(X))
+
+
+def test_bin_codes_route_like_thresholds(predictor, dataset, ensemble):
+    X, _ = dataset
+    student = quantize(ensemble, predictor.feature_names)
+    codes = student.bin(X)
+    splits = student.child != np.arange(len(student.child))
+    node = np.flatnonzero(splits)[0]
+    j, k = student.feature[node], student.threshold[node]
+    assert np.array_equal(codes[:, j] <= k, X[:, j] <= student.edges[j][k])
+
+
+def test_float16_student_tracks_teacher(predictor, dataset, ensemble):
+    X, y = dataset
+    exact = quantize(ensemble, predictor.feature_names, leaf_dtype=np.float64)
+    student = quantize(ensemble, predictor.feature_names)
+    assert student.value.dtype == np.float16
+    np.testing.assert_allclose(student.predict_raw(X), exact.predict_raw(X), atol=0.01)
+    assert np.sqrt(np.mean((student.predict_raw(X) - y) ** 2)) < 0.2
+
+
+def test_save_load_round_trip(tmp_path, predictor, ensemble, sample_videos):
+    student = quantize(ensemble, predictor.feature_names)
+    path = tmp_path / "student.npz"
+    student.save(path)
+    loaded = StudentModel.load(path)
+    scored = loaded.predict_views_batch(sample_videos, now=NOW)
+    np.testing.assert_array_equal(scored["student"],
+                                  student.predict_views_batch(sample_videos, now=NOW)["student"])
+    assert (scored["student"] >= 0).all()
+    # The edge-case video (no likes, uploaded today) is outside the synthetic data
+    full = predictor.predict_views_batch(sample_videos, now=NOW)["gradient_boosting"]
+    assert np.all(np.abs(np.log1p(scored["student"][:3]) - np.log1p(full[:3])) < 0.5)
+
+
+def test_report_compares_against_originals(predictor, ensemble):
+    summary = report(quantize(ensemble, predictor.feature_names), predictor,
+                     n_rows=500, repeat=5, min_seconds=0.01)
+    assert set(summary["models"]) == set(predictor.models) | {"student"}
+    assert summary["models"]["gradient_boosting"]["rmse_raw"] == 0
+    for metrics in summary["models"].values():
+        assert metrics["rows_per_s"] > 0 and metrics["p50_ms"] > 0
+
+
+def test_generate_columns_shape():
+    columns = generate_columns(300, seed=2, text_pool=50)
+    assert {len(values) for values in columns.values()} == {300}
+    assert columns["upload_date"].dtype == np.dtype("datetime64[D]")
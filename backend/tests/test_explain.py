@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from api.predictions import score_videos
+from ml.cache import LRUCache
+from ml.explain import Explainer, TreeExplainer, top_attributions
+from ml.registry import ModelRegistry
+from ml.trees import from_estimator
+from tests.conftest import NOW
+from utils.synthetic import generate_videos
+
+
+@pytest.fixture(scope="module")
+def X(predictor):
+    return predictor.build_features(generate_videos(300, seed=3), NOW)
+
+
+def test_exact_matches_native_tree_shap(predictor, X):
+    xgb = pytest.importorskip("xgboost")
+    scaled = predictor.scale(X)
+    booster = predictor.models["xgboost"].get_booster()
+    native = booster.predict(xgb.DMatrix(scaled.astype(np.float32)), pred_contribs=True)
+    phi = TreeExplainer(from_estimator(predictor.models["xgboost"])).shap_values(scaled.astype(np.float32))
+    np.testing.assert_allclose(phi, native[:, :-1], atol=1e-4)
+
+    native = predictor.models["lightgbm"].booster_.predict(scaled, pred_contrib=True)
+    tree = TreeExplainer(from_estimator(predictor.models["lightgbm"]))
+    np.testing.assert_allclose(tree.shap_values(scaled), native[:, :-1], atol=1e-8)
+    np.testing.assert_allclose(tree.expected_value, native[0, -1], atol=1e-8)
+
+
+@pytest.mark.parametrize("mode", ["fast", "exact"])
+def test_attributions_add_up_to_the_raw_prediction(predictor, X, mode):
+    base, phi = predictor.explain(X, mode=mode)
+    raw = predictor.models["gradient_boosting"].predict(predictor.scale(X))
+    np.testing.assert_allclose(base + phi.sum(axis=1), raw, atol=1e-8)
+
+    compiled = ModelRegistry().predictor()  # folded scaler, node covers from the compiled set
+    base, phi = compiled.explain(X, mode=mode)
+    np.testing.assert_allclose(base + phi.sum(axis=1), compiled.models["gradient_boosting"].predict(X),
+                               atol=1e-8)
+
+
+def test_explanations_are_cached_by_feature_row(predictor, X):
+    explainer = Explainer(predictor, cache=LRUCache(1000, 60))
+    _, first = explainer.explain(X[:50], mode="exact")
+    tree = explainer.tree("gradient_boosting")
+    tree.shap_values = None  # any recomputation would fail
+    _, again = explainer.explain(X[:50], mode="exact")
+    np.testing.assert_array_equal(first, again)
+
+    top = top_attributions(predictor.feature_names, first[:1], k=3)[0]
+    assert len(top) == 3 and abs(top[0][1]) >= abs(top[1][1]) >= abs(top[2][1])
+
+
+def test_scored_videos_carry_top_attributions(predictor, sample_videos, monkeypatch):
+    monkeypatch.setattr("core.config.settings.explain_top_k", 4)
+    for _, _, _, attributions in score_videos(predictor, sample_videos):
+        assert len(attributions) == 4
+        assert all(feature in predictor.feature_names for feature, _ in attributions)
+
+    monkeypatch.setattr("core.config.settings.explain_mode", "off")
+    assert all(scored[3] is None for scored in score_videos(predictor, sample_videos))
@@ -0,0 +1,96 @@
+import json
+import shutil
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from ml.feature_store import FeatureStore, main
+from ml.registry import ModelRegistry
+from ml.versioning import refresh
+from tests.conftest import NOW
+from tests.test_versioning import CLEAN_FILES
+from utils.feature_engineering import ALL_FEATURE_NAMES, build_feature_matrix
+from utils.synthetic import generate_videos
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    source = ModelRegistry().model_path
+    for name in CLEAN_FILES:
+        shutil.copy2(source / name, tmp_path / name)
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def videos():
+    videos = generate_videos(600, seed=7)
+    for i, video in enumerate(videos):
+        video["video_id"] = f"v{i}"
+        video["comment_count"] = i % 40
+    return videos
+
+
+def _by_id(ids, values):
+    order = np.argsort(np.asarray(ids), kind="stable")
+    return np.asarray(values)[order]
+
+
+def test_append_partitions_by_upload_month_and_reads_are_memory_mapped(tmp_path, videos):
+    store = FeatureStore(tmp_path / "features", ALL_FEATURE_NAMES, NOW)
+    assert store.append(videos[:400], keep=["video_id"]) == 400
+    assert store.append(videos[400:], keep=["video_id"]) == 200
+    months = sorted({video["upload_date"][:7] for video in videos})
+    assert list(store.partitions()) == months and store.rows == len(videos)
+
+    X, values = next(store.scan(columns=["video_id"]))
+    assert isinstance(X.base, np.memmap) or isinstance(X, np.memmap)
+    assert X.flags.f_contiguous and not X.flags.writeable
+
+    # Reopened, the store holds the same features as building them directly
+    X, values = FeatureStore(tmp_path / "features").read(columns=["video_id"])
+    expected = build_feature_matrix(videos, ALL_FEATURE_NAMES, now=NOW)
+    ids = [video["video_id"] for video in videos]
+    np.testing.assert_array_equal(_by_id(values["video_id"], X), _by_id(ids, expected))
+
+    # Another reference date only recomputes the age features
+    later = NOW + timedelta(days=30)
+    X, values = store.read(columns=["video_id"], now=later)
+    expected = build_feature_matrix(videos, ALL_FEATURE_NAMES, now=later)
+    np.testing.assert_allclose(_by_id(values["video_id"], X), _by_id(ids, expected), rtol=1e-12)
+
+    with pytest.raises(ValueError):
+        FeatureStore(tmp_path / "features", ["duration"])
+
+
+def test_scoring_and_refresh_from_the_store(tmp_path, predictor, videos, model_dir):
+    store = FeatureStore(tmp_path / "features", predictor.feature_names, NOW)
+    views = predictor.predict_views_batch(videos, now=NOW)["gradient_boosting"] * 1.5
+    store.append([dict(video, view_count=v) for video, v in zip(videos, views)],
+                 keep=["video_id", "view_count"])
+
+    ids, scored = [], []
+    for _, output in store.predict(predictor, NOW, columns=["video_id"], chunk_size=100):
+        ids.extend(output["video_id"].tolist())
+        scored.extend(output["gradient_boosting_views"].tolist())
+    assert len(ids) == len(videos)
+    np.testing.assert_allclose(_by_id(ids, scored),
+                               _by_id([v["video_id"] for v in videos], np.round(views / 1.5, 2)))
+
+    report = refresh(store.labelled_chunks(now=NOW, chunk_size=200), model_dir, trees_per_chunk=5)
+    assert report["rows"] == len(videos)
+    assert report["evaluation"]["gradient_boosting"]["trees_added"] == 5 * report["chunks"]
+
+
+def test_cli_append_list_and_score(tmp_path, predictor, videos, monkeypatch, capsys):
+    monkeypatch.setattr("ml.predictor.get_predictor", lambda: predictor)
+    source = tmp_path / "videos.jsonl"
+    source.write_text("".join(json.dumps(video) + "\n" for video in videos))
+    store = str(tmp_path / "features")
+    main(["--store", store, "append", str(source), "--keep", "video_id", "--as-of", "2024-06-01"])
+    capsys.readouterr()
+    main(["--store", store, "list"])
+    assert json.loads(capsys.readouterr().out)["rows"] == len(videos)
+    main(["--store", store, "score", "-o", str(tmp_path / "scored.csv"), "--keep", "video_id",
+          "--as-of", "2024-06-01"])
+    assert len((tmp_path / "scored.csv").read_text().splitlines()) == len(videos) + 1
@@ -0,0 +1,116 @@
+import csv
+import math
+import shutil
+
+import numpy as np
+import pytest
+
+from api.predictions import score_videos
+from ml.intervals import (
+    ConformalIntervals, calibrate, calibrate_file, conformal_quantile, load_intervals, main,
+)
+from ml.predictor import BatchPredictor
+from ml.registry import ModelRegistry
+from ml.routing import train
+from tests.conftest import NOW
+from tests.test_routing import _labelled
+from tests.test_versioning import CLEAN_FILES
+from utils.synthetic import generate_videos
+
+
+def _with_intervals(predictor, intervals):
+    return BatchPredictor(predictor.models, predictor.scaler, predictor.feature_names,
+                          predictor.model_info, intervals=intervals)
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    source = ModelRegistry().model_path
+    for name in CLEAN_FILES:
+        shutil.copy2(source / name, tmp_path / name)
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def labelled(predictor):
+    """Synthetic videos whose 'observed' views scatter around gradient boosting."""
+    videos = generate_videos(4000, seed=7)
+    predictions = predictor.predict_views_batch(videos, now=NOW)
+    rng = np.random.default_rng(0)
+    noise = rng.normal(0, 0.3 + 0.05 * np.log1p(predictions["gradient_boosting"]))
+    y = np.expm1(np.log1p(predictions["gradient_boosting"]) + noise)
+    return videos, predictions, y
+
+
+def test_conformal_quantile_rank():
+    scores = np.arange(1.0, 10.0)
+    assert conformal_quantile(scores, 0.8) == 8.0  # ceil(10 * 0.8) = 8th smallest
+    assert conformal_quantile(scores, 0.95) == math.inf  # too few rows for 95%
+
+
+def test_held_out_coverage_matches_level(labelled):
+    _, predictions, y = labelled
+    half = len(y) // 2
+    calibration = calibrate(y[:half], {name: views[:half] for name, views in predictions.items()},
+                            levels=(0.8, 0.9), min_bin_rows=100)
+    intervals = ConformalIntervals(calibration)
+    for level in (0.8, 0.9):
+        lower, upper = intervals.bounds("gradient_boosting", predictions["gradient_boosting"][half:], level)
+        covered = np.mean((y[half:] >= lower) & (y[half:] <= upper))
+        assert abs(covered - level) < 0.04
+    # Noise grows with the prediction, and so do the per-bin widths
+    widths = calibration["models"]["gradient_boosting"]["quantiles"]["0.8"]
+    assert widths[-1] > widths[0]
+
+
+def test_headline_falls_back_to_models_that_ran(labelled):
+    _, predictions, y = labelled
+    intervals = ConformalIntervals(calibrate(y, predictions))
+    partial = {name: views[:4].copy() for name, views in predictions.items()}
+    for name in ("gradient_boosting", "xgboost", "lightgbm"):
+        partial[name][:2] = np.nan  # cascade rows answered by ridge
+    lower, upper = intervals.headline(partial)
+    expected = intervals.bounds("ridge", partial["ridge"][:2])
+    np.testing.assert_allclose(lower[:2], expected[0])
+    np.testing.assert_allclose(upper[2:], intervals.bounds("gradient_boosting", partial["gradient_boosting"][2:])[1])
+
+
+def test_batch_scoring_reports_intervals(predictor, labelled, sample_videos):
+    _, predictions, y = labelled
+    scorer = _with_intervals(predictor, ConformalIntervals(calibrate(y, predictions)))
+    for views, codes, interval, _ in score_videos(scorer, sample_videos):
+        assert interval[0] <= views["gradient_boosting"] <= interval[1]
+    assert all(interval is None for _, _, interval, _ in score_videos(predictor, sample_videos))
+
+
+def _write_labelled(path, videos, y):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(videos[0]) + ["view_count"])
+        writer.writeheader()
+        writer.writerows({**video, "view_count": views} for video, views in zip(videos, y))
+
+
+def test_calibrate_file_and_version_check(tmp_path, predictor, labelled):
+    videos, _, y = labelled
+    path = tmp_path / "labelled.csv"
+    _write_labelled(path, videos[:500], y)
+    calibration = calibrate_file(str(path), predictor, now=NOW, chunk_size=200)
+    assert calibration["version"] == predictor.version
+    assert calibration["models"]["ridge"]["rows"] == 500
+
+    ConformalIntervals(calibration).save(tmp_path / "clean_intervals.json")
+    assert load_intervals(tmp_path, version=predictor.version) is not None
+    assert load_intervals(tmp_path, version="other") is None
+
+
+def test_calibration_with_specialists_loads_with_the_routed_predictor(model_dir, predictor, labelled):
+    train([_labelled(predictor, ["Gaming"] * 1200)], model_dir, min_rows=500, step_rows=500,
+          trees_per_step=20, now=NOW)
+    videos, _, y = labelled
+    _write_labelled(model_dir / "labelled.csv", videos[:500], y)
+    main(["calibrate", str(model_dir / "labelled.csv"), "--as-of", NOW.strftime("%Y-%m-%d"),
+          "--model-path", str(model_dir)])
+
+    routed = ModelRegistry(model_dir).predictor()
+    assert routed.router is not None and routed.intervals is not None
+    assert routed.intervals.version == ModelRegistry(model_dir).version
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from core import metrics
+from core.profiler import SamplingProfiler
+from tests.conftest import NOW
+
+prometheus_client = pytest.importorskip("prometheus_client")
+pytestmark = pytest.mark.skipif(not metrics.ENABLED, reason="metrics disabled")
+
+
+def _sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_and_model_timings(predictor, sample_videos):
+    before_rows = _sample("viralcast_rows_predicted_total", model="lightgbm")
+    before_features = _sample("viralcast_stage_seconds_count", stage="features")
+    predictor.predict_views_batch(sample_videos * 50, now=NOW)
+    assert _sample("viralcast_rows_predicted_total", model="lightgbm") == before_rows + 200
+    assert _sample("viralcast_model_predict_seconds_count", model="lightgbm", batch_size="17-256",
+                   path="single") >= 1
+    assert _sample("viralcast_stage_seconds_count", stage="features") > before_features
+    assert _sample("viralcast_stage_seconds_count", stage="scale") >= 1
+
+
+def test_small_batches_use_the_tree_stack(predictor, sample_videos):
+    from ml.registry import ModelRegistry
+    compiled = ModelRegistry().predictor()
+    labels = {name: {"model": name, "batch_size": "1", "path": "stacked"}
+              for name in ("xgboost", "lightgbm", "gradient_boosting")}
+    before = {name: _sample("viralcast_model_predict_seconds_count", **labels[name]) for name in labels}
+    compiled.predict_views_batch(sample_videos[:1], now=NOW)
+    for name in labels:
+        assert _sample("viralcast_model_predict_seconds_count", **labels[name]) == before[name] + 1
+    assert _sample("viralcast_model_predict_seconds_count", model="ridge", batch_size="1",
+                   path="single") >= 1
+
+
+def test_batch_size_classes():
+    assert [metrics.batch_size_class(n) for n in (1, 2, 16, 17, 256, 4096, 4097)] == \
+        ["1", "2-16", "2-16", "17-256", "17-256", "257-4096", "4097+"]
+
+
+def _busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampling_profiler_sees_hot_function():
+    profiler = SamplingProfiler(interval=0.002)
+    profiler.start()
+    _busy_wait(0.2)
+    profiler.stop()
+    assert profiler.samples > 10
+    assert "_busy_wait" in profiler.collapsed()
+    assert not profiler.running
@@ -0,0 +1,84 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from sklearn.preprocessing import StandardScaler
+
+from ml.parallel import ParallelPredictor
+from ml.predictor import BatchPredictor
+from ml.registry import ModelRegistry
+from ml.routing import CategoryEncoder, CategoryRouter, encoder_classes
+from tests.conftest import NOW
+from utils.synthetic import generate_videos
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_process_pool_matches_single_process(predictor, sample_videos):
+    videos = sample_videos * 50
+    expected = predictor.predict_views_batch(videos, now=NOW)
+    with ParallelPredictor(predictor, processes=2, shard_size=32) as parallel:
+        got = parallel.predict_views_batch(videos, now=NOW)
+        # The pool is reused across calls
+        again = parallel.predict_views_batch(videos[:40], now=NOW)
+    for name in expected:
+        np.testing.assert_array_equal(got[name], expected[name])
+        np.testing.assert_array_equal(again[name], expected[name][:40])
+
+
+def _comment_predictor(predictor, videos, seed):
+    """Ridge over the clean features plus comment_velocity (reads comment_count)."""
+    names = predictor.feature_names + ["comment_velocity"]
+    probe = BatchPredictor({}, None, names, predictor.model_info)
+    X = probe.build_features(videos, NOW)
+    y = np.random.default_rng(seed).normal(10, 1, len(X)) + np.log1p(X[:, -1])
+    scaler = StandardScaler().fit(X)
+    return BatchPredictor({"ridge": Ridge().fit(scaler.transform(X), y)}, scaler, names,
+                          predictor.model_info)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_process_pool_keeps_optional_fields_and_categories(predictor):
+    videos = generate_videos(300, seed=11)
+    for i, video in enumerate(videos):
+        video["comment_count"] = 10 * i
+        video["category"] = "Gaming" if i % 3 == 0 else "Music"
+    routed = _comment_predictor(predictor, videos, seed=0)
+    routed.router = CategoryRouter(CategoryEncoder(encoder_classes()),
+                                   {"Gaming": _comment_predictor(predictor, videos, seed=1)})
+    expected = routed.predict_views_batch(videos, now=NOW)
+    with ParallelPredictor(routed, processes=2, shard_size=64) as parallel:
+        got = parallel.predict_views_batch(videos, now=NOW)
+    # BLAS blocks sklearn's Ridge differently per shard size
+    np.testing.assert_allclose(got["ridge"], expected["ridge"], rtol=1e-12)
+
+
+def test_spawned_workers_rebuild_the_configured_predictor(predictor, sample_videos):
+    with pytest.raises(ValueError):
+        ParallelPredictor(predictor, start_method="spawn")._get_pool()  # pickled models
+
+    from ml.cascade import Cascade
+    registry = ModelRegistry()
+    configured = registry.predictor(fuse_scaler=False, router=None,
+                                    cascade=Cascade.from_registry(registry, tolerance=2.5, budget=None))
+    videos = sample_videos * 20
+    expected = configured.predict_views_batch(videos, now=NOW)
+    with ParallelPredictor(configured, processes=2, shard_size=50, start_method="spawn") as parallel:
+        got = parallel.predict_views_batch(videos, now=NOW)
+    for name in expected:
+        np.testing.assert_array_equal(got[name], expected[name])
+
+
+def test_small_batches_stay_in_process(predictor, sample_videos):
+    parallel = ParallelPredictor(predictor, processes=4)
+    parallel.predict_views_batch(sample_videos, now=NOW)
+    assert parallel._pool is None
+
+
+def test_model_threads_match_sequential(predictor, sample_videos):
+    threaded = BatchPredictor(predictor.models, predictor.scaler, predictor.feature_names,
+                              predictor.model_info, model_threads=True)
+    expected = predictor.predict_views_batch(sample_videos * 5, now=NOW)
+    got = threaded.predict_views_batch(sample_videos * 5, now=NOW)
+    for name in expected:
+        np.testing.assert_array_equal(got[name], expected[name])
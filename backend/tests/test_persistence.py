@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from api.predictions import build_response
+from api.schemas import PredictionInput
+from core.config import settings
+from core.persistence import (
+    PREDICTION_COLUMNS, PostgresSink, PredictionWriter, SQLiteSink, _copy_buffer, prediction_rows,
+    sink_from_url,
+)
+
+
+@pytest.fixture
+def responses(sample_videos):
+    videos = [PredictionInput(**video) for video in sample_videos]
+    no_codes = np.zeros(0, dtype=np.int64)
+    scored = [({"ridge": 1200.0, "gradient_boosting": 1500.4}, no_codes, None, None),
+              ({"ridge": 80.0, "gradient_boosting": 95.0}, no_codes, (40.0, 210.0), None)]
+    return [(video, build_response(video, result, 0.002)) for video, result in zip(videos, scored)]
+
+
+def _count(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class SlowSink:
+    """Records batch sizes; optionally blocks or fails."""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = fail
+        self.closed = False
+
+    def write(self, predictions, analytics):
+        self.release.wait(5)
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.batches.append(len(predictions))
+
+    def close(self):
+        self.closed = True
+
+
+def test_rows_match_the_response(responses):
+    video, response = responses[0]
+    [prediction], analytics = prediction_rows(video, response)
+    assert prediction[0] == response.prediction_id
+    assert prediction[2] == video.title
+    assert prediction[13:15] == (None, None)  # uncalibrated: no interval
+    assert json.loads(prediction[17]) == response.key_factors
+    assert prediction[-1].endswith("+00:00")
+    assert {name for _, name, _, _ in analytics} == {"ridge_views", "gradient_boosting_views",
+                                                     "processing_time"}
+    assert prediction_rows(*responses[1])[0][0][13:15] == (40, 210)
+
+
+def test_copy_buffer_distinguishes_null_from_empty():
+    text = _copy_buffer([("a\tb\nc", None, "", 3, 1.5)]).getvalue()
+    assert text == "a\\tb\\nc\t\\N\t\t3\t1.5\n"
+
+
+def test_writer_flushes_in_batches(tmp_path, responses):
+    path = tmp_path / "log.db"
+
+    async def scenario():
+        writer = PredictionWriter(SQLiteSink(str(path)), flush_rows=8, flush_interval_ms=20)
+        await writer.start()
+        for i in range(20):
+            video, response = responses[i % 2]
+            assert writer.record(video, response.model_copy(update={"prediction_id": f"p{i}"}))
+        await writer.stop()
+        return writer.metrics()
+
+    stats = asyncio.run(scenario())
+    assert stats["written"] == 20 and stats["dropped"] == stats["failed"] == 0
+    assert stats["flushes"] == 3  # 8 + 8 + 4
+    assert _count(path, "predictions") == 20
+    assert _count(path, "analytics") == 20 * 3
+
+
+def test_full_queue_drops_instead_of_blocking(responses):
+    sink = SlowSink()
+
+    async def scenario():
+        writer = PredictionWriter(sink, flush_rows=2, flush_interval_ms=1, max_queue=4)
+        await writer.start()
+        sink.release.clear()  # the database stalls
+        accepted = [writer.record(*responses[0]) for _ in range(10)]
+        sink.release.set()
+        await writer.stop()
+        return accepted, writer.metrics()
+
+    accepted, stats = asyncio.run(scenario())
+    assert not all(accepted)
+    assert stats["dropped"] == accepted.count(False)
+    assert stats["written"] == accepted.count(True) == sum(sink.batches)
+    assert sink.closed
+
+
+def test_failed_writes_are_counted_not_raised(responses):
+    async def scenario():
+        writer = PredictionWriter(SlowSink(fail=True), flush_rows=5, flush_interval_ms=1)
+        await writer.start()
+        for _ in range(3):
+            writer.record(*responses[0])
+        await writer.stop()
+        return writer.metrics()
+
+    stats = asyncio.run(scenario())
+    assert stats["failed"] == 3 and stats["written"] == 0
+
+
+def test_api_logs_predictions(tmp_path, predictor, sample_videos, monkeypatch):
+    path = tmp_path / "api.db"
+    monkeypatch.setattr(main, "get_predictor", lambda: predictor)
+    monkeypatch.setattr(settings, "database_url", f"sqlite:///{path}")
+    with TestClient(main.app) as client:
+        assert client.post("/api/v1/predict", json=sample_videos[0]).status_code == 200
+        assert client.post("/api/v1/predict/batch", json={"videos": sample_videos}).status_code == 200
+        assert client.get("/api/v1/health").json()["components"]["prediction_log"] == "healthy"
+    # Shutdown flushed the queue
+    assert _count(path, "predictions") == 1 + len(sample_videos)
+
+
+def test_unknown_scheme_is_rejected():
+    with pytest.raises(ValueError):
+        sink_from_url("mysql://localhost/viralcast")
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="needs TEST_DATABASE_URL (PostgreSQL)")
+def test_postgres_copy_round_trip(responses):
+    sink = PostgresSink(os.environ["TEST_DATABASE_URL"])
+    predictions, analytics = prediction_rows(*responses[0])
+    try:
+        sink.write(predictions, analytics)
+        conn = sink.pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT video_title, confidence_lower FROM predictions WHERE id = %s",
+                           (predictions[0][0],))
+            assert cursor.fetchone() == (predictions[0][PREDICTION_COLUMNS.index('video_title')], None)
+            cursor.execute("DELETE FROM predictions WHERE id = %s", (predictions[0][0],))
+        conn.commit()
+        sink.pool.putconn(conn)
+    finally:
+        sink.close()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import test_clean_models as reference
+from tests.conftest import NOW
+from utils.feature_engineering import CLEAN_FEATURE_NAMES, build_feature_matrix
+
+
+@pytest.fixture
+def frozen_reference_clock(monkeypatch):
+    """Pin datetime.now() inside the reference script to NOW."""
+    class FrozenDatetime(reference.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return NOW
+    monkeypatch.setattr(reference, "datetime", FrozenDatetime)
+
+
+def test_feature_names_match_artifact(predictor):
+    assert predictor.feature_names == CLEAN_FEATURE_NAMES
+
+
+def test_feature_matrix_matches_reference(predictor, sample_videos, frozen_reference_clock):
+    X = build_feature_matrix(sample_videos, predictor.feature_names, now=NOW)
+    for row, video in zip(X, sample_videos):
+        expected = reference.prepare_video_features(video, predictor.feature_names)
+        np.testing.assert_allclose(row, expected.to_numpy(dtype=float)[0])
+
+
+def test_batch_matches_per_video_predictions(predictor, sample_videos, frozen_reference_clock):
+    batch = predictor.predict_views_batch(sample_videos, now=NOW)
+    for i, video in enumerate(sample_videos):
+        single = reference.predict_views(
+            predictor.models, predictor.scaler, predictor.feature_names,
+            predictor.model_info, video,
+        )
+        for name, views in single.items():
+            assert batch[name][i] == pytest.approx(views, rel=1e-6)
+
+
+def test_batch_accepts_columnar_inputs(predictor, sample_videos):
+    expected = predictor.predict_views_batch(sample_videos, now=NOW)
+    frame = pd.DataFrame(sample_videos)
+    columns = {name: frame[name].to_numpy() for name in frame.columns}
+    for videos in (frame, columns):
+        result = predictor.predict_views_batch(videos, now=NOW)
+        for name in expected:
+            np.testing.assert_allclose(result[name], expected[name])
+
+
+def test_batch_chunking_is_transparent(predictor, sample_videos):
+    videos = sample_videos * 5
+    whole = predictor.predict_views_batch(videos, now=NOW)
+    predictor.chunk_size, original = 3, predictor.chunk_size
+    try:
+        chunked = predictor.predict_views_batch(videos, now=NOW)
+    finally:
+        predictor.chunk_size = original
+    for name in whole:
+        np.testing.assert_allclose(chunked[name], whole[name])
+        assert (chunked[name] >= 0).all()
@@ -0,0 +1,113 @@
+import mmap
+import os
+
+import numpy as np
+import pytest
+
+from ml.registry import ArrayScaler, ModelRegistry
+from ml.trees import TreeEnsemble
+from tests.conftest import NOW
+
+
+@pytest.fixture(scope="module")
+def registry(tmp_path_factory):
+    """Clean artifact set compiled into a temporary directory."""
+    registry = ModelRegistry(compiled_path=tmp_path_factory.mktemp("compiled") / "clean")
+    registry.build()
+    return registry
+
+
+def test_compiled_predictions_match_pickles(registry, predictor, sample_videos):
+    compiled = registry.predictor().predict_views_batch(sample_videos * 3, now=NOW)
+    expected = predictor.predict_views_batch(sample_videos * 3, now=NOW)
+    assert set(compiled) == set(expected)
+    for name in expected:
+        np.testing.assert_allclose(compiled[name], expected[name], rtol=1e-9)
+
+
+def _is_memory_mapped(array):
+    while array is not None:
+        if isinstance(array, mmap.mmap):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def test_arrays_are_memory_mapped(registry):
+    scaler = registry.load_scaler()
+    assert isinstance(scaler, ArrayScaler)
+    assert _is_memory_mapped(scaler.mean_)
+    for name in ("gradient_boosting", "xgboost", "lightgbm"):
+        ensemble = registry.load_model(name)
+        assert isinstance(ensemble, TreeEnsemble)
+        assert _is_memory_mapped(ensemble.threshold)
+
+
+def test_models_open_lazily(registry):
+    models = registry.models()
+    assert list(models) == list(registry.manifest["models"])
+    assert models._loaded == {}
+    models["ridge"]
+    assert list(models._loaded) == ["ridge"]
+
+
+def test_missing_artifacts_are_skipped(registry):
+    assert "random_forest" in registry.manifest["model_info"]["model_names"]
+    assert "random_forest" not in registry.model_info["model_names"]
+
+
+def test_touching_a_source_marks_the_set_stale(registry, tmp_path):
+    source = tmp_path / "models"
+    source.mkdir()
+    for name in registry.manifest["sources"]:
+        os.link(registry.model_path / name, source / name)
+    copy = ModelRegistry(source, compiled_path=tmp_path / "compiled")
+    copy.ensure_built()
+    assert not copy.is_stale()
+
+    scaler = source / "clean_scaler.pkl"
+    stat = scaler.stat()
+    os.utime(scaler, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert copy.is_stale()
+    copy.ensure_built()
+    assert not copy.is_stale()
+
+
+def test_rebuild_swaps_the_published_link(registry, tmp_path):
+    compiled = tmp_path / "compiled"
+    (compiled / "clean").mkdir(parents=True)  # set compiled before sets were linked
+    copy = ModelRegistry(registry.model_path, compiled_path=compiled / "clean")
+    copy.build()
+    assert copy.compiled_path.is_symlink()
+    first = copy.compiled_path.resolve()
+    copy.build()
+    second = copy.compiled_path.resolve()
+    assert second != first and not first.exists()
+    assert sorted(path.name for path in compiled.iterdir()) == sorted(["clean", second.name])
+    assert copy.manifest["models"] == registry.manifest["models"]
+
+
+def test_fused_scaler_matches_scaled_inputs(registry, sample_videos):
+    fused = registry.predictor(fuse_scaler=True)
+    plain = registry.predictor(fuse_scaler=False)
+    X = fused.build_features(sample_videos * 3, now=NOW)
+    assert fused.scale(X) is X
+    raw_fused = fused.predict_raw(fused.scale(X))
+    raw_plain = plain.predict_raw(plain.scale(X))
+    for name in ("gradient_boosting", "xgboost", "lightgbm"):
+        np.testing.assert_array_equal(raw_fused[name], raw_plain[name])
+    np.testing.assert_allclose(raw_fused["ridge"], raw_plain["ridge"], rtol=1e-12)
+
+
+def test_folded_thresholds_agree_at_the_boundary(registry):
+    scaler = registry.load_scaler()
+    for name in ("gradient_boosting", "xgboost", "lightgbm"):
+        ensemble = registry.load_model(name)
+        folded = ensemble.fold_scaler(scaler.mean_, scaler.scale_)
+        splits = np.isfinite(ensemble.threshold)
+        feature = ensemble.feature[splits]
+        mean, scale = scaler.mean_[feature], scaler.scale_[feature]
+        threshold = folded.threshold[splits]
+        # Each folded threshold passes the scaled test and the next float does not
+        assert np.all((threshold - mean) / scale <= ensemble.threshold[splits])
+        assert not np.any((np.nextafter(threshold, np.inf) - mean) / scale <= ensemble.threshold[splits])
@@ -0,0 +1,56 @@
+import json
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+import cli
+from ml.registry import ModelRegistry
+from ml.results import ResultStore, StoredPredictor
+from tests.conftest import NOW
+from utils.synthetic import generate_videos
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(tmp_path / "results.db")
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_next_day_reuses_stored_results_exactly(predictor, store, compiled):
+    predictor = ModelRegistry().predictor() if compiled else predictor
+    stored = StoredPredictor(predictor, store)
+    videos = generate_videos(2000, seed=4)
+    for day in range(3):
+        now = NOW + timedelta(days=day)
+        views = stored.predict_views_batch(videos, now)
+        for name, expected in predictor.predict_views_batch(videos, now=now).items():
+            np.testing.assert_array_equal(views[name], expected)
+    # Only videos whose age crossed a split were scored again
+    assert stored.stats.hits > 0.8 * 2 * len(videos)
+    assert list(store.versions()) == [predictor.version]
+
+
+def test_duplicate_rows_are_scored_once(predictor, store, sample_videos):
+    stored = StoredPredictor(predictor, store)
+    videos = sample_videos * 25
+    views = stored.predict_views_batch(videos, NOW)
+    assert stored.stats.misses == len(sample_videos) and stored.rows == len(videos)
+    expected = predictor.predict_views_batch(videos, now=NOW)
+    np.testing.assert_array_equal(views["gradient_boosting"], expected["gradient_boosting"])
+    assert store.prune(["another-version"]) == len(sample_videos)
+
+
+def test_cli_score_with_result_store(predictor, tmp_path, sample_videos, monkeypatch, capsys):
+    monkeypatch.setattr("ml.predictor.get_predictor", lambda: predictor)
+    source = tmp_path / "catalog.jsonl"
+    source.write_text("".join(json.dumps(video) + "\n" for video in sample_videos))
+    args = ["score", str(source), "-o", str(tmp_path / "scored.csv"), "--as-of", "2024-06-01",
+            "--result-store", str(tmp_path / "results.db")]
+    assert cli.main(args) == 0
+    assert cli.main(args) == 0
+    assert f"{len(sample_videos)} stored / 0 scored" in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        cli.main(args + ["--cascade"])
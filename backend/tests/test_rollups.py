@@ -0,0 +1,142 @@
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from core import rollups
+from core.config import settings
+from core.persistence import PREDICTION_COLUMNS, PostgresSink, SQLiteSink
+
+TODAY = date(2024, 6, 1)
+ROLLUP_QUERY = "SELECT * FROM prediction_daily_rollup ORDER BY day, category"
+BUCKET_QUERY = "SELECT * FROM prediction_accuracy_rollup ORDER BY day, category, bucket"
+
+
+def _prediction(i, day, category, views, prediction_id=None):
+    row = dict.fromkeys(PREDICTION_COLUMNS)
+    created = datetime.combine(day, datetime.min.time(), timezone.utc) + timedelta(hours=i % 24)
+    row.update(id=prediction_id or f"p{i}", video_title="t", duration=60, upload_date="2024-01-01",
+               category=category, predicted_views=views, prediction_quality="High",
+               created_at=created.isoformat())
+    return tuple(row[column] for column in PREDICTION_COLUMNS)
+
+
+@pytest.fixture
+def sink(tmp_path):
+    sink = SQLiteSink(str(tmp_path / "rollups.db"))
+    rows = []
+    for i in range(60):
+        day = TODAY - timedelta(days=i % 20)
+        rows.append(_prediction(i, day, ["Education", "Gaming", None][i % 3], 1000 * (i % 7 + 1)))
+    sink.write(rows, [])
+    yield sink
+    sink.close()
+
+
+def _feedback(sink, ids, actual, accuracy):
+    with sink.conn:
+        sink.conn.executemany("UPDATE predictions SET actual_views = ?, accuracy_score = ? WHERE id = ?",
+                              [(actual, accuracy, i) for i in ids])
+
+
+def test_triggers_match_a_full_recompute(sink):
+    _feedback(sink, ["p0", "p3", "p4"], 5000, 0.85)
+    _feedback(sink, ["p3"], 8000, 0.95)  # revised feedback replaces the old contribution
+    with sink.conn:
+        sink.conn.execute("UPDATE predictions SET video_title = 'renamed' WHERE id = 'p1'")  # ignored
+        sink.conn.execute("DELETE FROM predictions WHERE id = 'p5'")
+    incremental = sink.conn.execute(ROLLUP_QUERY).fetchall(), sink.conn.execute(BUCKET_QUERY).fetchall()
+    rollups.refresh(sink.conn)
+    recomputed = sink.conn.execute(ROLLUP_QUERY).fetchall(), sink.conn.execute(BUCKET_QUERY).fetchall()
+    # Rows emptied by the delete/updates stay behind with zero counts
+    assert [row for row in incremental[0] if row[2]] == recomputed[0]
+    assert [row for row in incremental[1] if row[3]] == recomputed[1]
+    assert sum(row[2] for row in recomputed[0]) == 59
+
+
+def test_dashboard_reads_rollups(sink):
+    _feedback(sink, ["p0", "p3", "p6"], 2000, 0.9)
+    with sink.connection() as conn:
+        report = rollups.dashboard(conn, days=7, today=TODAY)
+    # Days 0-6 back from TODAY: i % 20 < 7
+    assert report["summary"]["total_predictions"] == sum(1 for i in range(60) if i % 20 < 7)
+    assert [point["date"] for point in report["trends"]["daily_predictions"]] == sorted(
+        (TODAY - timedelta(days=d)).isoformat() for d in range(7))
+    assert report["summary"]["average_accuracy"] == pytest.approx(0.9)
+    education = next(c for c in report["category_performance"] if c["category"] == "Education")
+    assert education["average_actual_views"] == 2000
+    assert report["accuracy_distribution"] == [{"bucket": "0.9-1.0", "count": 3}]
+    assert report["summary"]["best_performing_category"] in {"Education", "Gaming"}
+
+
+def test_categories_growth(sink):
+    with sink.connection() as conn:
+        report = rollups.categories(conn, days=10, today=TODAY)["categories"]
+    assert {c["name"] for c in report} == {"Education", "Gaming"}
+    assert report[0]["trend_score"] == 1.0
+    for category in report:
+        assert category["growth_rate"] == pytest.approx(0.0)  # same volume in both windows
+
+
+def test_analytics_endpoints(tmp_path, predictor, sample_videos, monkeypatch):
+    monkeypatch.setattr(main, "get_predictor", lambda: predictor)
+    monkeypatch.setattr(settings, "database_url", f"sqlite:///{tmp_path / 'api.db'}")
+    monkeypatch.setattr(settings, "persist_flush_interval_ms", 1)
+    with TestClient(main.app) as client:
+        client.post("/api/v1/predict/batch", json={"videos": sample_videos})
+        for _ in range(200):  # the write-behind flush runs on the app's event loop
+            if main.app.state.writer.metrics()["written"]:
+                break
+            time.sleep(0.01)
+        dashboard = client.get("/api/v1/analytics/dashboard?time_range=7d")
+        assert dashboard.status_code == 200
+        assert dashboard.json()["summary"]["total_predictions"] == len(sample_videos)
+        assert client.get("/api/v1/analytics/categories").status_code == 200
+        assert client.get("/api/v1/analytics/dashboard?time_range=2w").status_code == 422
+
+
+def test_analytics_need_a_database(predictor, monkeypatch):
+    monkeypatch.setattr(main, "get_predictor", lambda: predictor)
+    with TestClient(main.app) as client:
+        assert client.get("/api/v1/analytics/dashboard").status_code == 503
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="needs TEST_DATABASE_URL (PostgreSQL)")
+def test_postgres_triggers_match_a_full_recompute():
+    # A category of its own, so rows already in the test database do not interfere
+    category = f"test-{uuid.uuid4().hex[:8]}"
+    ids = [str(uuid.uuid4()) for _ in range(30)]
+    rows = [_prediction(i, TODAY - timedelta(days=i % 5), category, 1000 * (i % 7 + 1), ids[i])
+            for i in range(30)]
+    query = "SELECT * FROM prediction_daily_rollup WHERE category = %s ORDER BY day"
+    buckets = "SELECT * FROM prediction_accuracy_rollup WHERE category = %s ORDER BY day, bucket"
+    sink = PostgresSink(os.environ["TEST_DATABASE_URL"])
+    try:
+        sink.write(rows, [])  # COPY: one statement, one trigger call
+        with sink.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.executemany("UPDATE predictions SET actual_views = %s, accuracy_score = %s WHERE id = %s",
+                                   [(5000, 0.85, i) for i in ids[:6]])
+                cursor.execute("UPDATE predictions SET actual_views = 8000, accuracy_score = 0.95 "
+                               "WHERE id = %s", (ids[0],))
+                cursor.execute("UPDATE predictions SET video_title = 'renamed' WHERE id = %s", (ids[7],))
+                cursor.execute("DELETE FROM predictions WHERE id = ANY(%s::uuid[])", (ids[10:13],))
+            conn.commit()
+            incremental = rollups.fetch_all(conn, query, (category,)), rollups.fetch_all(conn, buckets, (category,))
+            rollups.refresh(conn, TODAY - timedelta(days=4), TODAY)
+            recomputed = rollups.fetch_all(conn, query, (category,)), rollups.fetch_all(conn, buckets, (category,))
+        assert incremental == recomputed
+        assert sum(row[2] for row in recomputed[0]) == 27
+        assert sum(row[3] for row in recomputed[1]) == 6
+    finally:
+        with sink.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM predictions WHERE category = %s", (category,))
+                for table in ("prediction_daily_rollup", "prediction_accuracy_rollup"):
+                    cursor.execute(f"DELETE FROM {table} WHERE category = %s", (category,))
+            conn.commit()
+        sink.close()
@@ -0,0 +1,94 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from ml.cache import CachedPredictor, LRUCache
+from ml.registry import ModelRegistry
+from ml.results import ResultStore, StoredPredictor
+from ml.routing import CategoryEncoder, encoder_classes, load_routing, train
+from ml.whatif import score_variants
+from tests.conftest import NOW
+from utils.synthetic import generate_videos
+
+CLEAN_FILES = ["clean_model_info.pkl", "clean_scaler.pkl", "clean_feature_names.pkl"] + [
+    f"{name}_clean_model.pkl" for name in ("ridge", "xgboost", "lightgbm", "gradient_boosting")]
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    source = ModelRegistry().model_path
+    for name in CLEAN_FILES:
+        shutil.copy2(source / name, tmp_path / name)
+    return tmp_path
+
+
+def _labelled(predictor, categories, seed=0):
+    """Gaming videos get 4x the views the global models predict; the rest noise around them."""
+    videos = generate_videos(len(categories), seed=seed)
+    views = predictor.predict_views_batch(videos, now=NOW)["gradient_boosting"]
+    noise = np.exp(np.random.default_rng(seed + 100).normal(0, 0.5, len(videos)))
+    views = np.where(np.asarray(categories) == "Gaming", views * 4, views * noise)
+    columns = {key: [video[key] for video in videos] for key in videos[0]}
+    columns["category"] = list(categories)
+    return columns, views
+
+
+def test_encoder_matches_label_encoder_codes():
+    classes = encoder_classes()
+    encoder = CategoryEncoder(classes)
+    codes = encoder.encode(["Gaming", " Music ", "Cooking", None, float("nan"), "", "Travel & Events"])
+    assert codes.tolist() == [classes.index("Gaming"), classes.index("Music"), -1, -1, -1, -1,
+                              classes.index("Travel & Events")]
+
+
+def test_train_keeps_specialists_that_beat_the_global_models(model_dir, predictor):
+    categories = (["Gaming"] * 3 + ["Music"] * 2) * 600 + ["Comedy"] * 50
+    chunks = [_labelled(predictor, categories[:1500]), _labelled(predictor, categories[1500:], seed=1)]
+    routing = train(chunks, model_dir, min_rows=500, step_rows=1000, trees_per_step=20, now=NOW)
+    assert list(routing["specialists"]) == ["Gaming"]
+    gaming = routing["specialists"]["Gaming"]["evaluation"]["gradient_boosting"]
+    assert gaming["rmse_after"] < gaming["rmse_before"]
+    assert set(routing["skipped"]) == {"Music", "Comedy"}  # no better / too few rows
+    assert load_routing(model_dir)["rows"] == len(categories)
+
+
+def test_router_scores_each_category_group_in_input_order(model_dir, predictor, sample_videos):
+    categories = ["Gaming"] * 1200
+    train([_labelled(predictor, categories)], model_dir, min_rows=500, step_rows=500,
+          trees_per_step=20, now=NOW)
+    routed = ModelRegistry(model_dir).predictor()
+    assert list(routed.router.specialists) == ["Gaming"]
+    specialist = routed.router.specialists["Gaming"]
+    plain = ModelRegistry(model_dir).predictor(router=None)
+    assert routed.version != plain.version
+
+    videos = [dict(video, category=category) for video, category in
+              zip(sample_videos, ["Gaming", None, "Gaming", "Music"])]
+    views = routed.predict_views_batch(videos, now=NOW)
+    X = routed.build_features(videos, NOW)
+    expected_gaming = specialist.predict_matrix(X[[0, 2]])["gradient_boosting"]
+    expected_global = plain.predict_matrix(X[[1, 3]])["gradient_boosting"]
+    np.testing.assert_allclose(views["gradient_boosting"][[0, 2]], expected_gaming)
+    np.testing.assert_allclose(views["gradient_boosting"][[1, 3]], expected_global)
+    assert (expected_gaming > plain.predict_matrix(X[[0, 2]])["gradient_boosting"]).all()
+
+    # The cache keys on category when routing, and what-if sweeps keep the route
+    cached = CachedPredictor(routed, cache=LRUCache(100, 60))
+    cached.predict_views_batch(videos, NOW)
+    music = cached.predict_views_batch([dict(videos[0], category="Music")], NOW)
+    assert cached.cache.stats.hits == 0
+    np.testing.assert_allclose(music["gradient_boosting"], plain.predict_matrix(X[[0]])["gradient_boosting"])
+    base = score_variants(videos[0], [], routed, now=NOW)["gradient_boosting"][0]
+    assert base == pytest.approx(expected_gaming[0])
+
+    # Stored results are kept per route
+    stored = StoredPredictor(routed, ResultStore(model_dir / "results.db"))
+    np.testing.assert_array_equal(stored.predict_views_batch(videos, NOW)["gradient_boosting"],
+                                  views["gradient_boosting"])
+    assert len(stored.store.versions()) == 2
+
+    # Attributions come from the model that scored the row
+    base, phi = routed.explain(X, [video.get("category") for video in videos], mode="exact")
+    raw = np.log1p(np.r_[expected_gaming[0], expected_global[0], expected_gaming[1], expected_global[1]])
+    np.testing.assert_allclose(base + phi.sum(axis=1), raw, rtol=1e-6)
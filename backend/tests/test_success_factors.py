@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+
+from tests.conftest import NOW
+from utils.feature_engineering import compute_features, to_columns
+from utils.success_factors import (
+    FACTOR_TEXT, NO_FACTOR, FactorCode, KeywordMatcher, evaluate, factor_codes, render,
+)
+
+import test_clean_models as reference
+
+WORDS = ["Python", "tutorial", "How To", "guide", "learn", "review", "TEST", "unboxing",
+         "2024", "new", "latest", "Gaming", "game", "İstanbul", "vlog", "epic", "best",
+         "newgame", "howto", "pretest", "Reviewed"]
+
+
+def _random_videos(n, seed=7):
+    rng = random.Random(seed)
+    videos = []
+    for _ in range(n):
+        videos.append({
+            "title": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 12))),
+            "description": "x" * rng.choice([0, 30, 51, 100, 101, 400]),
+            "duration": rng.choice([30, 299, 300, 600, 900, 1200, 1201, 1500, 1501, 1800, 1801, 3600]),
+            "like_count": rng.randint(0, 20000),
+            "dislike_count": rng.choice([0, 10, 500, 5000]),
+            "upload_date": f"2024-0{rng.randint(1, 5)}-{rng.randint(10, 28)}",
+            "tags": ",".join("t" for _ in range(rng.randint(0, 15))),
+        })
+    return videos
+
+
+def _random_predictions(n, seed=11):
+    rng = np.random.default_rng(seed)
+    base = rng.choice([0, 3000, 5000, 8000, 12000, 25000, 60000], size=n).astype(float)
+    spread = rng.choice([0.0, 0.05, 0.15, 0.5], size=n)
+    return {
+        "ridge": base * (1 - spread),
+        "xgboost": base,
+        "lightgbm": base * (1 + spread),
+        "gradient_boosting": base * (1 + spread / 2),
+    }
+
+
+def test_matches_reference_implementation():
+    videos = _random_videos(400)
+    predictions = _random_predictions(len(videos))
+    codes = evaluate(compute_features(to_columns(videos), NOW), [v["title"] for v in videos], predictions)
+    for i, video in enumerate(videos):
+        row_predictions = {name: float(values[i]) for name, values in predictions.items()}
+        expected = reference.generate_detailed_success_factors(
+            video, row_predictions, row_predictions["gradient_boosting"])
+        assert render(codes[i]) == expected, video
+
+
+def test_keyword_matcher_keeps_substring_semantics():
+    matcher = KeywordMatcher({"review": ("review", "test"), "gaming": ("gaming", "game")})
+    flags = matcher.match(["The LATEST phone", "Gaming night", "nothing here", "", "endgame\nreview"])
+    assert flags["review"].tolist() == [True, False, False, False, True]
+    assert flags["gaming"].tolist() == [False, True, False, False, True]
+
+
+def test_codes_are_enumerated(sample_videos):
+    predictions = {"gradient_boosting": np.full(len(sample_videos), 60000.0)}
+    codes = evaluate(compute_features(to_columns(sample_videos), NOW),
+                     [v["title"] for v in sample_videos], predictions)
+    assert codes.dtype == np.int16
+    fired = factor_codes(codes[0])
+    assert FactorCode.PERFORMANCE_VIRAL in fired and FactorCode.KEYWORDS_EDUCATIONAL in fired
+    assert NO_FACTOR not in fired
+    assert FACTOR_TEXT[FactorCode.AGREEMENT_HIGH].startswith("✅ High model agreement")
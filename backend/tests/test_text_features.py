@@ -0,0 +1,91 @@
+import csv
+
+import numpy as np
+import pytest
+
+import cli
+from ml.whatif import build_variant_matrix
+from utils import text_features
+from utils.feature_engineering import (
+    ALL_FEATURE_NAMES, CLEAN_FEATURE_NAMES, build_feature_matrix, compute_features, to_columns,
+)
+from utils.synthetic import generate_videos
+from utils.text_features import EXTENDED_FEATURE_NAMES, PATTERNS, scan_text
+from tests.conftest import NOW
+
+VIDEO = {
+    "title": "How to cook pasta in 10 minutes?",
+    "description": "Step by step guide. Recipe at https://example.com\n0:45 sauce, 3:10 plating. "
+                   "Please subscribe and comment below!",
+    "duration": 600,
+    "like_count": 300,
+    "dislike_count": 10,
+    "comment_count": 60,
+    "upload_date": "2024-05-02",
+    "tags": "pasta,cooking,recipe",
+}
+
+
+def test_documented_features_of_one_video():
+    features = compute_features(to_columns([VIDEO], optional=["comment_count"]), NOW, ALL_FEATURE_NAMES)
+    flags = {name: features[name][0] for name in (
+        "title_has_numbers", "title_has_question", "title_has_exclamation",
+        "title_has_educational_words", "description_has_links", "description_has_timestamps",
+        "description_has_call_to_action")}
+    assert flags == {"title_has_numbers": 1, "title_has_question": 1, "title_has_exclamation": 0,
+                     "title_has_educational_words": 1, "description_has_links": 1,
+                     "description_has_timestamps": 1, "description_has_call_to_action": 1}
+    assert features["description_word_count"][0] == len(VIDEO["description"].split())
+    assert features["comment_velocity"][0] == 60 / 30  # uploaded 30 days before NOW
+    assert features["upload_season"][0] == 1  # May: spring
+    assert features["tag_count"][0] == 3
+    assert 0 <= features["title_readability"][0] <= 100
+
+
+def test_arrow_and_re_count_the_same(monkeypatch):
+    pytest.importorskip("pyarrow")
+    texts = [video["description"] + suffix for video, suffix in zip(
+        generate_videos(300, seed=3),
+        ["", " 1:05 www.site.io ?", "　How  to\tWIN!", " check   out", ""] * 60)]
+    patterns = tuple(PATTERNS)
+    monkeypatch.setattr(text_features, "ARROW_MIN_ROWS", 10 ** 9)
+    expected = scan_text(texts, patterns, lexicon=True)
+    monkeypatch.setattr(text_features, "ARROW_MIN_ROWS", 1)
+    actual = scan_text(texts, patterns, lexicon=True)
+    assert set(actual) == set(expected)
+    for name in expected:
+        np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+    assert expected["educational"][2] >= 1 and expected["call_to_action"][3] >= 1
+
+
+def test_clean_models_skip_extended_features(sample_videos):
+    columns = to_columns(sample_videos)
+    assert set(compute_features(columns, NOW)) == set(CLEAN_FEATURE_NAMES)
+    full = build_feature_matrix(sample_videos, ALL_FEATURE_NAMES, now=NOW)
+    np.testing.assert_array_equal(full[:, :len(CLEAN_FEATURE_NAMES)],
+                                  build_feature_matrix(sample_videos, now=NOW))
+    assert full.shape == (len(sample_videos), len(CLEAN_FEATURE_NAMES) + len(EXTENDED_FEATURE_NAMES))
+
+
+def test_what_if_recomputes_extended_features():
+    names = CLEAN_FEATURE_NAMES + ["title_has_question", "seo_score"]
+    X = build_variant_matrix(VIDEO, [{"title": "Pasta"}, {"tags": ",".join("abcdefghij")}], names, now=NOW)
+    question, seo = names.index("title_has_question"), names.index("seo_score")
+    assert list(X[:, question]) == [1, 0, 1]
+    assert X[2, seo] > X[0, seo]  # 10 tags is in the 8-15 band
+
+
+def test_cli_exports_feature_table(tmp_path):
+    source, out = tmp_path / "videos.csv", tmp_path / "features.csv"
+    rows = [{**VIDEO, "video_id": f"v{i}"} for i in range(5)]
+    with open(source, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    assert cli.main(["features", str(source), "-o", str(out), "--keep", "video_id",
+                     "--keep", "comment_count", "--as-of", NOW.strftime("%Y-%m-%d")]) == 0
+    with open(out) as f:
+        table = list(csv.DictReader(f))
+    assert list(table[0])[:2] == ["video_id", "comment_count"]
+    assert list(table[0])[2:] == ALL_FEATURE_NAMES
+    assert float(table[4]["comment_velocity"]) == 2.0
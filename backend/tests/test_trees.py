@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from ml.trees import ForestStack, float32_input_threshold, from_estimator
+
+TREE_MODELS = ["gradient_boosting", "xgboost", "lightgbm"]
+
+
+@pytest.fixture(scope="module")
+def ensembles(predictor):
+    return {name: from_estimator(predictor.models[name]) for name in TREE_MODELS}
+
+
+@pytest.fixture(scope="module")
+def scaled_rows():
+    return np.random.RandomState(0).randn(3000, 21) * 2
+
+
+@pytest.mark.parametrize("name", TREE_MODELS)
+def test_flat_ensemble_matches_native(name, predictor, ensembles, scaled_rows):
+    native = predictor.models[name]
+    np.testing.assert_allclose(ensembles[name].predict(scaled_rows), native.predict(scaled_rows),
+                               rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("name", TREE_MODELS)
+def test_rows_on_split_boundaries(name, predictor, ensembles, scaled_rows):
+    ensemble = ensembles[name]
+    rs = np.random.RandomState(1)
+    internal = np.flatnonzero(np.isfinite(ensemble.threshold))
+    nodes = rs.choice(internal, size=len(scaled_rows))
+    rows = np.arange(len(scaled_rows))
+    for nudge in (0, np.inf, -np.inf):
+        X = scaled_rows.copy()
+        X[rows, ensemble.feature[nodes]] = np.nextafter(ensemble.threshold[nodes], nudge)
+        np.testing.assert_allclose(ensemble.predict(X), predictor.models[name].predict(X),
+                                   rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("name", ["xgboost", "lightgbm"])
+def test_missing_values_follow_default_direction(name, predictor, ensembles, scaled_rows):
+    X = scaled_rows.copy()
+    X[::3, 3] = np.nan
+    X[1::5, 8] = np.nan
+    np.testing.assert_allclose(ensembles[name].predict(X), predictor.models[name].predict(X),
+                               rtol=0, atol=1e-9)
+
+
+def test_forest_stack_matches_members(ensembles, scaled_rows):
+    stacked = ForestStack(ensembles).predict(scaled_rows)
+    for name, ensemble in ensembles.items():
+        np.testing.assert_array_equal(stacked[name], ensemble.predict(scaled_rows))
+
+
+def test_float32_input_threshold_is_exact():
+    rs = np.random.RandomState(2)
+    thresholds = np.concatenate([rs.randn(200) * 100, [0.0, 1e-40, -3.5, 2.0 ** 24 + 1]])
+    converted = float32_input_threshold(thresholds)
+    probes = np.concatenate([rs.randn(5000) * 100, thresholds,
+                             np.nextafter(thresholds, np.inf), np.nextafter(thresholds, -np.inf),
+                             converted, np.nextafter(converted, np.inf)])
+    for threshold, exact in zip(thresholds, converted):
+        np.testing.assert_array_equal(probes <= exact, probes.astype(np.float32) <= threshold)
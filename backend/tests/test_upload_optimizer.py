@@ -0,0 +1,41 @@
+import time
+
+import numpy as np
+
+from ml.upload_optimizer import build_slot_matrix, optimize_upload_time, slot_grid
+from ml.whatif import build_variant_matrix
+from tests.conftest import NOW
+
+
+def test_grid_covers_every_slot():
+    grid = slot_grid()
+    slots = set(zip(grid["upload_hour"], grid["upload_day_of_week"]))
+    assert len(grid["upload_hour"]) == len(slots) == 168
+    assert len(slot_grid(months=[1, 6, 12])["upload_month"]) == 3 * 168
+
+
+def test_slot_rows_match_what_if_edits(predictor, sample_videos):
+    video = sample_videos[0]
+    grid = slot_grid()
+    X = build_slot_matrix(video, predictor.feature_names, now=NOW)
+    deltas = [{"upload_hour": h, "upload_day_of_week": d}
+              for h, d in zip(grid["upload_hour"][::17], grid["upload_day_of_week"][::17])]
+    expected = build_variant_matrix(video, deltas, predictor.feature_names, now=NOW)[1:]
+    np.testing.assert_allclose(X[::17], expected, rtol=0, atol=1e-15)
+
+
+def test_ranked_slots(predictor, sample_videos):
+    slots = optimize_upload_time(sample_videos[0], predictor, top_k=10, months=[3, 11], now=NOW)
+    assert len(slots) == 10
+    views = [slot["predicted_views"] for slot in slots]
+    assert views == sorted(views, reverse=True)
+    assert {"upload_hour", "weekday", "upload_month", "predictions"} <= set(slots[0])
+    assert slots[0]["predicted_views"] == slots[0]["predictions"]["gradient_boosting"]
+
+
+def test_sweep_is_interactive(predictor, sample_videos):
+    optimize_upload_time(sample_videos[0], predictor, now=NOW)
+    start = time.perf_counter()
+    for _ in range(5):
+        optimize_upload_time(sample_videos[0], predictor, now=NOW)
+    assert (time.perf_counter() - start) / 5 < 0.2  # generous bound; ~few ms on a laptop
@@ -0,0 +1,135 @@
+import asyncio
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+from ml.cache import CachedPredictor, LRUCache
+from ml.predictor import load_clean_models
+from ml.registry import ModelRegistry
+from ml.versioning import (
+    ModelReloader, activate, active_model_path, current_version, list_versions, refresh, warm_start,
+)
+from tests.conftest import NOW
+from utils.synthetic import generate_videos
+
+CLEAN_FILES = ["clean_model_info.pkl", "clean_scaler.pkl", "clean_feature_names.pkl"] + [
+    f"{name}_clean_model.pkl" for name in ("ridge", "xgboost", "lightgbm", "gradient_boosting")]
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    source = ModelRegistry().model_path
+    for name in CLEAN_FILES:
+        shutil.copy2(source / name, tmp_path / name)
+    return tmp_path
+
+
+def _chunks(predictor, n_chunks=3, size=400):
+    """Labelled chunks whose views sit a little above what the models predict."""
+    for seed in range(n_chunks):
+        videos = generate_videos(size, seed=seed)
+        views = predictor.predict_views_batch(videos, now=NOW)["gradient_boosting"] * 1.5
+        yield {key: [video[key] for video in videos] for key in videos[0]}, views
+
+
+def test_warm_start_adds_trees_without_touching_the_original(model_dir):
+    models, scaler, feature_names, _ = load_clean_models(model_dir)
+    X = np.random.default_rng(0).normal(size=(200, len(feature_names)))
+    y = np.random.default_rng(1).normal(8, 1, 200)
+    model = models["lightgbm"]
+    trees = model.booster_.num_trees()
+    refreshed = warm_start(model, X, y, 5)
+    assert refreshed.booster_.num_trees() == trees + 5
+    assert model.booster_.num_trees() == trees
+    assert warm_start(models["ridge"], X, y, 5) is None
+
+
+def test_refresh_writes_and_activates_a_version(model_dir, predictor):
+    report = refresh(_chunks(predictor), model_dir, trees_per_chunk=5, now=NOW, activate_if_better=True)
+    evaluation = report["evaluation"]
+    assert report["rows"] == 1200 and report["chunks"] == 3
+    assert evaluation["gradient_boosting"]["trees_added"] == 15
+    assert evaluation["ridge"]["trees_added"] == 0
+    assert evaluation["gradient_boosting"]["rmse_after"] < evaluation["gradient_boosting"]["rmse_before"]
+    assert report["activated"] and current_version(model_dir) == report["version"]
+    assert active_model_path(model_dir) == model_dir / "versions" / report["version"]
+
+    # The new set compiles and serves like the shipped one
+    refreshed = ModelRegistry(active_model_path(model_dir)).predictor()
+    assert refreshed.model_info["refresh"]["rows"] == 1200
+    assert refreshed.version != ModelRegistry(model_dir).version
+    assert [v["active"] for v in list_versions(model_dir)] == [True]
+
+    activate(None, model_dir)
+    assert active_model_path(model_dir) == model_dir
+    with pytest.raises(ValueError):
+        activate("no-such-version", model_dir)
+
+
+def test_reloader_swaps_without_blocking_inflight_batches(model_dir, predictor, sample_videos):
+    report = refresh(_chunks(predictor, n_chunks=1), model_dir, trees_per_chunk=5, now=NOW)
+    cached = CachedPredictor(ModelRegistry(model_dir).predictor(), cache=LRUCache(100, 60))
+    reloader = ModelReloader(cached, lambda path: ModelRegistry(path).predictor(), model_dir, interval=0)
+    old = cached.predictor
+    assert not reloader.check()  # nothing changed
+
+    # A batch that started on the old version finishes on it
+    started, release = threading.Event(), threading.Event()
+    build_features = old.build_features
+
+    def slow_build_features(videos, now=None):
+        started.set()
+        release.wait(5)
+        return build_features(videos, now)
+
+    old.build_features = slow_build_features
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(views=cached.predict_views_batch(sample_videos, NOW)))
+    worker.start()
+    assert started.wait(5)
+    activate(report["version"], model_dir)
+    assert reloader.check()  # swapped while the batch is still running
+    assert cached.predictor is not old and reloader.loaded_version == report["version"]
+    release.set()
+    worker.join(5)
+    expected = ModelRegistry(model_dir).predictor().predict_views_batch(sample_videos, now=NOW)
+    np.testing.assert_allclose(result["views"]["gradient_boosting"], expected["gradient_boosting"])
+
+    # New requests score on the new version (and miss the old version's cache entries)
+    fresh = cached.predict_views_batch(sample_videos, NOW)["gradient_boosting"]
+    assert not np.allclose(fresh, expected["gradient_boosting"])
+
+
+def test_reloader_keeps_serving_when_a_version_fails_to_load(model_dir, predictor):
+    report = refresh(_chunks(predictor, n_chunks=1), model_dir, trees_per_chunk=5, now=NOW)
+    cached = CachedPredictor(predictor)
+
+    def broken(path):
+        raise OSError("disk went away")
+
+    reloader = ModelReloader(cached, broken, model_dir, interval=0)
+    activate(report["version"], model_dir)
+    assert not reloader.check()
+    assert cached.predictor is predictor and reloader.failures == 1
+    assert not reloader.check()  # the failed version is not retried in a loop
+
+
+def test_reloader_polls_the_pointer(model_dir, predictor):
+    report = refresh(_chunks(predictor, n_chunks=1), model_dir, trees_per_chunk=5, now=NOW)
+    cached = CachedPredictor(predictor)
+    reloader = ModelReloader(cached, lambda path: ModelRegistry(path).predictor(), model_dir,
+                             interval=0.01)
+
+    async def scenario():
+        await reloader.start()
+        activate(report["version"], model_dir)
+        for _ in range(500):
+            if reloader.reloads:
+                break
+            await asyncio.sleep(0.01)
+        await reloader.stop()
+
+    asyncio.run(scenario())
+    assert reloader.reloads == 1 and cached.predictor is not predictor
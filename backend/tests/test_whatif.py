@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from ml.whatif import build_variant_matrix, compare_variants, feature_dependencies, score_variants
+from tests.conftest import NOW
+
+DELTAS = [
+    {"title": "How I Built a $1M Business From Scratch (Full Story)"},
+    {"duration": 1200},
+    {"like_count": 9000, "dislike_count": 10},
+    {"tags": "business,startup,money,entrepreneur,success,motivation"},
+    {"upload_date": "2024-05-04", "description": ""},
+]
+
+
+def test_dependency_map():
+    dependencies = feature_dependencies()
+    assert dependencies["duration"] == ["duration", "duration_minutes", "log_duration"]
+    assert set(dependencies["tags"]) == {"tags_count"}
+    assert "upload_hour_sin" in dependencies["upload_hour"]
+    assert "log_days_since_upload" in dependencies["upload_date"]
+
+
+def test_variants_match_full_rebuild(predictor, sample_videos):
+    video = sample_videos[1]
+    X = build_variant_matrix(video, DELTAS, predictor.feature_names, now=NOW)
+    edited = [video] + [{**video, **delta} for delta in DELTAS]
+    np.testing.assert_array_equal(X, predictor.build_features(edited, NOW))
+
+    views = score_variants(video, DELTAS, predictor, now=NOW)
+    expected = predictor.predict_views_batch(edited, now=NOW)
+    for name in expected:
+        np.testing.assert_allclose(views[name], expected[name], rtol=1e-12)
+
+
+def test_upload_hour_override(predictor, sample_videos):
+    X = build_variant_matrix(sample_videos[0], [{"upload_hour": 18}], predictor.feature_names, now=NOW)
+    column = predictor.feature_names.index
+    assert X[0, column("upload_hour")] == 0
+    assert X[1, column("upload_hour")] == 18
+    assert X[1, column("upload_hour_cos")] == pytest.approx(np.cos(2 * np.pi * 18 / 24))
+
+
+def test_compare_variants_reports_change(predictor, sample_videos):
+    result = compare_variants(sample_videos[0], DELTAS[:2], predictor, now=NOW)
+    variant = result["variants"][1]
+    assert variant["changes"] == {"duration": 1200}
+    for name, views in variant["predictions"].items():
+        assert variant["delta_views"][name] == pytest.approx(views - result["base"][name])
+
+
+def test_unknown_field_is_rejected(predictor, sample_videos):
+    with pytest.raises(ValueError, match="view_count"):
+        build_variant_matrix(sample_videos[0], [{"view_count": 1}], predictor.feature_names, now=NOW)
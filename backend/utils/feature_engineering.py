@@ -0,0 +1,223 @@
+"""
+Vectorized feature engineering for the clean models.
+
+Mirrors ``prepare_video_features`` in test_clean_models.py, but builds the
+whole feature matrix for a batch of videos at once instead of one
+single-row DataFrame per video.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.text_features import EXTENDED_FEATURE_NAMES, extended_features, optional_inputs, scan_text
+
+logger = logging.getLogger(__name__)
+
+# Column order of models/clean_feature_names.pkl
+CLEAN_FEATURE_NAMES = [
+    'duration', 'duration_minutes', 'log_duration', 'like_count',
+    'dislike_count', 'like_ratio', 'engagement_rate', 'title_length',
+    'description_length', 'tags_count', 'title_word_count', 'upload_hour',
+    'upload_day_of_week', 'upload_month', 'is_weekend', 'upload_hour_sin',
+    'upload_hour_cos', 'upload_day_sin', 'upload_day_cos',
+    'days_since_upload', 'log_days_since_upload',
+]
+
+# Clean-model features followed by every extended feature
+ALL_FEATURE_NAMES = CLEAN_FEATURE_NAMES + EXTENDED_FEATURE_NAMES
+
+# Raw video fields consumed by the feature builders
+INPUT_FIELDS = [
+    'title', 'description', 'duration', 'like_count', 'dislike_count',
+    'upload_date', 'tags',
+]
+
+
+def _duration_features(duration):
+    duration = np.asarray(duration, dtype=np.float64)
+    return {
+        'duration': duration,
+        'duration_minutes': duration / 60,
+        'log_duration': np.log1p(duration),
+    }
+
+
+def _engagement_features(like_count, dislike_count):
+    like_count = np.asarray(like_count, dtype=np.float64)
+    dislike_count = np.asarray(dislike_count, dtype=np.float64)
+    return {
+        'like_count': like_count,
+        'dislike_count': dislike_count,
+        'like_ratio': like_count / (like_count + dislike_count + 1),
+        'engagement_rate': (like_count + dislike_count) / 1000,
+    }
+
+
+def _title_features(title):
+    n = len(title)
+    return {
+        'title_length': np.fromiter((len(t) for t in title), np.float64, n),
+        'title_word_count': scan_text(title)['words'],
+    }
+
+
+def _description_features(description):
+    n = len(description)
+    return {
+        'description_length': np.fromiter((len(d) for d in description), np.float64, n),
+    }
+
+
+def _tags_features(tags):
+    n = len(tags)
+    return {
+        'tags_count': np.fromiter(
+            (t.count(',') + 1 if t else 0 for t in tags), np.float64, n
+        ),
+    }
+
+
+def _upload_hour_features(upload_hour):
+    upload_hour = np.asarray(upload_hour, dtype=np.float64)
+    return {
+        'upload_hour': upload_hour,
+        'upload_hour_sin': np.sin(2 * np.pi * upload_hour / 24),
+        'upload_hour_cos': np.cos(2 * np.pi * upload_hour / 24),
+    }
+
+
+def _upload_weekday_features(upload_day_of_week):
+    day_of_week = np.asarray(upload_day_of_week, dtype=np.float64)
+    return {
+        'upload_day_of_week': day_of_week,
+        'is_weekend': (day_of_week >= 5).astype(np.float64),
+        'upload_day_sin': np.sin(2 * np.pi * day_of_week / 7),
+        'upload_day_cos': np.cos(2 * np.pi * day_of_week / 7),
+    }
+
+
+def _upload_date_features(upload_date, now):
+    days = np.asarray(upload_date, dtype='datetime64[D]')
+    # Dates parsed with '%Y-%m-%d' always land on midnight
+    upload_hour = np.zeros(days.shape, dtype=np.float64)
+    day_of_week = ((days.astype(np.int64) + 3) % 7).astype(np.float64)
+    month = (days.astype('datetime64[M]').astype(np.int64) % 12 + 1).astype(np.float64)
+
+    today = np.datetime64(now.date(), 'D')
+    days_since_upload = (today - days).astype(np.int64).astype(np.float64)
+    days_since_upload[days_since_upload == 0] = 1  # Avoid division by zero
+
+    return {
+        **_upload_hour_features(upload_hour),
+        **_upload_weekday_features(day_of_week),
+        'upload_month': month,
+        'days_since_upload': days_since_upload,
+        'log_days_since_upload': np.log1p(days_since_upload),
+    }
+
+
+# (source fields, builder) pairs; each builder returns the derived columns.
+# 'now' is the reference clock rather than a video field.
+FEATURE_GROUPS: List[Tuple[Tuple[str, ...], Callable[..., Dict[str, np.ndarray]]]] = [
+    (('duration',), _duration_features),
+    (('like_count', 'dislike_count'), _engagement_features),
+    (('title',), _title_features),
+    (('description',), _description_features),
+    (('tags',), _tags_features),
+    (('upload_date', 'now'), _upload_date_features),
+]
+
+# Upload-time features that can be set directly, overriding what
+# upload_date implies (what-if edits, upload-time search).
+OVERRIDE_GROUPS: List[Tuple[Tuple[str, ...], Callable[..., Dict[str, np.ndarray]]]] = [
+    (('upload_hour',), _upload_hour_features),
+    (('upload_day_of_week',), _upload_weekday_features),
+]
+
+
+def to_columns(videos: Any, fields: Sequence[str] = INPUT_FIELDS,
+               optional: Sequence[str] = ()) -> Dict[str, Any]:
+    """Normalise a batch of videos into a dict of columns.
+
+    Accepts a list of video dicts, a pandas DataFrame, a pyarrow Table or
+    RecordBatch, or a mapping of column name to array. ``optional``
+    fields are included when the batch has them (``None`` per missing
+    video in a list of dicts).
+    """
+    if hasattr(videos, 'iloc'):  # pandas DataFrame, without importing pandas
+        fields = list(fields) + [field for field in optional if field in videos.columns]
+        return {field: videos[field].to_numpy() for field in fields}
+    if hasattr(videos, 'column_names') and hasattr(videos, 'column'):
+        fields = list(fields) + [field for field in optional if field in videos.column_names]
+        return {
+            field: videos.column(field).to_numpy(zero_copy_only=False)
+            for field in fields
+        }
+    if isinstance(videos, dict):
+        if isinstance(videos.get('title'), str):
+            videos = [videos]  # a single video payload
+        else:
+            fields = list(fields) + [field for field in optional if field in videos]
+            return {field: videos[field] for field in fields}
+    videos = list(videos)
+    columns = {field: [video[field] for video in videos] for field in fields}
+    for field in optional:
+        columns[field] = [video.get(field) for video in videos]
+    return columns
+
+
+def num_rows(columns: Dict[str, Any]) -> int:
+    """Number of rows in a column dict."""
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def slice_columns(columns: Dict[str, Any], start: int, stop: int) -> Dict[str, Any]:
+    """Row-slice every column (views for arrays, copies for lists)."""
+    return {name: values[start:stop] for name, values in columns.items()}
+
+
+def compute_features(columns: Dict[str, Any], now: Optional[datetime] = None,
+                     feature_names: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """Compute the derived feature columns for a column dict.
+
+    Always computes the clean-model features; extended features
+    (``utils.text_features``) only when ``feature_names`` asks for them.
+    """
+    now = now or datetime.now()
+    features = {}
+    for fields, builder in FEATURE_GROUPS:
+        args = [now if field == 'now' else columns[field] for field in fields]
+        features.update(builder(*args))
+    if feature_names is not None:
+        extra = [name for name in feature_names if name not in features]
+        if extra:
+            features.update(extended_features(columns, features, extra))
+    return features
+
+
+def assemble_matrix(features: Dict[str, np.ndarray], feature_names: Sequence[str],
+                    n_rows: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Stack feature columns into a (n_rows, n_features) float64 matrix."""
+    if out is None:
+        out = np.empty((n_rows, len(feature_names)), dtype=np.float64)
+    missing = [name for name in feature_names if name not in features]
+    if missing:
+        logger.warning("Missing features filled with 0: %s", missing)
+    for j, name in enumerate(feature_names):
+        out[:, j] = features[name] if name in features else 0
+    return out
+
+
+def build_feature_matrix(videos: Any, feature_names: Sequence[str] = CLEAN_FEATURE_NAMES,
+                         now: Optional[datetime] = None) -> np.ndarray:
+    """Build the model-ready feature matrix for a batch of videos.
+
+    Pass ``ALL_FEATURE_NAMES`` for every documented feature (retraining).
+    """
+    columns = to_columns(videos, optional=optional_inputs(feature_names))
+    features = compute_features(columns, now, feature_names)
+    return assemble_matrix(features, feature_names, num_rows(columns))
+
@@ -0,0 +1,320 @@
+"""
+Batch success-factor evaluation.
+
+``generate_detailed_success_factors`` in test_clean_models.py walks a
+chain of ``if``/``elif`` branches per video, rescans the title once per
+keyword list and rebuilds every message string. Here the same rules are
+a declarative table: each chain is evaluated for the whole batch with
+``np.select`` over the feature columns, all title keywords are found in
+one regex pass over the batch, and the result is a matrix of enumerated
+``FactorCode`` values. Text is only produced by ``render``, from strings
+built once at import.
+"""
+
+import re
+from enum import IntEnum
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+CATEGORIES = [
+    "Content Optimization",
+    "Timing & Strategy",
+    "Engagement Potential",
+    "SEO & Discoverability",
+    "Performance Insights",
+    "Improvement Recommendations",
+]
+
+# Title keyword lists (substring match on the lower-cased title)
+KEYWORD_GROUPS: Dict[str, Tuple[str, ...]] = {
+    'educational': ('tutorial', 'how to', 'guide', 'learn'),
+    'review': ('review', 'test', 'unboxing'),
+    'trending': ('2024', 'new', 'latest'),
+    'tutorial': ('tutorial', 'how to'),
+    'review_only': ('review',),
+    'gaming': ('gaming', 'game'),
+}
+
+Condition = Optional[Callable[[Mapping[str, np.ndarray]], np.ndarray]]
+
+
+def _between(column: str, low: float, high: float) -> Condition:
+    return lambda c: (c[column] >= low) & (c[column] <= high)
+
+
+def _above(column: str, value: float) -> Condition:
+    return lambda c: c[column] > value
+
+
+def _below(column: str, value: float) -> Condition:
+    return lambda c: c[column] < value
+
+
+def _flag(name: str) -> Condition:
+    return lambda c: c[name]
+
+
+# (category, [(code, condition, text), ...]) - the first true condition of a
+# chain wins; a ``None`` condition is the chain's ``else``. Chains and
+# branches are in the order of generate_detailed_success_factors.
+RULE_CHAINS: List[Tuple[str, List[Tuple[str, Condition, str]]]] = [
+    ("Content Optimization", [
+        ('DURATION_OPTIMAL', _between('duration_minutes', 10, 20),
+         "✅ Optimal duration (10-20 min) - perfect for most content types"),
+        ('DURATION_SHORT', _below('duration_minutes', 5),
+         "⚠️ Short duration - consider adding more value or making it part of a series"),
+        ('DURATION_LONG', _above('duration_minutes', 30),
+         "⚠️ Long duration - ensure high engagement throughout to maintain retention"),
+        ('DURATION_GOOD', None, "✅ Good duration range for your content type"),
+    ]),
+    ("Content Optimization", [
+        ('TITLE_STRONG', _above('title_length', 40),
+         "✅ Strong title length - good for SEO and click-through"),
+        ('TITLE_SHORT', _below('title_length', 20),
+         "⚠️ Short title - consider adding more descriptive keywords"),
+        ('TITLE_ADEQUATE', None, "✅ Adequate title length"),
+    ]),
+    ("Content Optimization", [
+        ('DESCRIPTION_DETAILED', _above('description_length', 100),
+         "✅ Detailed description - excellent for SEO and viewer understanding"),
+        ('DESCRIPTION_GOOD', _above('description_length', 50),
+         "✅ Good description length - provides context"),
+        ('DESCRIPTION_SHORT', None,
+         "⚠️ Short description - consider adding more details about content"),
+    ]),
+    ("Timing & Strategy", [
+        ('UPLOAD_PRIME', _between('upload_hour', 14, 18),
+         "✅ Prime upload time (2-6 PM) - optimal for engagement"),
+        ('UPLOAD_EVENING', _between('upload_hour', 19, 22),
+         "✅ Evening upload time - good for after-work viewing"),
+        ('UPLOAD_MORNING', _between('upload_hour', 9, 13),
+         "✅ Morning upload time - good for early viewers"),
+        ('UPLOAD_OFF_PEAK', None,
+         "⚠️ Off-peak upload time - consider uploading during 2-6 PM for better reach"),
+    ]),
+    ("Timing & Strategy", [
+        ('UPLOAD_WEEKEND', _flag('weekend'),
+         "✅ Weekend upload - good for leisure viewing and binge-watching"),
+        ('UPLOAD_WEEKDAY', None, "✅ Weekday upload - good for regular content schedule"),
+    ]),
+    ("Engagement Potential", [
+        ('LIKE_RATIO_EXCELLENT', _above('like_ratio', 0.9),
+         "✅ Excellent like ratio - very positive reception expected"),
+        ('LIKE_RATIO_HIGH', _above('like_ratio', 0.8),
+         "✅ High like ratio - strong positive engagement"),
+        ('LIKE_RATIO_GOOD', _above('like_ratio', 0.7), "✅ Good like ratio - positive reception"),
+        ('LIKE_RATIO_MODERATE', _above('like_ratio', 0.5),
+         "⚠️ Moderate like ratio - mixed reception expected"),
+        ('LIKE_RATIO_LOW', None, "⚠️ Low like ratio - may need content adjustment"),
+    ]),
+    ("Engagement Potential", [
+        ('ENGAGEMENT_HIGH', _above('engagement_rate', 10),
+         "✅ High engagement rate - strong viewer interaction expected"),
+        ('ENGAGEMENT_GOOD', _above('engagement_rate', 5),
+         "✅ Good engagement rate - decent viewer interaction"),
+        ('ENGAGEMENT_LOW', None, "⚠️ Low engagement rate - consider improving content appeal"),
+    ]),
+    ("SEO & Discoverability", [
+        ('TAGS_EXCELLENT', _above('tags_count', 10),
+         "✅ Excellent tag coverage - great for discoverability"),
+        ('TAGS_GOOD', _above('tags_count', 5), "✅ Good tag coverage - helps with search visibility"),
+        ('TAGS_MODERATE', _above('tags_count', 2),
+         "⚠️ Moderate tag coverage - consider adding more relevant tags"),
+        ('TAGS_LOW', None, "⚠️ Low tag coverage - add more tags for better discoverability"),
+    ]),
+    ("SEO & Discoverability", [
+        ('KEYWORDS_EDUCATIONAL', _flag('kw_educational'),
+         "✅ Educational keywords in title - great for long-term views"),
+    ]),
+    ("SEO & Discoverability", [
+        ('KEYWORDS_REVIEW', _flag('kw_review'),
+         "✅ Review keywords in title - high engagement potential"),
+    ]),
+    ("SEO & Discoverability", [
+        ('KEYWORDS_TRENDING', _flag('kw_trending'),
+         "✅ Trending keywords in title - good for current relevance"),
+    ]),
+    ("Performance Insights", [
+        ('PERFORMANCE_VIRAL', _above('best_prediction', 50000),
+         "🚀 HIGH VIRAL POTENTIAL - This could be a breakout video!"),
+        ('PERFORMANCE_STRONG', _above('best_prediction', 20000),
+         "📈 STRONG PERFORMANCE - Expected to perform very well"),
+        ('PERFORMANCE_GOOD', _above('best_prediction', 10000),
+         "✅ GOOD PERFORMANCE - Solid view count expected"),
+        ('PERFORMANCE_MODERATE', _above('best_prediction', 5000),
+         "📊 MODERATE PERFORMANCE - Decent view count expected"),
+        ('PERFORMANCE_LOW', None, "⚠️ LOW PERFORMANCE - May need optimization"),
+    ]),
+    ("Performance Insights", [
+        ('AGREEMENT_HIGH', _below('model_cv', 0.1),
+         "✅ High model agreement - prediction is very reliable"),
+        ('AGREEMENT_GOOD', _below('model_cv', 0.2),
+         "✅ Good model agreement - prediction is reliable"),
+        ('AGREEMENT_MIXED', None,
+         "⚠️ Mixed model predictions - consider multiple scenarios"),
+    ]),
+    ("Improvement Recommendations", [
+        ('IMPROVE_DURATION_LONGER', _below('duration_minutes', 10),
+         "💡 Consider extending content to 10-15 minutes for better retention"),
+        ('IMPROVE_DURATION_SPLIT', _above('duration_minutes', 25),
+         "💡 Consider breaking into shorter segments or series"),
+    ]),
+    ("Improvement Recommendations", [
+        ('IMPROVE_TITLE', _below('title_length', 30),
+         "💡 Add more descriptive keywords to title for better SEO"),
+    ]),
+    ("Improvement Recommendations", [
+        ('IMPROVE_DESCRIPTION', _below('description_length', 100),
+         "💡 Expand description with timestamps, key points, and call-to-action"),
+    ]),
+    ("Improvement Recommendations", [
+        ('IMPROVE_TAGS', _below('tags_count', 8), "💡 Add more relevant tags (aim for 8-15 tags)"),
+    ]),
+    ("Improvement Recommendations", [
+        ('IMPROVE_UPLOAD_TIME', lambda c: ~c['weekend'] & (c['upload_hour'] < 14),
+         "💡 Consider uploading between 2-6 PM on weekdays for better reach"),
+    ]),
+    ("Improvement Recommendations", [
+        ('IMPROVE_ENGAGEMENT', _below('like_ratio', 0.8),
+         "💡 Focus on creating more engaging, valuable content"),
+    ]),
+    ("Improvement Recommendations", [
+        ('IMPROVE_TUTORIAL', _flag('kw_tutorial'),
+         "💡 For tutorials: Add clear step-by-step structure and timestamps"),
+        ('IMPROVE_REVIEW', _flag('kw_review_only'),
+         "💡 For reviews: Include pros/cons, rating, and comparison with alternatives"),
+        ('IMPROVE_GAMING', _flag('kw_gaming'),
+         "💡 For gaming: Focus on exciting moments and clear commentary"),
+    ]),
+]
+
+FactorCode = IntEnum('FactorCode', [code for _, chain in RULE_CHAINS for code, _, _ in chain], start=0)
+FACTOR_TEXT = [text for _, chain in RULE_CHAINS for _, _, text in chain]
+FACTOR_CATEGORY = [category for category, chain in RULE_CHAINS for _ in chain]
+
+NO_FACTOR = -1
+
+
+class KeywordMatcher:
+    """Finds every keyword group in a batch of texts with one regex pass.
+
+    Texts are lower-cased and joined with newlines; a zero-width lookahead
+    alternation reports (possibly overlapping) matches at every position,
+    which are mapped back to rows with ``searchsorted``. This keeps the
+    substring semantics of ``word in title_lower`` (e.g. 'latest' also
+    contains 'test').
+    """
+
+    def __init__(self, groups: Mapping[str, Sequence[str]]):
+        self.groups = list(groups)
+        keywords = sorted({k for words in groups.values() for k in words}, key=len, reverse=True)
+        # Longest keyword first; the shorter keywords it starts with are implied
+        self._pattern = re.compile('(?=(' + '|'.join(re.escape(k) for k in keywords) + '))')
+        self._masks = {
+            keyword: sum(1 << bit for bit, name in enumerate(self.groups)
+                         if any(keyword.startswith(word) for word in groups[name]))
+            for keyword in keywords
+        }
+
+    def match(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Boolean column per keyword group."""
+        lowered = [text.lower() for text in texts]
+        ends = np.cumsum(np.fromiter((len(t) + 1 for t in lowered), np.int64, len(lowered)))
+        positions, masks = [], []
+        for m in self._pattern.finditer('\n'.join(lowered)):
+            positions.append(m.start())
+            masks.append(self._masks[m.group(1)])
+        bits = np.zeros(len(lowered), dtype=np.int64)
+        if positions:
+            rows = np.searchsorted(ends, positions, side='right')
+            np.bitwise_or.at(bits, rows, np.asarray(masks, dtype=np.int64))
+        return {name: (bits >> bit) & 1 == 1 for bit, name in enumerate(self.groups)}
+
+
+_keyword_matcher = KeywordMatcher(KEYWORD_GROUPS)
+
+# (chain index, [(condition, code)], default code) compiled once
+_COMPILED_CHAINS = []
+_next_code = 0
+for _category, _chain in RULE_CHAINS:
+    _branches, _default = [], NO_FACTOR
+    for _, _condition, _ in _chain:
+        if _condition is None:
+            _default = _next_code
+        else:
+            _branches.append((_condition, _next_code))
+        _next_code += 1
+    _COMPILED_CHAINS.append((_branches, _default))
+
+
+def best_prediction(predictions: Mapping[str, np.ndarray]) -> np.ndarray:
+    """Headline prediction: gradient boosting, else the first model.
+
+    Rows where gradient boosting did not run (NaN, see ml/cascade.py) take
+    the first model that did.
+    """
+    if 'gradient_boosting' not in predictions:
+        return np.asarray(next(iter(predictions.values())), dtype=np.float64)
+    best = np.array(predictions['gradient_boosting'], dtype=np.float64)
+    for views in predictions.values():
+        missing = np.isnan(best)
+        if not missing.any():
+            break
+        best[missing] = np.asarray(views, dtype=np.float64)[missing]
+    return best
+
+
+def evaluate(features: Mapping[str, np.ndarray], titles: Sequence[str],
+             predictions: Mapping[str, np.ndarray],
+             best: Optional[np.ndarray] = None) -> np.ndarray:
+    """Factor codes for a batch, shape (n_videos, n_chains).
+
+    ``features`` are the feature columns from ``compute_features`` (or
+    ``feature_columns`` of a feature matrix); ``predictions`` the per-model
+    predicted views. Entry ``[i, j]`` is the ``FactorCode`` chosen by chain
+    ``j`` for video ``i``, or ``NO_FACTOR``.
+    """
+    views = np.column_stack([np.asarray(p, dtype=np.float64) for p in predictions.values()])
+    missing = np.isnan(views)
+    if missing.any():
+        # Cascade rows scored by one model have no agreement to report (NaN cv)
+        mean = np.nanmean(views, axis=1)
+        std = np.where((~missing).sum(axis=1) > 1, np.nanstd(views, axis=1), np.nan)
+    else:
+        mean = views.mean(axis=1)
+        std = views.std(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        model_cv = np.where(mean > 0, std / mean, 0.0)
+
+    columns = dict(features)
+    columns['weekend'] = np.asarray(features['is_weekend']) >= 1
+    columns['best_prediction'] = best_prediction(predictions) if best is None else best
+    columns['model_cv'] = model_cv
+    for group, flags in _keyword_matcher.match(titles).items():
+        columns[f'kw_{group}'] = flags
+
+    codes = np.empty((len(titles), len(_COMPILED_CHAINS)), dtype=np.int16)
+    for j, (branches, default) in enumerate(_COMPILED_CHAINS):
+        codes[:, j] = np.select([condition(columns) for condition, _ in branches],
+                                [code for _, code in branches], default)
+    return codes
+
+
+def feature_columns(X: np.ndarray, feature_names: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Column views of a feature matrix, by feature name."""
+    return {name: X[:, j] for j, name in enumerate(feature_names)}
+
+
+def factor_codes(row: np.ndarray) -> List[FactorCode]:
+    """The factors that fired for one video."""
+    return [FactorCode(code) for code in row.tolist() if code != NO_FACTOR]
+
+
+def render(row: np.ndarray) -> Dict[str, List[str]]:
+    """Messages for one video, in the format of generate_detailed_success_factors."""
+    factors: Dict[str, List[str]] = {category: [] for category in CATEGORIES}
+    for code in row.tolist():
+        if code != NO_FACTOR:
+            factors[FACTOR_CATEGORY[code]].append(FACTOR_TEXT[code])
+    return factors
@@ -0,0 +1,87 @@
+"""
+Synthetic video generator for benchmarks, tests and distillation.
+
+Length distributions are log-normal around typical YouTube values: ~55
+character titles, ~600 character descriptions (many empty), ~8 tags,
+~10 minute videos, likes spanning several orders of magnitude.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+_WORDS = np.array([
+    'how', 'to', 'tutorial', 'guide', 'learn', 'review', 'unboxing', 'test', 'new',
+    'latest', '2024', 'best', 'top', 'epic', 'gaming', 'game', 'python', 'iphone',
+    'vlog', 'day', 'in', 'my', 'life', 'minecraft', 'recipe', 'easy', 'quick',
+    'music', 'live', 'official', 'video', 'beginners', 'full', 'course', 'vs',
+])
+
+
+def _lognormal_int(rng: np.random.Generator, median: float, sigma: float, n: int,
+                   low: int = 0, high: int = 10**9) -> np.ndarray:
+    return np.clip(rng.lognormal(np.log(median), sigma, n), low, high).astype(np.int64)
+
+
+def _text(rng: np.random.Generator, length: int) -> str:
+    words = []
+    size = 0
+    while size < length:
+        word = _WORDS[rng.integers(len(_WORDS))]
+        words.append(word.title() if rng.random() < 0.3 else word)
+        size += len(word) + 1
+    return ' '.join(words)[:length]
+
+
+def generate_videos(n: int, seed: int = 0, today: date = date(2024, 6, 1)) -> List[Dict[str, object]]:
+    """``n`` video dicts in the input format of the prediction API."""
+    rng = np.random.default_rng(seed)
+    title_lengths = _lognormal_int(rng, 55, 0.35, n, 5, 100)
+    description_lengths = np.where(rng.random(n) < 0.15, 0,
+                                   _lognormal_int(rng, 600, 1.0, n, 1, 5000))
+    tag_counts = np.minimum(rng.poisson(8, n), 30)
+    durations = _lognormal_int(rng, 600, 0.9, n, 15, 4 * 3600)
+    likes = _lognormal_int(rng, 800, 2.0, n, 0, 5_000_000)
+    dislikes = (likes * rng.beta(1, 30, n)).astype(np.int64)
+    ages = rng.integers(0, 730, n)
+
+    videos = []
+    for i in range(n):
+        videos.append({
+            'title': _text(rng, int(title_lengths[i])),
+            'description': _text(rng, int(description_lengths[i])),
+            'duration': int(durations[i]),
+            'like_count': int(likes[i]),
+            'dislike_count': int(dislikes[i]),
+            'upload_date': (today - timedelta(days=int(ages[i]))).isoformat(),
+            'tags': ','.join(_WORDS[rng.integers(len(_WORDS), size=int(tag_counts[i]))]),
+        })
+    return videos
+
+
+def generate_columns(n: int, seed: int = 0, today: date = date(2024, 6, 1),
+                     text_pool: int = 2000) -> Dict[str, np.ndarray]:
+    """``n`` videos as a dict of NumPy columns (see ``to_columns``).
+
+    Same distributions as ``generate_videos``, but titles, descriptions and
+    tags are drawn from a pool of ``text_pool`` generated texts, which makes
+    millions of rows cheap to produce.
+    """
+    rng = np.random.default_rng(seed)
+    pool = generate_videos(min(text_pool, n), seed=seed + 1, today=today)
+    durations = _lognormal_int(rng, 600, 0.9, n, 15, 4 * 3600)
+    likes = _lognormal_int(rng, 800, 2.0, n, 0, 5_000_000)
+    dislikes = (likes * rng.beta(1, 30, n)).astype(np.int64)
+    ages = rng.integers(0, 730, n)
+    columns = {
+        field: np.array([video[field] for video in pool], dtype=object)[rng.integers(len(pool), size=n)]
+        for field in ('title', 'description', 'tags')
+    }
+    columns.update({
+        'duration': durations,
+        'like_count': likes,
+        'dislike_count': dislikes,
+        'upload_date': np.datetime64(today, 'D') - ages.astype('timedelta64[D]'),
+    })
+    return columns
@@ -0,0 +1,346 @@
+"""
+The documented feature set beyond the 21 clean-model features.
+
+categories.md documents 50+ features; ``feature_engineering`` computes
+the 21 in ``CLEAN_FEATURE_NAMES``. This module adds the rest of the
+documented features that can be derived from a video's own fields, for
+models retrained on them:
+
+* content: ``title_has_numbers``, ``title_has_question``,
+  ``title_has_exclamation``, ``description_word_count``,
+  ``description_has_links``, ``description_has_timestamps``
+* engagement: ``dislike_ratio``, ``like_velocity``, ``comment_velocity``
+* temporal: ``upload_season``
+* SEO: ``tag_count``, keyword densities and flags,
+  ``description_has_call_to_action``, ``seo_score``
+* quality: sentiment, Flesch readability, ``description_completeness``
+
+Each text field is lowercased and tokenized once per batch by
+``scan_text``. Keyword, phrase and syllable counts come from the
+batch's distinct tokens and are spread back to the rows with
+``np.bincount``. The few remaining regexes run through pyarrow.compute
+for large batches, or as compiled ``re`` patterns otherwise.
+``compute_features`` only calls ``extended_features`` for names a model
+actually uses, so the 21-feature models pay nothing.
+
+Not computed: the channel features (a prediction request carries no
+channel statistics), the AI topic features, and composites the document
+gives no formula for (``engagement_quality``, ``viral_potential``,
+``title_clarity``, ``content_quality_score``, ``overall_quality_score``).
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Batches at least this large run their regexes through pyarrow.compute;
+# below that the conversion to Arrow costs more than it saves.
+ARROW_MIN_ROWS = 2048
+
+TRENDING_WORDS = ('trending', 'viral', 'challenge', 'reaction', 'new', 'latest', 'update',
+                  'breaking', 'live', 'official', 'exposed', 'vs')
+EDUCATIONAL_WORDS = ('how to', 'tutorial', 'guide', 'learn', 'learning', 'explained', 'lesson',
+                     'course', 'tips', 'beginner', 'beginners', 'introduction', 'step by')
+EMOTIONAL_WORDS = ('amazing', 'incredible', 'shocking', 'insane', 'unbelievable', 'epic',
+                   'awesome', 'crazy', 'heartbreaking', 'hilarious', 'emotional', 'best', 'worst')
+CALL_TO_ACTION = ('subscribe', 'like and', 'comment below', 'comment down', 'share',
+                  'follow', 'click', 'check out', 'sign up', 'join', 'download', 'link in',
+                  'link below')
+POSITIVE_WORDS = ('good', 'great', 'best', 'love', 'amazing', 'awesome', 'beautiful', 'easy',
+                  'happy', 'fun', 'perfect', 'incredible', 'win', 'success', 'wonderful')
+NEGATIVE_WORDS = ('bad', 'worst', 'hate', 'fail', 'failed', 'terrible', 'awful', 'sad',
+                  'wrong', 'ugly', 'broken', 'scam', 'never', 'problem', 'disaster')
+
+# Word lists counted per text; entries are single tokens or two-token phrases
+LEXICON: Dict[str, Tuple[str, ...]] = {
+    'trending': TRENDING_WORDS,
+    'educational': EDUCATIONAL_WORDS,
+    'emotional': EMOTIONAL_WORDS,
+    'call_to_action': CALL_TO_ACTION,
+    'positive': POSITIVE_WORDS,
+    'negative': NEGATIVE_WORDS,
+}
+
+# Regexes run on the lowercased text, written in the subset RE2 (Arrow)
+# and ``re`` agree on; ``re`` uses re.ASCII to match RE2's \b, \d and \s.
+PATTERNS: Dict[str, str] = {
+    'digits': r'\d+',
+    'question_end': r'\?\s*$',
+    'exclamation_end': r'!\s*$',
+    'links': r'https?://|www\.',
+    'timestamps': r'\b\d{1,2}:\d{2}\b',
+    'sentences': r'[.!?]+',
+}
+_COMPILED = {name: re.compile(pattern, re.ASCII) for name, pattern in PATTERNS.items()}
+# Substrings every match contains; ``re`` skips texts without any of them
+_REQUIRED = {'question_end': ('?',), 'exclamation_end': ('!',), 'links': ('http', 'www.'),
+             'timestamps': (':',)}
+
+# Tokens are runs of these characters in the lowercased text
+_TOKEN = re.compile(r"[a-z0-9']+")
+_SEPARATOR = r"[^a-z0-9']+"
+_VOWEL_GROUPS = re.compile(r'[aeiouy]+')
+
+_CATEGORIES = list(LEXICON)
+_PHRASES = sorted({tuple(entry.split()) for words in LEXICON.values() for entry in words
+                   if ' ' in entry})
+_PHRASE_WORDS = {word: i for i, word in enumerate(sorted({w for phrase in _PHRASES for w in phrase}))}
+# Per category, the phrase codes ``first * len(_PHRASE_WORDS) + second``
+_PHRASE_CODES = {
+    category: np.array([_PHRASE_WORDS[a] * len(_PHRASE_WORDS) + _PHRASE_WORDS[b]
+                        for a, b in (tuple(entry.split()) for entry in words if ' ' in entry)],
+                       dtype=np.int64)
+    for category, words in LEXICON.items()
+}
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_info(token: str) -> Tuple[float, ...]:
+    """(syllables, one flag per lexicon category, phrase word id or -1)."""
+    flags = [float(token in LEXICON[category]) for category in _CATEGORIES]
+    return (float(len(_VOWEL_GROUPS.findall(token))), *flags,
+            float(_PHRASE_WORDS.get(token, -1)))
+
+
+def _lexicon_counts(codes: np.ndarray, parents: np.ndarray, vocabulary: Sequence[str],
+                    n_rows: int) -> Dict[str, np.ndarray]:
+    """Per-text syllable and lexicon counts from a batch's flattened tokens.
+
+    ``codes`` index ``vocabulary`` (the batch's distinct tokens), and
+    ``parents`` give the text each token came from, in text order.
+    """
+    info = np.array([_token_info(token) for token in vocabulary], dtype=np.float64)
+    info = info.reshape(len(vocabulary), len(_CATEGORIES) + 2)[codes]
+    counts = {'syllables': np.bincount(parents, info[:, 0], n_rows)}
+    for k, category in enumerate(_CATEGORIES, 1):
+        counts[category] = np.bincount(parents, info[:, k], n_rows)
+
+    # Two-token phrases: consecutive tokens of the same text
+    word_id = info[:, -1].astype(np.int64)
+    pairs = (parents[1:] == parents[:-1]) & (word_id[:-1] >= 0) & (word_id[1:] >= 0)
+    if pairs.any():
+        pair_codes = word_id[:-1][pairs] * len(_PHRASE_WORDS) + word_id[1:][pairs]
+        pair_parents = parents[:-1][pairs]
+        for category, phrase_codes in _PHRASE_CODES.items():
+            hits = np.isin(pair_codes, phrase_codes)
+            counts[category] += np.bincount(pair_parents[hits], minlength=n_rows)
+    return counts
+
+
+def _arrow_compute() -> Optional[Tuple[Any, Any]]:
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return None
+    return pa, pc
+
+
+def _scan_python(texts: Sequence[str], patterns: Sequence[str],
+                 lexicon: bool) -> Dict[str, np.ndarray]:
+    n = len(texts)
+    compiled = [(_COMPILED[name].findall, _REQUIRED.get(name, ('',))) for name in patterns]
+    pattern_counts = []
+    vocabulary: Dict[str, int] = {}
+    codes: List[int] = []
+    parents: List[int] = []
+    for i, text in enumerate(texts):
+        lower = text.lower()
+        pattern_counts.append([len(findall(lower)) if any(s in lower for s in required) else 0
+                               for findall, required in compiled])
+        if lexicon:
+            tokens = _TOKEN.findall(lower)
+            codes.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            parents.extend([i] * len(tokens))
+    counts = np.array(pattern_counts, dtype=np.float64).reshape(n, len(patterns)).T
+    result = dict(zip(patterns, counts))
+    if lexicon:
+        result.update(_lexicon_counts(np.array(codes, dtype=np.int64), np.array(parents, dtype=np.int64),
+                                      list(vocabulary), n))
+    return result
+
+
+def _scan_arrow(texts: Sequence[str], patterns: Sequence[str],
+                lexicon: bool) -> Dict[str, np.ndarray]:
+    pa, pc = _arrow_compute()
+    lower = pc.utf8_lower(pa.array(texts, type=pa.string()))
+    result = {name: pc.count_substring_regex(lower, PATTERNS[name]).to_numpy().astype(np.float64)
+              for name in patterns}
+    if lexicon:
+        pieces = pc.split_pattern_regex(lower, _SEPARATOR)
+        parents = pc.list_parent_indices(pieces)
+        tokens = pc.list_flatten(pieces)
+        nonempty = pc.greater(pc.utf8_length(tokens), 0)  # leading/trailing separators
+        tokens = pc.filter(tokens, nonempty).dictionary_encode()
+        parents = pc.filter(parents, nonempty).to_numpy().astype(np.int64)
+        result.update(_lexicon_counts(tokens.indices.to_numpy().astype(np.int64), parents,
+                                      tokens.dictionary.to_pylist(), len(texts)))
+    return result
+
+
+def scan_text(texts: Any, patterns: Sequence[str] = (), words: bool = True,
+              lexicon: bool = False) -> Dict[str, np.ndarray]:
+    """Counts for a column of strings, each text tokenized once.
+
+    Returns ``words`` (as ``len(text.split())``) when requested, one
+    match count per ``PATTERNS`` name, and with ``lexicon`` one count per
+    ``LEXICON`` category plus ``syllables``.
+    """
+    n = len(texts)
+    result = {}
+    if words:
+        result['words'] = np.fromiter((len(text.split()) for text in texts), np.float64, n)
+    if patterns or lexicon:
+        scan = _scan_arrow if n >= ARROW_MIN_ROWS and _arrow_compute() is not None else _scan_python
+        result.update(scan(texts, patterns, lexicon))
+    return result
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return numerator / np.maximum(denominator, 1)
+
+
+def _flesch(n_words: np.ndarray, sentences: np.ndarray, syllables: np.ndarray) -> np.ndarray:
+    """Flesch reading ease, clipped to [0, 100]; 0 for empty text."""
+    score = 206.835 - 1.015 * _ratio(n_words, sentences) - 84.6 * _ratio(syllables, n_words)
+    return np.where(n_words > 0, np.clip(score, 0, 100), 0.0)
+
+
+def _sentiment(positive: np.ndarray, negative: np.ndarray) -> np.ndarray:
+    """Lexicon polarity in [-1, 1]; 0 without sentiment words."""
+    return (positive - negative) / np.maximum(positive + negative, 1)
+
+
+def _keyword_hits(stats: Dict[str, np.ndarray]) -> np.ndarray:
+    return stats['trending'] + stats['educational'] + stats['emotional']
+
+
+def _title_text_features(columns, features):
+    stats = scan_text(columns['title'], ('digits', 'question_end', 'exclamation_end', 'sentences'),
+                      words=False, lexicon=True)
+    n_words = features['title_word_count']
+    return {
+        'title_has_numbers': (stats['digits'] > 0).astype(np.float64),
+        'title_has_question': (stats['question_end'] > 0).astype(np.float64),
+        'title_has_exclamation': (stats['exclamation_end'] > 0).astype(np.float64),
+        'title_has_trending_words': (stats['trending'] > 0).astype(np.float64),
+        'title_has_educational_words': (stats['educational'] > 0).astype(np.float64),
+        'title_has_emotional_words': (stats['emotional'] > 0).astype(np.float64),
+        'title_keyword_density': _ratio(_keyword_hits(stats), n_words),
+        'title_sentiment': _sentiment(stats['positive'], stats['negative']),
+        'title_readability': _flesch(n_words, stats['sentences'], stats['syllables']),
+    }
+
+
+def _description_text_features(columns, features):
+    stats = scan_text(columns['description'], ('links', 'timestamps', 'sentences'), lexicon=True)
+    has_links = (stats['links'] > 0).astype(np.float64)
+    has_timestamps = (stats['timestamps'] > 0).astype(np.float64)
+    has_cta = (stats['call_to_action'] > 0).astype(np.float64)
+    return {
+        'description_word_count': stats['words'],
+        'description_has_links': has_links,
+        'description_has_timestamps': has_timestamps,
+        'description_has_call_to_action': has_cta,
+        'description_keyword_density': _ratio(_keyword_hits(stats), stats['words']),
+        'description_sentiment': _sentiment(stats['positive'], stats['negative']),
+        'description_readability': _flesch(stats['words'], stats['sentences'], stats['syllables']),
+        # Share of: 100+ characters, links, timestamps, a call to action
+        'description_completeness': ((features['description_length'] >= 100)
+                                     + has_links + has_timestamps + has_cta) / 4,
+    }
+
+
+def _comment_count(columns, n_rows):
+    values = columns.get('comment_count')
+    if values is None:
+        return np.zeros(n_rows)
+    # Optional in the API and in exports: unknown counts as 0
+    return np.array([0 if v is None or v == '' or v != v else v for v in values], dtype=np.float64)
+
+
+def _engagement_extra_features(columns, features):
+    like_count, dislike_count = features['like_count'], features['dislike_count']
+    days = features['days_since_upload']
+    return {
+        'dislike_ratio': dislike_count / (like_count + dislike_count + 1),
+        'like_velocity': like_count / days,
+        'comment_velocity': _comment_count(columns, len(days)) / days,
+    }
+
+
+def _season_features(columns, features):
+    # 0 winter (Dec-Feb), 1 spring, 2 summer, 3 fall (northern hemisphere)
+    return {'upload_season': (features['upload_month'] % 12) // 3}
+
+
+def _seo_features(columns, features):
+    title_length, tags = features['title_length'], features['tags_count']
+    # Share of the categories.md checklist: title 40-60 characters, description
+    # 100+ characters, 8-15 tags, keywords in the title, links in the description
+    checks = ((title_length >= 40) & (title_length <= 60),
+              features['description_length'] >= 100,
+              (tags >= 8) & (tags <= 15),
+              features['title_keyword_density'] > 0,
+              features['description_has_links'] > 0)
+    return {
+        'tag_count': tags,
+        'seo_score': np.mean(checks, axis=0),
+    }
+
+
+Builder = Callable[[Dict[str, Any], Dict[str, np.ndarray]], Dict[str, np.ndarray]]
+
+# (outputs, extended features the builder reads, builder), in dependency
+# order. Builders read the raw columns and the features computed so far.
+EXTENDED_GROUPS: List[Tuple[Tuple[str, ...], Tuple[str, ...], Builder]] = [
+    (('title_has_numbers', 'title_has_question', 'title_has_exclamation',
+      'title_has_trending_words', 'title_has_educational_words', 'title_has_emotional_words',
+      'title_keyword_density', 'title_sentiment', 'title_readability'), (), _title_text_features),
+    (('description_word_count', 'description_has_links', 'description_has_timestamps',
+      'description_has_call_to_action', 'description_keyword_density', 'description_sentiment',
+      'description_readability', 'description_completeness'), (), _description_text_features),
+    (('dislike_ratio', 'like_velocity', 'comment_velocity'), (), _engagement_extra_features),
+    (('upload_season',), (), _season_features),
+    (('tag_count', 'seo_score'), ('title_keyword_density', 'description_has_links'), _seo_features),
+]
+
+EXTENDED_FEATURE_NAMES = [name for outputs, _, _ in EXTENDED_GROUPS for name in outputs]
+
+# Video fields read by the extended features that are not model inputs
+OPTIONAL_FIELDS = ('comment_count',)
+
+
+def _plan(names: Iterable[str]) -> List[Tuple[Tuple[str, ...], Tuple[str, ...], Builder]]:
+    """Groups needed for ``names``, prerequisites included, in dependency order."""
+    wanted: Set[str] = set(names)
+    needed = []
+    for group in reversed(EXTENDED_GROUPS):
+        outputs, requires, _ = group
+        if wanted.intersection(outputs):
+            needed.append(group)
+            wanted.update(requires)
+    return needed[::-1]
+
+
+def optional_inputs(feature_names: Sequence[str]) -> Tuple[str, ...]:
+    """Optional video fields a model with ``feature_names`` reads."""
+    return OPTIONAL_FIELDS if 'comment_velocity' in feature_names else ()
+
+
+def extended_features(columns: Dict[str, Any], features: Dict[str, np.ndarray],
+                      names: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Extended feature columns covering ``names``.
+
+    ``features`` must hold the clean-model features of the same rows.
+    Names outside ``EXTENDED_FEATURE_NAMES`` are ignored.
+    """
+    computed = dict(features)
+    extended = {}
+    for _, _, builder in _plan(names):
+        columns_out = builder(columns, computed)
+        computed.update(columns_out)
+        extended.update(columns_out)
+    return extended
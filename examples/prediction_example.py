@@ -6,8 +6,13 @@ Shows exactly what the system will output for users
 import pandas as pd
 import numpy as np
 import joblib
+import json
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'backend'))
+from utils.feature_engineering import CLEAN_FEATURE_NAMES, build_feature_matrix  # noqa: E402
+
 class VideoPredictionExample:
     """Example of what the video prediction system will output"""
     
@@ -27,6 +32,17 @@ class VideoPredictionExample:
             print("⚠️  Models not found, using mock data for demonstration")
             self.model = None
             self.scaler = None
+        self.intervals = None
+        intervals_path = Path(__file__).resolve().parents[1] / 'models' / 'clean_intervals.json'
+        if intervals_path.exists():
+            self.intervals = json.loads(intervals_path.read_text())['models']['gradient_boosting']
+    
+    def interval_bounds(self, log_prediction, level=0.8):
+        """Log-scale bounds: the prediction plus or minus its bin's conformal quantile"""
+        edges = np.asarray(self.intervals['edges'])
+        half_width = self.intervals['quantiles'][f'{level:g}'][
+            int(np.searchsorted(edges[1:-1], log_prediction, side='right'))]
+        return log_prediction - half_width, log_prediction + half_width
     
     def create_sample_video_input(self):
         """Create sample video input data"""
@@ -64,36 +80,11 @@ class VideoPredictionExample:
         ]
         return sample_videos
     
-    def process_video_features(self, video_data):
-        """Process video data into features for prediction"""
-        # This would be the actual feature engineering pipeline
-        # For demo purposes, we'll create mock features
-        
-        features = {
-            'duration': video_data['duration'],
-            'duration_minutes': video_data['duration'] / 60,
-            'log_duration': np.log1p(video_data['duration']),
-            'like_count': video_data['like_count'],
-            'dislike_count': video_data['dislike_count'],
-            'like_ratio': video_data['like_count'] / (video_data['like_count'] + video_data['dislike_count'] + 1),
-            'engagement_rate': (video_data['like_count'] + video_data['dislike_count']) / 1000,  # Mock view count
-            'title_length': len(video_data['title']),
-            'description_length': len(video_data['description']),
-            'tags_count': len(video_data['tags'].split(',')),
-            'title_word_count': len(video_data['title'].split()),
-            'upload_hour': 14,  # Mock upload hour
-            'upload_day_of_week': 1,  # Mock day
-            'upload_month': 1,
-            'is_weekend': 0,
-            'upload_hour_sin': np.sin(2 * np.pi * 14 / 24),
-            'upload_hour_cos': np.cos(2 * np.pi * 14 / 24),
-            'upload_day_sin': np.sin(2 * np.pi * 1 / 7),
-            'upload_day_cos': np.cos(2 * np.pi * 1 / 7),
-            'days_since_upload': 10,
-            'log_days_since_upload': np.log1p(10)
-        }
-        
-        return features
+    def process_video_features(self, video_data, now=None):
+        """Process video data into features for prediction (``now``: reference date, default today)"""
+        # Same feature engineering as the API, bulk scoring and the feature store
+        X = build_feature_matrix([video_data], CLEAN_FEATURE_NAMES, now=now)
+        return dict(zip(CLEAN_FEATURE_NAMES, X[0]))
     
     def predict_video_views(self, video_data):
         """Predict views for a single video"""
@@ -119,15 +110,21 @@ class VideoPredictionExample:
             # Mock prediction for demo
             prediction = np.random.randint(10000, 1000000)
         
-        # Calculate confidence interval (mock)
-        confidence_lower = prediction * 0.7
-        confidence_upper = prediction * 1.3
+        # Conformal interval calibrated on held-out residuals (backend/ml/intervals.py);
+        # without a calibration no range is reported
+        if self.intervals and self.model:
+            log_lower, log_upper = self.interval_bounds(log_prediction)
+            confidence_lower, confidence_upper = max(np.expm1(log_lower), 0), np.expm1(log_upper)
+            confidence_range = f"{int(confidence_lower):,} - {int(confidence_upper):,} (80% interval)"
+        else:
+            confidence_lower = confidence_upper = None
+            confidence_range = "uncalibrated"
         
         return {
             'predicted_views': int(prediction),
-            'confidence_lower': int(confidence_lower),
-            'confidence_upper': int(confidence_upper),
-            'confidence_range': f"{int(confidence_lower):,} - {int(confidence_upper):,}",
+            'confidence_lower': int(confidence_lower) if confidence_lower is not None else None,
+            'confidence_upper': int(confidence_upper) if confidence_upper is not None else None,
+            'confidence_range': confidence_range,
             'prediction_quality': 'High' if prediction > 100000 else 'Medium' if prediction > 10000 else 'Low'
         }
     
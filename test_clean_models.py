@@ -7,6 +7,7 @@ This script demonstrates how to use the clean models for predictions.
 import pandas as pd
 import numpy as np
 import pickle
+import json
 from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
@@ -41,8 +42,8 @@ def load_clean_models():
     
     return models, scaler, feature_names, model_info
 
-def prepare_video_features(video_data, feature_names):
-    """Prepare video features for prediction"""
+def prepare_video_features(video_data, feature_names, now=None):
+    """Prepare video features for prediction (``now``: reference date, default today)"""
     
     # Calculate basic features
     title_length = len(video_data['title'])
@@ -74,7 +75,7 @@ def prepare_video_features(video_data, feature_names):
     upload_day_cos = np.cos(2 * np.pi * upload_day_of_week / 7)
     
     # Days since upload
-    days_since_upload = (datetime.now() - upload_date).days
+    days_since_upload = ((now or datetime.now()) - upload_date).days
     if days_since_upload == 0:
         days_since_upload = 1  # Avoid division by zero
     log_days_since_upload = np.log1p(days_since_upload)
@@ -120,11 +121,32 @@ def prepare_video_features(video_data, feature_names):
     
     return feature_df
 
-def predict_views(models, scaler, feature_names, model_info, video_data):
+def load_intervals(level=0.8, path='models/clean_intervals.json'):
+    """Load the conformal interval calibration (backend/ml/intervals.py), if any"""
+    try:
+        with open(path) as f:
+            calibration = json.load(f)
+    except FileNotFoundError:
+        return None
+    calibration['level'] = level
+    return calibration
+
+
+def conformal_range(intervals, model_name, prediction):
+    """Calibrated (lower, upper) views around one model's prediction"""
+    table = intervals['models'][model_name]
+    edges = np.asarray(table['edges'])
+    quantiles = np.asarray(table['quantiles'][f"{intervals['level']:g}"])
+    log_prediction = np.log1p(prediction)
+    half_width = quantiles[np.searchsorted(edges[1:-1], log_prediction, side='right')]
+    return max(np.expm1(log_prediction - half_width), 0), np.expm1(log_prediction + half_width)
+
+
+def predict_views(models, scaler, feature_names, model_info, video_data, now=None):
     """Make prediction using clean models"""
     
     # Prepare features
-    X = prepare_video_features(video_data, feature_names)
+    X = prepare_video_features(video_data, feature_names, now)
     
     # Scale features
     X_scaled = scaler.transform(X)
@@ -310,6 +332,7 @@ def test_clean_models():
     
     # Load models
     models, scaler, feature_names, model_info = load_clean_models()
+    intervals = load_intervals()
     
     # Test videos
     test_videos = [
@@ -358,7 +381,11 @@ def test_clean_models():
         best_prediction = predictions.get('gradient_boosting', list(predictions.values())[0])
         
         print(f"\n⭐ BEST PREDICTION: {best_prediction:,.0f} views")
-        print(f"📊 Confidence Range: {best_prediction * 0.7:,.0f} - {best_prediction * 1.3:,.0f}")
+        if intervals is not None:
+            lower, upper = conformal_range(intervals, 'gradient_boosting', best_prediction)
+            print(f"📊 {intervals['level']:.0%} Interval: {lower:,.0f} - {upper:,.0f}")
+        else:
+            print("📊 Interval: uncalibrated (run: cd backend && python -m ml.intervals calibrate ...)")
         
         # Calculate views per day
         upload_date = datetime.strptime(video['upload_date'], '%Y-%m-%d')